@@ -1,25 +1,42 @@
 import pygame
 import random
 import math
+import numpy as np
+from particle_renderer import SpriteRenderer
+from spatial_hash import SpatialHashGrid
+from scheduler import run_simulation
+from parallel_step import ParallelStepper
+from particle_fader import ParticleFader
 
 # --- Constants ---
 WIDTH, HEIGHT = 800, 600
 PARTICLE_COUNT = 150
 PARTICLE_SIZE = 4
+BACKGROUND_COLOR = (10, 10, 20) # Dark blue
 MAX_SPEED = 2
 COLOR_SHIFT_SPEED = 0.5 # How fast colors change based on position/time
+RENDER_MODE = "fblits" # "circle", "blits", "fblits" or "pixels" (see particle_renderer)
+USE_COLLISIONS = False # Particles bounce off each other (neighbours found with a spatial hash)
+USE_PARTICLE_SYSTEM = True # NumPy ParticleSystem instead of a list of Particle objects
+HUE_STEPS = 360 # Resolution of the hue -> RGB lookup table (1 degree per entry)
+WORKERS = 0 # Worker processes for the particle update (0 = update in this process; see parallel_step)
 
-# --- Initialization ---
-try:
-    pygame.init()
-except pygame.error as e:
-    print(f"Error initializing Pygame: {e}")
-    print("Please ensure Pygame is installed ('pip install pygame') and your display environment is set up.")
-    exit()
+# --- Colors ---
+def build_hue_lut(steps=HUE_STEPS, saturation=100, lightness=50):
+    """(steps, 3) uint8 table of the RGB colors pygame gives for hues 0..360 at fixed S and L."""
+    lut = np.empty((steps, 3), dtype=np.uint8)
+    color = pygame.Color(0)
+    for i in range(steps):
+        color.hsla = (i * 360 / steps, saturation, lightness, 100)
+        lut[i] = (color.r, color.g, color.b)
+    return lut
 
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Vibe Code Morphing Particles")
-clock = pygame.time.Clock()
+HUE_LUT = build_hue_lut() # Built once; every frame's colors are one fancy-indexing lookup
+
+def hue_colors(hues, lut=HUE_LUT):
+    """Quantizes hues in degrees to LUT entries; returns an (N, 3) uint8 array."""
+    index = (np.asarray(hues) * (len(lut) / 360)).astype(np.int64) % len(lut)
+    return lut[index]
 
 # --- Particle Class ---
 class Particle:
@@ -50,7 +67,7 @@ class Particle:
         # Combine distance and add a slow time-based shift
         self.color_hue = (self.color_hue + COLOR_SHIFT_SPEED * dist_center_x * dist_center_y * dt * 60) % 360
 
-    def draw(self, surface):
+    def get_color(self):
         # Convert HSL to RGB for Pygame
         color = pygame.Color(0)
         # Saturation and Lightness fixed for vibrant colors
@@ -58,39 +75,240 @@ class Particle:
             color.hsla = (self.color_hue, 100, 50, 100)
         except ValueError: # Handle potential invalid hue values briefly during calculation
              color.hsla = (0, 100, 50, 100) # Default to red if error
-        pygame.draw.circle(surface, color, (int(self.x), int(self.y)), PARTICLE_SIZE)
-
-# --- Create Particles ---
-particles = [Particle() for _ in range(PARTICLE_COUNT)]
-
-# --- Game Loop ---
-running = True
-print("Starting particle simulation... Press ESC or close the window to exit.")
-while running:
-    # Delta time ensures consistent speed regardless of frame rate
-    # Limit dt to prevent large jumps if frame rate drops significantly
-    dt = min(clock.tick(60) / 1000.0, 0.1) # Delta time in seconds, capped
-
-    # Handle Events
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE: # Allow exit with ESC key
-                running = False
-
-    # Update Particles
-    for p in particles:
-        p.update(dt)
-
-    # Draw
-    screen.fill((10, 10, 20)) # Dark blue background
-    for p in particles:
-        p.draw(screen)
-
-    # Update Display
-    pygame.display.flip()
-
-# --- Quit ---
-print("Exiting simulation.")
-pygame.quit()
+        return color
+
+    def draw(self, surface):
+        pygame.draw.circle(surface, self.get_color(), (int(self.x), int(self.y)), PARTICLE_SIZE)
+
+# --- Collisions ---
+def collide(xs, ys, vxs, vys, grid):
+    """Equal-mass elastic collisions on float arrays, in place; returns the indices touched."""
+    grid.update(xs, ys)
+    i, j, dx, dy, dist = grid.pairs_within(2 * PARTICLE_SIZE)
+    if len(i) == 0:
+        return i
+
+    # Collision normal from j to i (coincident particles get an arbitrary one)
+    dist = np.maximum(dist, 1e-6)
+    nx = np.where(dist > 1e-6, dx / dist, 1.0)
+    ny = np.where(dist > 1e-6, dy / dist, 0.0)
+    # Only pairs moving towards each other exchange their normal velocity
+    closing = (vxs[i] - vxs[j]) * nx + (vys[i] - vys[j]) * ny
+    closing = np.minimum(closing, 0)
+    # Push overlapping pairs apart so they don't stick together
+    overlap = (2 * PARTICLE_SIZE - dist) / 2
+    n = len(xs)
+    vxs += np.bincount(j, closing * nx, n) - np.bincount(i, closing * nx, n)
+    vys += np.bincount(j, closing * ny, n) - np.bincount(i, closing * ny, n)
+    xs += np.bincount(i, overlap * nx, n) - np.bincount(j, overlap * nx, n)
+    ys += np.bincount(i, overlap * ny, n) - np.bincount(j, overlap * ny, n)
+
+    # Pushed-apart particles must stay on screen
+    touched = np.unique(np.concatenate([i, j]))
+    xs[touched] = np.clip(xs[touched], PARTICLE_SIZE, WIDTH - PARTICLE_SIZE)
+    ys[touched] = np.clip(ys[touched], PARTICLE_SIZE, HEIGHT - PARTICLE_SIZE)
+    return touched
+
+def resolve_collisions(particles, grid):
+    """Bounces touching Particle objects off each other (equal-mass elastic collisions)."""
+    xs = np.array([p.x for p in particles], dtype=float)
+    ys = np.array([p.y for p in particles], dtype=float)
+    vxs = np.array([p.vx for p in particles], dtype=float)
+    vys = np.array([p.vy for p in particles], dtype=float)
+    for k in collide(xs, ys, vxs, vys, grid).tolist():
+        p = particles[k]
+        p.x, p.y, p.vx, p.vy = xs[k], ys[k], vxs[k], vys[k]
+
+# --- Particle System ---
+PARALLEL_FIELDS = ("x", "y", "vx", "vy", "hue") # ParticleSystem arrays the update kernel touches
+
+def update_particles(x, y, vx, vy, hue, dt):
+    """Moves, bounces and hue-shifts particles given as arrays (or slices of them), in place."""
+    x += vx * dt * 60
+    y += vy * dt * 60
+
+    # Bounce off edges
+    bounce_x = (x <= PARTICLE_SIZE) | (x >= WIDTH - PARTICLE_SIZE)
+    bounce_y = (y <= PARTICLE_SIZE) | (y >= HEIGHT - PARTICLE_SIZE)
+    vx[bounce_x] *= -1
+    vy[bounce_y] *= -1
+    np.clip(x, PARTICLE_SIZE, WIDTH - PARTICLE_SIZE, out=x)
+    np.clip(y, PARTICLE_SIZE, HEIGHT - PARTICLE_SIZE, out=y)
+
+    # Hue drifts faster away from the center
+    dist_center_x = np.abs(x - WIDTH / 2) / (WIDTH / 2)
+    dist_center_y = np.abs(y - HEIGHT / 2) / (HEIGHT / 2)
+    hue += COLOR_SHIFT_SPEED * dist_center_x * dist_center_y * dt * 60
+    np.mod(hue, 360, out=hue)
+
+def update_kernel(arrays, lo, hi, params):
+    """ParallelStepper kernel: update_particles on one worker's slice; params[0] is dt."""
+    update_particles(*(arrays[name][lo:hi] for name in PARALLEL_FIELDS), params[0])
+
+class ParticleSystem:
+    """Structure-of-arrays version of Particle: positions, velocities and hues as NumPy arrays."""
+
+    def __init__(self, count, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        self.x = rng.uniform(0, WIDTH, count)
+        self.y = rng.uniform(0, HEIGHT, count)
+        self.vx = rng.uniform(-MAX_SPEED, MAX_SPEED, count)
+        self.vy = rng.uniform(-MAX_SPEED, MAX_SPEED, count)
+        self.hue = self.x / WIDTH * 360 # Hue based on horizontal position
+
+    @classmethod
+    def from_particles(cls, particles):
+        """Copies the state of a list of Particle objects into a new system."""
+        system = cls.__new__(cls)
+        for name, attr in (("x", "x"), ("y", "y"), ("vx", "vx"), ("vy", "vy"), ("hue", "color_hue")):
+            setattr(system, name, np.array([getattr(p, attr) for p in particles], dtype=np.float64))
+        return system
+
+    def __len__(self):
+        return len(self.x)
+
+    def update(self, dt, count=None):
+        """Particle.update for every particle (or the first `count`) at once."""
+        live = slice(0, count)
+        update_particles(self.x[live], self.y[live], self.vx[live], self.vy[live], self.hue[live], dt)
+
+    def resolve_collisions(self, grid, count=None):
+        live = slice(0, count)
+        collide(self.x[live], self.y[live], self.vx[live], self.vy[live], grid)
+
+    def colors(self, count=None):
+        return hue_colors(self.hue[:count])
+
+# --- Simulation ---
+class Simulation:
+    """Bouncing, hue-shifting particles as an importable engine: step(dt) advances, render(surface) draws."""
+
+    title = "Vibe Code Morphing Particles"
+
+    def __init__(self, count=PARTICLE_COUNT, seed=None, render_mode=RENDER_MODE, workers=WORKERS, max_particles=None):
+        """max_particles reserves room for set_quality() to raise the count above `count` later."""
+        if seed is not None:
+            random.seed(seed)
+        self.count = count
+        self.stepper = None
+        self.fader = None
+        if USE_PARTICLE_SYSTEM:
+            capacity = max(count, max_particles or 0)
+            self.particles = ParticleSystem(capacity, np.random.default_rng(seed))
+            self.fader = ParticleFader(capacity, count)
+            if workers:
+                # Collisions stay in this process: pairs can span any two workers' slices
+                self.stepper = ParallelStepper(update_kernel, self.particles, PARALLEL_FIELDS, workers)
+        else:
+            self.particles = [Particle() for _ in range(count)]
+        self.grid = SpatialHashGrid(2 * PARTICLE_SIZE)
+        self.renderer = SpriteRenderer(render_mode)
+        self.previous = self.positions() # Positions before the last step
+
+    def __len__(self):
+        return self.fader.live if USE_PARTICLE_SYSTEM else len(self.particles)
+
+    def positions(self):
+        """(xs, ys) arrays of the current positions."""
+        if USE_PARTICLE_SYSTEM:
+            return self.particles.x.copy(), self.particles.y.copy()
+        return (np.array([p.x for p in self.particles], dtype=float),
+                np.array([p.y for p in self.particles], dtype=float))
+
+    def step(self, dt):
+        self.previous = self.positions()
+        if USE_PARTICLE_SYSTEM:
+            live = self.fader.step()
+            if self.stepper is not None:
+                self.stepper.step(live, dt)
+            else:
+                self.particles.update(dt, live)
+            if USE_COLLISIONS:
+                self.particles.resolve_collisions(self.grid, live)
+            return
+        for p in self.particles:
+            p.update(dt)
+        if USE_COLLISIONS:
+            resolve_collisions(self.particles, self.grid)
+
+    def close(self):
+        """Stops the update workers, if any."""
+        if self.stepper is not None:
+            self.stepper.close()
+            self.stepper = None
+
+    def set_quality(self, level):
+        """Applies an adaptive_quality level: fades particles in or out towards count * level.particles."""
+        if USE_PARTICLE_SYSTEM:
+            self.fader.set_active(round(self.count * level.particles))
+
+    def render(self, surface, alpha=1.0):
+        """Draws the particles `alpha` of the way from their previous to their current position."""
+        surface.fill(BACKGROUND_COLOR)
+        (px, py), (xs, ys) = self.previous, self.positions()
+        if USE_PARTICLE_SYSTEM:
+            live = self.fader.live
+            (px, py), (xs, ys) = (px[:live], py[:live]), (xs[:live], ys[:live])
+            colors = self.fader.blend(self.particles.colors(live), BACKGROUND_COLOR)
+        else:
+            colors = [tuple(p.get_color())[:3] for p in self.particles]
+        # One batched draw call instead of pygame.draw.circle per particle
+        self.renderer.draw_circles(
+            surface,
+            (px + (xs - px) * alpha).astype(np.int64),
+            (py + (ys - py) * alpha).astype(np.int64),
+            np.full(len(xs), PARTICLE_SIZE),
+            colors,
+        )
+
+    # --- Record / Replay (see state_log; needs USE_PARTICLE_SYSTEM) ---
+    def frame_columns(self, alpha=1.0):
+        """The per-particle values render(surface, alpha) draws with, for the state log."""
+        (px, py), p = self.previous, self.particles
+        live = slice(0, self.fader.live)
+        return {
+            "x": px[live] + (p.x[live] - px[live]) * alpha,
+            "y": py[live] + (p.y[live] - py[live]) * alpha,
+            "hue": p.hue[live],
+            "visibility": self.fader.visibility[live],
+        }
+
+    def render_columns(self, surface, columns):
+        """Draws one recorded frame_columns() frame without stepping."""
+        surface.fill(BACKGROUND_COLOR)
+        xs = columns["x"]
+        visibility = columns["visibility"][:, None]
+        self.renderer.draw_circles(
+            surface,
+            xs.astype(np.int64),
+            columns["y"].astype(np.int64),
+            np.full(len(xs), PARTICLE_SIZE),
+            (hue_colors(columns["hue"]) * visibility + np.asarray(BACKGROUND_COLOR) * (1 - visibility)).astype(np.uint8),
+        )
+
+    def snapshot(self):
+        """Everything step() depends on, copied: particle arrays, last positions and RNG state."""
+        return {
+            "arrays": {name: getattr(self.particles, name).copy() for name in PARALLEL_FIELDS},
+            "previous": tuple(a.copy() for a in self.previous),
+            "fader": self.fader.state(),
+            "random": random.getstate(),
+        }
+
+    def restore(self, state):
+        """Puts back a snapshot() taken from a simulation with the same particle count."""
+        for name, values in state["arrays"].items():
+            getattr(self.particles, name)[...] = values # In place: the arrays may be shared with workers
+        self.previous = tuple(a.copy() for a in state["previous"])
+        self.fader.restore(state["fader"])
+        random.setstate(state["random"])
+
+# --- Main ---
+if __name__ == "__main__":
+    print("Starting particle simulation... Press ESC or close the window to exit.")
+    try:
+        run_simulation(Simulation(), (WIDTH, HEIGHT))
+    except pygame.error as e:
+        print(f"Error initializing Pygame: {e}")
+        print("Please ensure Pygame is installed ('pip install pygame') and your display environment is set up.")
+    print("Exiting simulation.")
@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+import pygame
+
+from scheduler import PHYSICS_HZ, FixedTimestepScheduler, run_simulation
+from simulations import SIMULATIONS, create_simulation
+
+# --- Quality Levels ---
+# particles: fraction of the simulation's base particle count kept visible (Vibe, morph)
+# emission:  fraction of the base spawn rate (fiery; its live count follows the spawn rate)
+# alpha_step: sprite alpha quantization, i.e. fewer distinct faded sprites to rasterize (fiery)
+# max_substeps: physics steps one frame may run to catch up before time is dropped
+QualityLevel = namedtuple("QualityLevel", "name particles emission alpha_step max_substeps")
+LEVELS = (
+    QualityLevel("minimum", 0.25, 0.25, 16, 1),
+    QualityLevel("low", 0.5, 0.5, 8, 2),
+    QualityLevel("medium", 0.75, 0.75, 4, 3),
+    QualityLevel("default", 1.0, 1.0, 1, 5),
+    QualityLevel("high", 1.5, 1.5, 1, 5),
+    QualityLevel("maximum", 2.0, 2.0, 1, 5),
+)
+DEFAULT_LEVEL = 3
+
+# --- Defaults ---
+BUDGET_MS = 16.6  # Update + draw time per frame to stay under (60 FPS)
+WINDOW = 30  # Frames averaged before each decision; the window restarts after every change
+HIGH_WATER = 0.9  # Step down when the average exceeds this share of the budget...
+LOW_WATER = 0.6  # ...and consider stepping up only while it stays below this share
+UPGRADE_HOLD = 120  # Frames of headroom needed before stepping up
+MAX_UPGRADE_HOLD = 16 * UPGRADE_HOLD
+
+
+class QualityController:
+    """Moves between quality levels to keep a simulation's update + draw time inside a frame budget.
+
+    It steps down as soon as the average over the last `window` frames passes
+    high_water * budget, and steps up only after upgrade_hold frames in a row
+    below low_water * budget. The gap between the two thresholds and the hold
+    keep it from flapping. An upgrade that has to be undone within the hold
+    doubles the hold before the next try. Simulations pick up levels through
+    set_quality(level) and fade particles in and out, so changes never pop.
+    """
+
+    def __init__(self, budget_ms=BUDGET_MS, levels=LEVELS, level=DEFAULT_LEVEL, window=WINDOW,
+                 high_water=HIGH_WATER, low_water=LOW_WATER, upgrade_hold=UPGRADE_HOLD, verbose=True):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.level = level
+        self.window = window
+        self.high_water = high_water
+        self.low_water = low_water
+        self.upgrade_hold = upgrade_hold
+        self.verbose = verbose
+        self.frame_ms = np.zeros(window)
+        self.frames = 0  # Frames measured at the current level
+        self.total_frames = 0
+        self.headroom_frames = 0  # Consecutive frames with the average below the low water mark
+        self.last_upgrade = None  # total_frames at the last step up
+        self.decisions = []
+        self.simulation = None
+        self.scheduler = None
+
+    @property
+    def current(self):
+        return self.levels[self.level]
+
+    @property
+    def max_particles(self):
+        """Largest particle scale any level asks for, to size simulations with (see max_particles)."""
+        return max(level.particles for level in self.levels)
+
+    def attach(self, simulation, scheduler=None):
+        """Starts controlling a simulation (and the scheduler's substep cap) at the current level."""
+        self.simulation = simulation
+        self.scheduler = scheduler
+        self._apply()
+
+    def _apply(self):
+        level = self.current
+        if self.scheduler is not None:
+            self.scheduler.max_substeps = level.max_substeps
+        set_quality = getattr(self.simulation, "set_quality", None)
+        if set_quality is not None:
+            set_quality(level)
+
+    def frame(self, update_ms, draw_ms):
+        """Feeds one frame's update and draw time; returns True if the level changed."""
+        self.total_frames += 1
+        self.frame_ms[self.frames % self.window] = update_ms + draw_ms
+        self.frames += 1
+        if self.frames < self.window:
+            return False  # Not enough frames measured at this level yet
+        load_ms = self.frame_ms.mean()
+        if load_ms > self.high_water * self.budget_ms and self.level > 0:
+            if self.last_upgrade is not None and self.total_frames - self.last_upgrade < self.upgrade_hold:
+                self.upgrade_hold = min(2 * self.upgrade_hold, MAX_UPGRADE_HOLD)  # That upgrade didn't fit
+            self._change(self.level - 1, load_ms, "over budget")
+            return True
+        self.headroom_frames = self.headroom_frames + 1 if load_ms < self.low_water * self.budget_ms else 0
+        if self.headroom_frames >= self.upgrade_hold and self.level < len(self.levels) - 1:
+            self.last_upgrade = self.total_frames
+            self._change(self.level + 1, load_ms, "headroom")
+            return True
+        return False
+
+    def _change(self, level, load_ms, reason):
+        old = self.current
+        self.level = level
+        self.frames = 0
+        self.headroom_frames = 0
+        self._apply()
+        new = self.current
+        decision = {
+            "frame": self.total_frames,
+            "time": time.time(),
+            "from": old.name,
+            "to": new.name,
+            "reason": reason,
+            "load_ms": float(load_ms),
+            "budget_ms": self.budget_ms,
+            "level": new._asdict(),
+        }
+        self.decisions.append(decision)
+        if self.verbose:
+            print(f"[quality] frame {self.total_frames}: {old.name} -> {new.name} ({reason}: "
+                  f"{load_ms:.1f} ms of {self.budget_ms:.1f} ms; particles x{new.particles}, "
+                  f"emission x{new.emission}, alpha step {new.alpha_step}, substeps {new.max_substeps})",
+                  file=sys.stderr)
+
+    def export_decisions(self, path):
+        """Writes every decision so far as JSON lines."""
+        with open(path, "w") as f:
+            for decision in self.decisions:
+                f.write(json.dumps(decision) + "\n")
+
+
+# --- Offline Run ---
+def run_offline(simulation, native_size, controller, frames, fps=60, physics_hz=PHYSICS_HZ):
+    """Steps and draws `frames` frames as fast as possible under the controller; returns per-frame stats."""
+    scheduler = FixedTimestepScheduler(physics_hz)
+    controller.attach(simulation, scheduler)
+    canvas = pygame.Surface(native_size, 0, 32)
+    frame_ms = np.zeros(frames)
+    for n in range(frames):
+        update_start = time.perf_counter()
+        scheduler.tick(simulation, 1.0 / fps)
+        draw_start = time.perf_counter()
+        simulation.render(canvas, scheduler.alpha)
+        draw_end = time.perf_counter()
+        controller.frame((draw_start - update_start) * 1000, (draw_end - draw_start) * 1000)
+        frame_ms[n] = (draw_end - update_start) * 1000
+    return {
+        "frames": frames,
+        "mean_ms": float(frame_ms.mean()),
+        "p95_ms": float(np.percentile(frame_ms, 95)),
+        "over_budget": float((frame_ms > controller.budget_ms).mean()),
+        "final_level": controller.current.name,
+        "particles": len(simulation),
+        "decisions": len(controller.decisions),
+    }
+
+
+# --- Command Line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a particle simulation under the adaptive quality controller.")
+    parser.add_argument("simulation", choices=sorted(SIMULATIONS))
+    parser.add_argument("--budget", type=float, default=BUDGET_MS, help="update + draw budget per frame in ms")
+    parser.add_argument("--level", choices=[level.name for level in LEVELS], default=LEVELS[DEFAULT_LEVEL].name,
+                        help="starting level")
+    parser.add_argument("--count", type=int, help="base particle count (default: the simulation's own)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--headless", action="store_true", help="run offline without a window and print stats")
+    parser.add_argument("--frames", type=int, default=1200, help="frames for --headless")
+    parser.add_argument("--log", help="write the controller's decisions here as JSON lines")
+    args = parser.parse_args(argv)
+
+    if args.headless:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    level = [level.name for level in LEVELS].index(args.level)
+    controller = QualityController(args.budget, level=level)
+    size, default_count = SIMULATIONS[args.simulation].size, SIMULATIONS[args.simulation].count
+    count = args.count or default_count
+    options = {}
+    if default_count is not None:
+        # Particle-count simulations allocate room for the highest level up front (see max_particles)
+        options["max_particles"] = round(count * controller.max_particles)
+
+    pygame.init()
+    simulation = create_simulation(args.simulation, count, args.seed, **options)
+    try:
+        if args.headless:
+            stats = run_offline(simulation, size, controller, args.frames)
+            print(json.dumps(stats, indent=2))
+        else:
+            run_simulation(simulation, size, quality=controller)
+    finally:
+        simulation.close()
+        pygame.quit()
+        if args.log:
+            controller.export_decisions(args.log)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # Headless: no window needed
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pygame
+
+import benchmark_report
+from benchmark_report import DEFAULT_THRESHOLD
+from simulations import SIMULATIONS, create_simulation
+
+# --- Defaults ---
+DEFAULT_COUNTS = [100, 1000, 10000]
+DEFAULT_STEPS = 300
+DEFAULT_SEED = 0
+FRAME_DT = 1 / 60  # One fixed physics step per frame, so results don't depend on machine speed
+
+
+# --- Scenarios ---
+# Each simulation module exposes Simulation(count, seed, render_mode, workers) with step(dt)/render(surface)
+
+
+def make_scenario(name, count, seed, render_mode, workers=0):
+    """Builds one seeded simulation and returns (update, draw, simulation); update/draw run exactly one frame."""
+    simulation = create_simulation(name, count, seed, render_mode=render_mode, workers=workers)
+
+    def update():
+        simulation.step(FRAME_DT)
+
+    return update, simulation.render, simulation
+
+
+# --- Measurement ---
+def percentile(values, q):
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+
+def run_case(name, count, steps, seed, render_mode, size, workers=0):
+    """Times `steps` frames of one scenario, then repeats a shorter run under tracemalloc."""
+    surface = pygame.Surface(size)
+
+    update, draw, simulation = make_scenario(name, count, seed, render_mode, workers)
+    update_ms, draw_ms = [], []
+    start = time.perf_counter()
+    for _ in range(steps):
+        t0 = time.perf_counter()
+        update()
+        t1 = time.perf_counter()
+        draw(surface)
+        t2 = time.perf_counter()
+        update_ms.append((t1 - t0) * 1000)
+        draw_ms.append((t2 - t1) * 1000)
+    elapsed = time.perf_counter() - start
+    stepper = getattr(simulation, "stepper", None)
+    parallel = stepper.stats() if stepper is not None else None
+    simulation.close()
+
+    # Memory pass (tracemalloc slows everything down, so it is kept out of the timings).
+    # Python has no raw allocation counter, so report the bytes allocated and released
+    # within a frame (transient) and the net growth in allocated blocks per frame.
+    memory_steps = max(10, steps // 4)
+    update, draw, simulation = make_scenario(name, count, seed, render_mode, workers)
+    tracemalloc.start()
+    transient = []
+    blocks_before = sys.getallocatedblocks()
+    for _ in range(memory_steps):
+        frame_start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        update()
+        draw(surface)
+        transient.append(tracemalloc.get_traced_memory()[1] - frame_start)
+    blocks_after = sys.getallocatedblocks()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    simulation.close()
+
+    result = {
+        "simulation": name,
+        "count": count,
+        "steps": steps,
+        "update_ms": {"mean": float(np.mean(update_ms)), "p50": percentile(update_ms, 50), "p95": percentile(update_ms, 95)},
+        "draw_ms": {"mean": float(np.mean(draw_ms)), "p50": percentile(draw_ms, 50), "p95": percentile(draw_ms, 95)},
+        "fps": steps / elapsed,
+        "peak_memory_kb": peak / 1024,
+        "transient_kb_per_frame": float(np.mean(transient)) / 1024,
+        "net_blocks_per_frame": (blocks_after - blocks_before) / memory_steps,
+    }
+    if parallel is not None:
+        result["parallel"] = parallel  # Per-worker step time and load imbalance
+    return result
+
+
+def run_benchmarks(simulations, counts, steps=DEFAULT_STEPS, seed=DEFAULT_SEED, render_mode="fblits", size=(800, 600),
+                   workers=0):
+    """Sweeps every simulation over every particle count; returns a JSON-ready dict."""
+    pygame.init()
+    results = []
+    try:
+        for name in simulations:
+            for count in counts:
+                result = run_case(name, count, steps, seed, render_mode, size, workers)
+                print(f"{name:>6} {count:>7}  update {result['update_ms']['mean']:8.2f} ms  "
+                      f"draw {result['draw_ms']['mean']:8.2f} ms  {result['fps']:8.1f} fps", file=sys.stderr)
+                results.append(result)
+    finally:
+        pygame.quit()
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "config": {"steps": steps, "seed": seed, "render_mode": render_mode, "size": list(size), "workers": workers},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Lists cases where `current` is more than `threshold` slower than `baseline`."""
+    return benchmark_report.compare(baseline, current, ("simulation", "count"), case_metrics, threshold)
+
+
+def case_metrics(result):
+    return {
+        "update_ms": result["update_ms"]["mean"],
+        "draw_ms": result["draw_ms"]["mean"],
+        "frame_ms": 1000 / result["fps"],
+    }
+
+
+def describe_regression(r):
+    return f"{r['simulation']} n={r['count']} {r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f}"
+
+
+# --- Command Line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmarks for the particle simulations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark sweep and print/write JSON")
+    run.add_argument("--simulations", nargs="+", choices=sorted(SIMULATIONS), default=list(SIMULATIONS))
+    run.add_argument("--counts", nargs="+", type=int, default=DEFAULT_COUNTS)
+    run.add_argument("--steps", type=int, default=DEFAULT_STEPS)
+    run.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    run.add_argument("--render-mode", default="fblits")
+    run.add_argument("--workers", type=int, default=0, help="update worker processes (see parallel_step)")
+    run.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+
+    benchmark_report.add_compare_command(commands)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        report = run_benchmarks(args.simulations, args.counts, args.steps, args.seed, args.render_mode,
+                                workers=args.workers)
+        benchmark_report.write_report(report, args.output)
+        return 0
+    return benchmark_report.run_compare(args, compare, describe_regression)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
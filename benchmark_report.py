@@ -0,0 +1,72 @@
+import json
+
+# --- Defaults ---
+DEFAULT_THRESHOLD = 0.10  # Relative slowdown that counts as a regression
+
+
+# --- Report I/O ---
+def write_report(report, path=None):
+    """Writes a JSON report to path, or prints it to stdout without one."""
+    text = json.dumps(report, indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+# --- Regressions ---
+def compare(baseline, current, case_fields, metrics, threshold=DEFAULT_THRESHOLD):
+    """Lists the (case, metric) pairs of `current` more than `threshold` slower than `baseline`.
+
+    Cases are matched on the result fields named in case_fields; metrics(result)
+    returns {metric: value}, lower being better, and may leave out metrics a
+    case didn't measure. Each regression holds the case fields plus metric,
+    baseline, current and change.
+    """
+    def case_of(result):
+        return tuple(result[field] for field in case_fields)
+
+    before = {case_of(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = before.get(case_of(result))
+        if old is None:
+            continue
+        old_values = metrics(old)
+        for metric, new_value in metrics(result).items():
+            old_value = old_values.get(metric)
+            if old_value is not None and old_value > 0 and (new_value - old_value) / old_value > threshold:
+                regressions.append({
+                    **{field: result[field] for field in case_fields},
+                    "metric": metric,
+                    "baseline": old_value,
+                    "current": new_value,
+                    "change": (new_value - old_value) / old_value,
+                })
+    return regressions
+
+
+# --- Command Line ---
+def add_compare_command(commands):
+    """Adds the `compare baseline current [--threshold]` subcommand to an argparse subparsers object."""
+    cmp = commands.add_parser("compare", help="compare two JSON reports; exits 1 on regressions")
+    cmp.add_argument("baseline")
+    cmp.add_argument("current")
+    cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    return cmp
+
+
+def run_compare(args, compare_reports, describe):
+    """Runs a parsed compare command: prints each regression via describe(regression); returns the exit code."""
+    regressions = compare_reports(load_report(args.baseline), load_report(args.current), args.threshold)
+    for r in regressions:
+        print(f"REGRESSION {describe(r)} ({r['change']:+.1%})")
+    if not regressions:
+        print("No regressions above {:.0%}.".format(args.threshold))
+    return 1 if regressions else 0
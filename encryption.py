@@ -1,7 +1,65 @@
+import mmap
 import os
+import struct
+import sys
+import time
+import zlib
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import base64 # To easily handle binary data in input/output
 
+try:
+    import zstandard # Optional: faster, better compression for envelopes
+except ImportError:
+    zstandard = None
+
+NONCE_SIZE = 12 # 12 bytes is recommended by NIST for GCM
+TAG_SIZE = 16 # GCM authentication tag appended to every ciphertext
+OVERHEAD = NONCE_SIZE + TAG_SIZE # Raw Cipher output is nonce || ciphertext || tag
+
+# --- Envelope ---
+# Binary container for one message: a fixed header, the associated data, then the
+# GCM ciphertext and tag. The header and associated data are both authenticated, so
+# the key id, algorithm and compression flag cannot be altered without detection.
+ENVELOPE_MAGIC = b"GCME"
+ENVELOPE_VERSION = 1
+# magic, version, algorithm, compression, (pad), key id, nonce, associated data length
+ENVELOPE_HEADER = struct.Struct(">4sBBBxI12sI")
+ALGORITHM_AES_256_GCM = 1
+COMPRESS_NONE = 0
+COMPRESS_ZLIB = 1
+COMPRESS_ZSTD = 2
+ARMOR_PREFIX = base64.b64encode(ENVELOPE_MAGIC)[:4] # Armoured envelopes always start with this
+
+# --- Streaming (STREAM construction) ---
+# A stream is a 48-byte header followed by segments of SEGMENT_SIZE plaintext bytes,
+# each encrypted separately and followed by its 16-byte GCM tag. Segment i uses the
+# nonce prefix (7 bytes) || i (4 bytes, big-endian) || last-segment flag (1 byte), and
+# the header is authenticated as associated data of every segment, so reordering,
+# dropping, truncating or extending segments all fail authentication.
+# Segments are not encrypted with the key itself but with a per-stream key derived
+# from it and the random salt in the header (HKDF-SHA256, as in Tink's streaming
+# AEAD). A 7-byte random nonce prefix alone would repeat under one key after about
+# 2^28 streams, and pass NIST's 2^-32 collision limit after about ten thousand.
+STREAM_MAGIC = b"GCMS"
+STREAM_VERSION = 2 # Version 1 used the key directly and had no salt
+STREAM_HEADER = struct.Struct(">4sBI32s7s") # magic, version, segment size, key salt, nonce prefix
+STREAM_SALT_SIZE = 32
+STREAM_KEY_INFO = b"encryption stream key v2" # HKDF info, so stream keys can't collide with other derived keys
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+MAX_SEGMENTS = 2 ** 32 # The segment counter is 32 bits wide
+
+# --- Bulk ---
+# Records are handed to workers in batches so the pool overhead is paid per batch,
+# not per record; at most MAX_IN_FLIGHT_PER_WORKER batches per worker are queued.
+BULK_BATCH_SIZE = 512
+MAX_IN_FLIGHT_PER_WORKER = 2
+
 def generate_key():
     """Generates a new 256-bit (32-byte) encryption key."""
     # AES-256 requires a 32-byte key
@@ -40,7 +98,583 @@ def decrypt_text(encrypted_data_b64, key):
         print(f"Decryption error: {e}")
         raise # Re-raise the exception to signal failure
 
-if __name__ == "__main__":
+class Cipher:
+    """AES-256-GCM bound to one key, for encrypting many messages without per-call setup.
+
+    Inputs may be bytes, bytearray or memoryview. Raw messages are
+    nonce || ciphertext || tag (OVERHEAD bytes longer than the plaintext); the
+    *_text methods produce the same base64 tokens as encrypt_text/decrypt_text.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.aesgcm = AESGCM(key) # Built once and reused for every message
+        # Older cryptography releases have no *_into methods; fall back to copying
+        self.zero_copy = hasattr(self.aesgcm, "encrypt_into")
+
+    def encrypt(self, data, aad=None):
+        """Returns nonce || ciphertext || tag as a new bytearray."""
+        out = bytearray(len(data) + OVERHEAD)
+        self.encrypt_into(data, out, aad)
+        return out
+
+    def decrypt(self, message, aad=None):
+        """Returns the plaintext of a raw message; raises InvalidTag if it was tampered with."""
+        message = memoryview(message)
+        if len(message) < OVERHEAD:
+            raise ValueError("Message too short")
+        return self.aesgcm.decrypt(message[:NONCE_SIZE], message[NONCE_SIZE:], aad)
+
+    def encrypt_into(self, data, out, aad=None):
+        """Writes nonce || ciphertext || tag to the start of out; returns the bytes written."""
+        size = len(data) + OVERHEAD
+        view = memoryview(out)
+        if len(view) < size:
+            raise ValueError(f"Output buffer too small: need {size} bytes, got {len(view)}")
+        view[:NONCE_SIZE] = os.urandom(NONCE_SIZE)
+        if self.zero_copy:
+            self.aesgcm.encrypt_into(view[:NONCE_SIZE], data, aad, view[NONCE_SIZE:size])
+        else:
+            view[NONCE_SIZE:size] = self.aesgcm.encrypt(bytes(view[:NONCE_SIZE]), bytes(data), aad)
+        return size
+
+    def decrypt_into(self, message, out, aad=None):
+        """Writes the plaintext of a raw message to the start of out; returns its length.
+
+        If the tag doesn't verify, the part of out that was written is zeroed
+        before InvalidTag is raised, so unauthenticated plaintext never stays there.
+        """
+        message = memoryview(message)
+        if len(message) < OVERHEAD:
+            raise ValueError("Message too short")
+        size = len(message) - OVERHEAD
+        view = memoryview(out)
+        if len(view) < size:
+            raise ValueError(f"Output buffer too small: need {size} bytes, got {len(view)}")
+        nonce, ciphertext = message[:NONCE_SIZE], message[NONCE_SIZE:]
+        if self.zero_copy:
+            try:
+                self.aesgcm.decrypt_into(nonce, ciphertext, aad, view[:size])
+            except Exception:
+                view[:size] = bytes(size) # AESGCM.decrypt_into writes the plaintext before checking the tag
+                raise
+        else:
+            view[:size] = self.aesgcm.decrypt(bytes(nonce), bytes(ciphertext), aad)
+        return size
+
+    def encrypt_text(self, text):
+        """Same output as encrypt_text(text, key)."""
+        data = text.encode() if isinstance(text, str) else text
+        return base64.b64encode(self.encrypt(data))
+
+    def decrypt_text(self, token):
+        """Same result as decrypt_text(token, key), without the error printing."""
+        return self.decrypt(base64.b64decode(token)).decode()
+
+# --- Envelope ---
+Envelope = namedtuple("Envelope", "version algorithm compression key_id nonce aad ciphertext header")
+
+def _compress(data, compression):
+    if compression == COMPRESS_NONE:
+        return data
+    if compression == COMPRESS_ZLIB:
+        return zlib.compress(data)
+    if compression == COMPRESS_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression needs the 'zstandard' package")
+        return zstandard.ZstdCompressor().compress(data)
+    raise ValueError(f"Unknown compression {compression}")
+
+def _decompress(data, compression):
+    if compression == COMPRESS_NONE:
+        return data
+    if compression == COMPRESS_ZLIB:
+        return zlib.decompress(data)
+    if compression == COMPRESS_ZSTD:
+        if zstandard is None:
+            raise ValueError("zstd compression needs the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown compression {compression}")
+
+def seal(cipher, data, aad=b"", key_id=0, compression=COMPRESS_NONE, armor=False):
+    """Encrypts data into an envelope; returns bytes, or base64 bytes with armor=True.
+
+    Compression happens before encryption, so only enable it for payloads that
+    don't mix secrets with attacker-chosen content (the size would leak).
+    """
+    data = _compress(data, compression)
+    nonce = os.urandom(NONCE_SIZE)
+    header = ENVELOPE_HEADER.pack(ENVELOPE_MAGIC, ENVELOPE_VERSION, ALGORITHM_AES_256_GCM,
+                                  compression, key_id, nonce, len(aad))
+    prefix_size = ENVELOPE_HEADER.size + len(aad)
+    out = bytearray(prefix_size + len(data) + TAG_SIZE)
+    out[:ENVELOPE_HEADER.size] = header
+    out[ENVELOPE_HEADER.size:prefix_size] = aad
+    view = memoryview(out)
+    # The whole prefix (header + associated data) is the GCM associated data
+    if cipher.zero_copy:
+        cipher.aesgcm.encrypt_into(nonce, data, view[:prefix_size], view[prefix_size:])
+    else:
+        view[prefix_size:] = cipher.aesgcm.encrypt(nonce, bytes(data), bytes(view[:prefix_size]))
+    return base64.b64encode(out) if armor else bytes(out)
+
+def parse_envelope(message):
+    """Splits an envelope (binary or armoured) into its fields without decrypting it.
+
+    aad, ciphertext and header are memoryviews into the message, so routing on
+    key_id costs one struct unpack and no copies.
+    """
+    if message[:4] == ARMOR_PREFIX:
+        message = base64.b64decode(message)
+    view = memoryview(message)
+    if len(view) < ENVELOPE_HEADER.size + TAG_SIZE:
+        raise ValueError("Not an envelope: too short")
+    magic, version, algorithm, compression, key_id, nonce, aad_size = ENVELOPE_HEADER.unpack_from(view)
+    if magic != ENVELOPE_MAGIC:
+        raise ValueError("Not an envelope: bad magic")
+    if version != ENVELOPE_VERSION:
+        raise ValueError(f"Unsupported envelope version {version}")
+    if algorithm != ALGORITHM_AES_256_GCM:
+        raise ValueError(f"Unsupported envelope algorithm {algorithm}")
+    prefix_size = ENVELOPE_HEADER.size + aad_size
+    if len(view) < prefix_size + TAG_SIZE:
+        raise ValueError("Truncated envelope")
+    return Envelope(version, algorithm, compression, key_id, nonce,
+                    view[ENVELOPE_HEADER.size:prefix_size], view[prefix_size:], view[:prefix_size])
+
+def open_envelope(keys, message):
+    """Decrypts an envelope; returns (plaintext, associated data).
+
+    keys is a Cipher, or any mapping from key id to Cipher so the right key is
+    picked from the header instead of by trial decryption.
+    """
+    envelope = parse_envelope(message)
+    cipher = keys if isinstance(keys, Cipher) else keys[envelope.key_id]
+    data = cipher.aesgcm.decrypt(envelope.nonce, envelope.ciphertext, envelope.header)
+    return _decompress(data, envelope.compression), bytes(envelope.aad)
+
+def _stream_cipher(key, salt):
+    """The Cipher for one stream: a key derived from key (bytes or a Cipher) and the stream's salt."""
+    master = key.key if isinstance(key, Cipher) else key
+    return Cipher(HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=STREAM_KEY_INFO).derive(master))
+
+def _new_stream_header(key, segment_size):
+    """Packs a header with a fresh salt and nonce prefix; returns (header, Cipher, nonce prefix)."""
+    salt, prefix = os.urandom(STREAM_SALT_SIZE), os.urandom(7)
+    header = STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, segment_size, salt, prefix)
+    return header, _stream_cipher(key, salt), prefix
+
+def _stream_nonce(prefix, index, last):
+    """Builds the 12-byte nonce for segment `index` of a stream."""
+    if index >= MAX_SEGMENTS:
+        raise ValueError("Stream too long: segment counter overflow")
+    return prefix + index.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+def _read_full(src, view):
+    """Fills view from src (short reads are retried); returns the number of bytes read."""
+    total = 0
+    while total < len(view):
+        n = src.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+def encrypt_stream(src, dst, key, segment_size=DEFAULT_SEGMENT_SIZE):
+    """Encrypts binary file object src into dst segment by segment; returns plaintext bytes read.
+
+    Memory use is bounded by two segment buffers regardless of the input size.
+    """
+    if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+        raise ValueError(f"segment_size must be between 1 and {MAX_SEGMENT_SIZE}")
+    header, cipher, prefix = _new_stream_header(key, segment_size)
+    aesgcm = cipher.aesgcm
+    dst.write(header)
+
+    # Read one segment ahead so we know which segment is the last one
+    current, following = bytearray(segment_size), bytearray(segment_size)
+    current_len = _read_full(src, memoryview(current))
+    total = index = 0
+    while True:
+        following_len = _read_full(src, memoryview(following)) if current_len == segment_size else 0
+        last = following_len == 0
+        nonce = _stream_nonce(prefix, index, last)
+        dst.write(aesgcm.encrypt(nonce, memoryview(current)[:current_len], header))
+        total += current_len
+        if last:
+            return total
+        index += 1
+        current, following = following, current
+        current_len = following_len
+
+def iter_decrypt_stream(src, key):
+    """Yields the plaintext of each segment of an encrypted stream, only after its tag checks out."""
+    header = src.read(STREAM_HEADER.size)
+    if len(header) != STREAM_HEADER.size:
+        raise ValueError("Not an encrypted stream: header too short")
+    magic, version, segment_size, salt, prefix = STREAM_HEADER.unpack(header)
+    if magic != STREAM_MAGIC or version != STREAM_VERSION:
+        raise ValueError("Not an encrypted stream or unsupported version")
+    if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+        raise ValueError("Corrupt stream header: bad segment size")
+    aesgcm = _stream_cipher(key, salt).aesgcm
+
+    chunk = segment_size + TAG_SIZE
+    current, following = bytearray(chunk), bytearray(chunk)
+    current_len = _read_full(src, memoryview(current))
+    index = 0
+    while True:
+        following_len = _read_full(src, memoryview(following)) if current_len == chunk else 0
+        last = following_len == 0
+        if current_len < TAG_SIZE:
+            raise ValueError("Truncated stream")
+        nonce = _stream_nonce(prefix, index, last)
+        # Raises InvalidTag on tampering, reordering or truncation at a segment boundary
+        yield aesgcm.decrypt(nonce, memoryview(current)[:current_len], header)
+        if last:
+            return
+        index += 1
+        current, following = following, current
+        current_len = following_len
+
+def decrypt_stream(src, dst, key):
+    """Decrypts an encrypted stream from src into dst; returns plaintext bytes written.
+
+    Each segment is authenticated before it is written, but a failure part way
+    through leaves the segments before it in dst.
+    """
+    total = 0
+    for segment in iter_decrypt_stream(src, key):
+        dst.write(segment)
+        total += len(segment)
+    return total
+
+def encrypt_file(in_path, out_path, key, segment_size=DEFAULT_SEGMENT_SIZE):
+    """Encrypts a file of any size in constant memory."""
+    with open(in_path, "rb") as src, open(out_path, "wb") as dst:
+        return encrypt_stream(src, dst, key, segment_size)
+
+@contextmanager
+def _replace_on_success(path, buffering=-1):
+    """Yields path + ".tmp" opened for writing and renames it onto path only if the block succeeds.
+
+    On failure only the temporary file is removed, so whatever was at path
+    before is left alone and no partial, unauthenticated output is left behind.
+    """
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "wb", buffering=buffering) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def decrypt_file(in_path, out_path, key):
+    """Decrypts a file written by encrypt_file; out_path is only written if the whole file authenticates."""
+    with open(in_path, "rb") as src, _replace_on_success(out_path) as dst:
+        return decrypt_stream(src, dst, key)
+
+# --- Memory-mapped files ---
+# Same format as encrypt_file, but segments are encrypted straight from a mapping of the
+# input into a mapping of the output, and any one segment can be found by arithmetic.
+def _segment_count(plaintext_size, segment_size):
+    return max(1, -(-plaintext_size // segment_size)) # An empty file still has one (empty) segment
+
+def _read_stream_header(view, key):
+    """Checks a mapped stream's header; returns (Cipher, segment size, nonce prefix, segment count)."""
+    if len(view) < STREAM_HEADER.size:
+        raise ValueError("Not an encrypted stream: header too short")
+    magic, version, segment_size, salt, prefix = STREAM_HEADER.unpack_from(view)
+    if magic != STREAM_MAGIC or version != STREAM_VERSION:
+        raise ValueError("Not an encrypted stream or unsupported version")
+    if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+        raise ValueError("Corrupt stream header: bad segment size")
+    body = len(view) - STREAM_HEADER.size
+    count = max(1, -(-body // (segment_size + TAG_SIZE)))
+    if body - (count - 1) * (segment_size + TAG_SIZE) < TAG_SIZE:
+        raise ValueError("Truncated stream")
+    return _stream_cipher(key, salt), segment_size, prefix, count
+
+def _map(path, size, writable):
+    """Maps a whole file (resized to size when writable); None for empty files, which can't be mapped."""
+    with open(path, "r+b" if writable else "rb") as f:
+        if writable:
+            f.truncate(size)
+        if size == 0:
+            return None
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+def encrypt_file_mmap(in_path, out_path, key, segment_size=DEFAULT_SEGMENT_SIZE):
+    """Like encrypt_file, with no intermediate copies: both files are memory-mapped."""
+    if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+        raise ValueError(f"segment_size must be between 1 and {MAX_SEGMENT_SIZE}")
+    size = os.path.getsize(in_path)
+    count = _segment_count(size, segment_size)
+    header, cipher, prefix = _new_stream_header(key, segment_size)
+    open(out_path, "wb").close()
+    src = _map(in_path, size, False)
+    dst = _map(out_path, STREAM_HEADER.size + size + count * TAG_SIZE, True)
+    try:
+        with memoryview(src if src is not None else b"") as plain, memoryview(dst) as out:
+            out[:STREAM_HEADER.size] = header
+            for index in range(count):
+                start = index * segment_size
+                end = min(start + segment_size, size)
+                at = STREAM_HEADER.size + index * (segment_size + TAG_SIZE)
+                nonce = _stream_nonce(prefix, index, index == count - 1)
+                # Slices are passed inline: a named slice would keep the mapping exported past close()
+                if cipher.zero_copy:
+                    cipher.aesgcm.encrypt_into(nonce, plain[start:end], header, out[at:at + end - start + TAG_SIZE])
+                else:
+                    out[at:at + end - start + TAG_SIZE] = cipher.aesgcm.encrypt(nonce, bytes(plain[start:end]), header)
+    finally:
+        if src is not None:
+            src.close()
+        dst.close()
+    return size
+
+def _decrypt_segment_into(cipher, view, header, prefix, segment_size, count, index, target):
+    at = STREAM_HEADER.size + index * (segment_size + TAG_SIZE)
+    chunk = view[at:at + segment_size + TAG_SIZE]
+    nonce = _stream_nonce(prefix, index, index == count - 1)
+    try:
+        if target is None:
+            return cipher.aesgcm.decrypt(nonce, chunk, header)
+        if cipher.zero_copy:
+            cipher.aesgcm.decrypt_into(nonce, chunk, header, target)
+        else:
+            target[:] = cipher.aesgcm.decrypt(nonce, bytes(chunk), header)
+        return None
+    finally:
+        # A traceback would otherwise keep these views, and so the mappings, alive
+        chunk.release()
+        if target is not None:
+            target.release()
+
+def decrypt_file_mmap(in_path, out_path, key):
+    """Like decrypt_file, with no intermediate copies; out_path is only written if the whole file authenticates."""
+    src = _map(in_path, os.path.getsize(in_path), False)
+    if src is None:
+        raise ValueError("Not an encrypted stream: empty file")
+    tmp = out_path + ".tmp" # Renamed onto out_path on success, like decrypt_file
+    dst = None
+    try:
+        with memoryview(src) as view:
+            cipher, segment_size, prefix, count = _read_stream_header(view, key)
+            header = bytes(view[:STREAM_HEADER.size])
+            size = len(view) - STREAM_HEADER.size - count * TAG_SIZE
+            open(tmp, "wb").close()
+            dst = _map(tmp, size, True)
+            with memoryview(dst if dst is not None else bytearray()) as out:
+                for index in range(count):
+                    start = index * segment_size
+                    _decrypt_segment_into(cipher, view, header, prefix, segment_size, count, index,
+                                          out[start:min(start + segment_size, size)])
+        if dst is not None:
+            dst.close()
+            dst = None
+        os.replace(tmp, out_path)
+        return size
+    except Exception:
+        if dst is not None:
+            dst.close()
+            dst = None
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        if dst is not None:
+            dst.close()
+        src.close()
+
+def decrypt_range(path, key, offset, length):
+    """Decrypts plaintext bytes [offset, offset + length) of an encrypted file.
+
+    Only the segments covering the range are read and authenticated, so a small
+    read from a huge file costs one or two segments.
+    """
+    src = _map(path, os.path.getsize(path), False)
+    if src is None:
+        raise ValueError("Not an encrypted stream: empty file")
+    try:
+        with memoryview(src) as view:
+            cipher, segment_size, prefix, count = _read_stream_header(view, key)
+            header = bytes(view[:STREAM_HEADER.size])
+            size = len(view) - STREAM_HEADER.size - count * TAG_SIZE
+            if offset < 0 or length < 0:
+                raise ValueError("offset and length must not be negative")
+            end = min(offset + length, size)
+            if offset >= end:
+                return b""
+            first, last = offset // segment_size, (end - 1) // segment_size
+            parts = [_decrypt_segment_into(cipher, view, header, prefix, segment_size, count, index, None)
+                     for index in range(first, last + 1)]
+    finally:
+        src.close()
+    skip = offset - first * segment_size
+    return b"".join(parts)[skip:skip + end - offset]
+
+def decrypt_segment(path, key, index):
+    """Decrypts the plaintext of one segment of an encrypted file."""
+    src = _map(path, os.path.getsize(path), False)
+    if src is None:
+        raise ValueError("Not an encrypted stream: empty file")
+    try:
+        with memoryview(src) as view:
+            cipher, segment_size, prefix, count = _read_stream_header(view, key)
+            if not 0 <= index < count:
+                raise IndexError(f"Segment {index} out of range (file has {count})")
+            header = bytes(view[:STREAM_HEADER.size])
+            return _decrypt_segment_into(cipher, view, header, prefix, segment_size, count, index, None)
+    finally:
+        src.close()
+
+# --- Bulk ---
+class BulkStats:
+    """Running totals for a bulk job; throughput is measured from the first record."""
+
+    def __init__(self):
+        self.records = 0
+        self.bytes = 0 # Input bytes processed
+        self.started = None
+        self.finished = None
+
+    def add(self, records, nbytes):
+        self.records += records
+        self.bytes += nbytes
+        self.finished = time.perf_counter()
+
+    @property
+    def seconds(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def mb_per_s(self):
+        return self.bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    @property
+    def records_per_s(self):
+        return self.records / self.seconds if self.seconds else 0.0
+
+    def __repr__(self):
+        return (f"BulkStats({self.records} records, {self.bytes / 1e6:.1f} MB in {self.seconds:.3f} s: "
+                f"{self.mb_per_s:.1f} MB/s, {self.records_per_s:.0f} records/s)")
+
+def _make_executor(executor, workers):
+    if executor == "thread":
+        # AESGCM releases the GIL while it encrypts, so threads scale on large records
+        return ThreadPoolExecutor(max_workers=workers)
+    if executor == "process":
+        # Separate interpreters also parallelise the per-record Python overhead of small records
+        return ProcessPoolExecutor(max_workers=workers)
+    raise ValueError(f"Unknown executor {executor!r}, expected 'thread' or 'process'")
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _ordered_map(fn, key, batches, executor, workers, max_in_flight):
+    """Like executor.map, but pulls input lazily and keeps at most max_in_flight batches queued."""
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or workers * MAX_IN_FLIGHT_PER_WORKER
+    pending = deque()
+    with _make_executor(executor, workers) as pool:
+        for batch in batches:
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+            pending.append(pool.submit(fn, key, batch))
+        while pending:
+            yield pending.popleft().result()
+
+def _encrypt_batch(key, texts):
+    """Encrypts a batch of str/bytes records in the encrypt_text format; returns (tokens, input bytes)."""
+    cipher = Cipher(key) # One context for the whole batch
+    tokens, nbytes = [], 0
+    for text in texts:
+        data = text.encode() if isinstance(text, str) else text
+        tokens.append(cipher.encrypt_text(data))
+        nbytes += len(data)
+    return tokens, nbytes
+
+def _decrypt_batch(key, tokens):
+    """Decrypts a batch of encrypt_text tokens back to str; returns (texts, token bytes)."""
+    cipher = Cipher(key)
+    texts, nbytes = [], 0
+    for token in tokens:
+        texts.append(cipher.decrypt_text(token))
+        nbytes += len(token)
+    return texts, nbytes
+
+def _decrypt_batch_bytes(key, tokens):
+    """Like _decrypt_batch, but returns the plaintexts as bytes without decoding them."""
+    cipher = Cipher(key)
+    records, nbytes = [], 0
+    for token in tokens:
+        records.append(cipher.decrypt(base64.b64decode(token)))
+        nbytes += len(token)
+    return records, nbytes
+
+def _bulk(fn, items, key, workers, executor, batch_size, max_in_flight, stats):
+    stats = BulkStats() if stats is None else stats
+    stats.started = time.perf_counter()
+    for results, nbytes in _ordered_map(fn, key, _batches(items, batch_size), executor, workers, max_in_flight):
+        stats.add(len(results), nbytes)
+        yield from results
+
+def encrypt_many(texts, key, workers=None, executor="thread", batch_size=BULK_BATCH_SIZE,
+                 max_in_flight=None, stats=None):
+    """Encrypts an iterable of str/bytes records in parallel, yielding encrypt_text tokens in input order.
+
+    The input is consumed lazily, so it can be larger than memory. Pass a
+    BulkStats as stats to read throughput while or after iterating.
+    """
+    return _bulk(_encrypt_batch, texts, key, workers, executor, batch_size, max_in_flight, stats)
+
+def decrypt_many(tokens, key, workers=None, executor="thread", batch_size=BULK_BATCH_SIZE,
+                 max_in_flight=None, stats=None, decode=True):
+    """Decrypts encrypt_text tokens in parallel, yielding the texts in input order.
+
+    With decode=False the records are yielded as bytes, so records that
+    aren't UTF-8 text round-trip too. A tampered record raises InvalidTag
+    when its batch is reached.
+    """
+    fn = _decrypt_batch if decode else _decrypt_batch_bytes
+    return _bulk(fn, tokens, key, workers, executor, batch_size, max_in_flight, stats)
+
+def _encrypt_file_batch(key, jobs):
+    sizes = [encrypt_file(src, dst, key) for src, dst in jobs]
+    return [dst for _, dst in jobs], sum(sizes)
+
+def _decrypt_file_batch(key, jobs):
+    sizes = [decrypt_file(src, dst, key) for src, dst in jobs]
+    return [dst for _, dst in jobs], sum(sizes)
+
+def encrypt_files(paths, key, suffix=".enc", workers=None, executor="thread", stats=None):
+    """Encrypts every file to path + suffix in parallel; returns the output paths in input order."""
+    jobs = [(path, path + suffix) for path in paths]
+    return list(_bulk(_encrypt_file_batch, jobs, key, workers, executor, 1, None, stats))
+
+def decrypt_files(paths, key, suffix=".enc", workers=None, executor="thread", stats=None):
+    """Decrypts files written by encrypt_files, stripping suffix (or adding .dec) for the output."""
+    jobs = [(path, path[:-len(suffix)] if suffix and path.endswith(suffix) else path + ".dec") for path in paths]
+    return list(_bulk(_decrypt_file_batch, jobs, key, workers, executor, 1, None, stats))
+
+# --- Command Line ---
+IO_BUFFER_SIZE = 1024 * 1024 # Large buffers so pipes aren't read and written a few KB at a time
+KEY_ENV_VAR = "ENCRYPTION_KEY" # Base64 key, used when --key-file isn't given
+
+def interactive():
+    """The original prompt-driven menu; runs when the script is started without arguments."""
     while True:
         print("\nChoose an option:")
         print("1. Encrypt (AES-256-GCM)")
@@ -73,3 +707,109 @@ if __name__ == "__main__":
             break
         else:
             print("Invalid choice. Please enter 1, 2, or 3.")
+
+def _read_key(args):
+    if args.key_file:
+        with open(args.key_file, "rb") as f:
+            encoded = f.read().strip()
+    elif os.environ.get(KEY_ENV_VAR):
+        encoded = os.environ[KEY_ENV_VAR]
+    else:
+        raise ValueError(f"No key: pass --key-file or set {KEY_ENV_VAR}")
+    key = base64.b64decode(encoded, validate=True)
+    if len(key) != 32:
+        raise ValueError(f"Key must be 32 bytes (base64 of a 256-bit key), got {len(key)}")
+    return key
+
+def _open_input(path):
+    if path in (None, "-"):
+        return open(sys.stdin.fileno(), "rb", buffering=IO_BUFFER_SIZE, closefd=False)
+    return open(path, "rb", buffering=IO_BUFFER_SIZE)
+
+@contextmanager
+def _open_output(path):
+    """Output file written under a temporary name and renamed into place only if the command succeeds,
+    so a failed decrypt never leaves unauthenticated plaintext (or a clobbered file) at path."""
+    if path in (None, "-"):
+        with open(sys.stdout.fileno(), "wb", buffering=IO_BUFFER_SIZE, closefd=False) as f:
+            yield f
+        return
+    with _replace_on_success(path, IO_BUFFER_SIZE) as f:
+        yield f
+
+def _run_lines(args, key, src, dst):
+    """Newline-delimited batch mode: one record per input line, one token (or text) per output line."""
+    records = (line[:-1] if line.endswith(b"\n") else line for line in src)
+    stats = BulkStats()
+    if args.command == "encrypt":
+        for token in encrypt_many(records, key, args.jobs, args.executor, stats=stats):
+            dst.write(token)
+            dst.write(b"\n")
+    else:
+        for record in decrypt_many(records, key, args.jobs, args.executor, stats=stats, decode=False):
+            dst.write(record)  # Records are raw bytes, exactly as they were encrypted
+            dst.write(b"\n")
+    return stats
+
+def main(argv=None):
+    import argparse
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        interactive()
+        return 0
+
+    parser = argparse.ArgumentParser(description="AES-256-GCM encryption for files, pipes and record batches.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    keygen = commands.add_parser("keygen", help="write a new base64 key")
+    keygen.add_argument("-o", "--output", help="key file to create (default: stdout)")
+    for name in ("encrypt", "decrypt"):
+        command = commands.add_parser(name, help=f"{name} a file or stream")
+        command.add_argument("-k", "--key-file", help=f"file holding a base64 key (default: ${KEY_ENV_VAR})")
+        command.add_argument("-i", "--input", help="input file (default: stdin)")
+        command.add_argument("-o", "--output", help="output file (default: stdout)")
+        command.add_argument("--lines", action="store_true",
+                             help="treat each input line as one record (tokens are base64, one per line)")
+        command.add_argument("-j", "--jobs", type=int, default=1, help="worker count for --lines")
+        command.add_argument("--executor", choices=("thread", "process"), default="thread")
+        command.add_argument("--segment-size", type=int, default=DEFAULT_SEGMENT_SIZE, help=argparse.SUPPRESS)
+        command.add_argument("--stats", action="store_true", help="print throughput to stderr")
+    args = parser.parse_args(argv)
+
+    if args.command == "keygen":
+        key = base64.b64encode(generate_key()) + b"\n"
+        if args.output:
+            # Private from the start; never briefly world-readable
+            try:
+                fd = os.open(args.output, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                print(f"keygen failed: {args.output} already exists", file=sys.stderr)
+                return 1
+            with os.fdopen(fd, "wb") as f:
+                f.write(key)
+        else:
+            sys.stdout.buffer.write(key)
+        return 0
+
+    start = time.perf_counter()
+    try:
+        key = _read_key(args)
+        with _open_input(args.input) as src, _open_output(args.output) as dst:
+            if args.lines:
+                stats = _run_lines(args, key, src, dst)
+                records, nbytes = stats.records, stats.bytes
+            elif args.command == "encrypt":
+                records, nbytes = 1, encrypt_stream(src, dst, key, args.segment_size)
+            else:
+                records, nbytes = 1, decrypt_stream(src, dst, key)
+    except Exception as e:
+        print(f"{args.command} failed: {e!r}", file=sys.stderr)
+        return 1
+    if args.stats:
+        seconds = time.perf_counter() - start
+        print(f"{records} records, {nbytes / 1e6:.1f} MB in {seconds:.3f} s "
+              f"({nbytes / 1e6 / seconds:.1f} MB/s, {records / seconds:.0f} records/s)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
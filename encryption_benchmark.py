@@ -0,0 +1,275 @@
+import argparse
+import base64
+import io
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cryptography
+
+import benchmark_report
+import encryption
+from benchmark_report import DEFAULT_THRESHOLD
+from encryption import Cipher
+
+# --- Defaults ---
+DEFAULT_SIZES = ["16", "256", "4K", "64K", "1M", "16M"]
+DEFAULT_PATHS = ["text", "cipher", "cipher_into", "envelope", "stream", "bulk"]
+MIN_SECONDS = 0.2 # Each case repeats until it has run at least this long...
+MIN_REPEATS = 3 # ...and at least this many times
+BULK_RECORDS_BYTES = 64 * 1024 * 1024 # Bulk runs use as many records of each size as fit in this
+STREAM_DECRYPT_MAX_SIZE = 256 * 1024 * 1024
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(text):
+    """'16', '4K', '1M', '1G' -> bytes."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+# --- Stream helpers ---
+class RepeatingReader(io.RawIOBase):
+    """Readable file of `size` bytes that refills from one block, so 1 GB inputs cost no memory."""
+
+    def __init__(self, block, size):
+        self.block = memoryview(block)
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self.block), self.remaining)
+        buffer[:n] = self.block[:n]
+        self.remaining -= n
+        return n
+
+
+class NullWriter(io.RawIOBase):
+    """Writable file that only counts bytes."""
+
+    def __init__(self):
+        self.written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.written += len(data)
+        return len(data)
+
+
+# --- Cases ---
+# Each case factory gets (key, size) and returns (encrypt, decrypt, records): zero-argument
+# callables that process `records` messages of `size` plaintext bytes per call. decrypt is
+# None when a case can't be run at that size.
+def text_case(key, size):
+    text = "x" * size
+    token = encryption.encrypt_text(text, key)
+    return (lambda: encryption.encrypt_text(text, key)), (lambda: encryption.decrypt_text(token, key)), 1
+
+
+def cipher_case(key, size):
+    cipher = Cipher(key)
+    data = os.urandom(size)
+    message = cipher.encrypt(data)
+    return (lambda: cipher.encrypt(data)), (lambda: cipher.decrypt(message)), 1
+
+
+def cipher_into_case(key, size):
+    cipher = Cipher(key)
+    data = os.urandom(size)
+    message = bytearray(size + encryption.OVERHEAD)
+    out = bytearray(size)
+    cipher.encrypt_into(data, message)
+    return (lambda: cipher.encrypt_into(data, message)), (lambda: cipher.decrypt_into(message, out)), 1
+
+
+def envelope_case(key, size):
+    cipher = Cipher(key)
+    data = os.urandom(size)
+    message = encryption.seal(cipher, data)
+    return (lambda: encryption.seal(cipher, data)), (lambda: encryption.open_envelope(cipher, message)), 1
+
+
+def stream_case(key, size):
+    block = os.urandom(encryption.DEFAULT_SEGMENT_SIZE)
+
+    def encrypt():
+        encryption.encrypt_stream(RepeatingReader(block, size), NullWriter(), key)
+
+    if size > STREAM_DECRYPT_MAX_SIZE:
+        return encrypt, None, 1 # Decrypting would need the whole ciphertext held in memory
+    sample = io.BytesIO()
+    encryption.encrypt_stream(RepeatingReader(block, size), sample, key)
+    encrypted = sample.getvalue()
+
+    def decrypt():
+        encryption.decrypt_stream(io.BytesIO(encrypted), NullWriter(), key)
+
+    return encrypt, decrypt, 1
+
+
+def bulk_case(key, size):
+    count = max(1, min(BULK_RECORDS_BYTES // max(size, 1), 100000))
+    records = [b"x" * size] * count # decrypt_many returns str, so keep the records valid UTF-8
+    tokens = list(encryption.encrypt_many(records, key))
+
+    def encrypt():
+        for _ in encryption.encrypt_many(records, key):
+            pass
+
+    def decrypt():
+        for _ in encryption.decrypt_many(tokens, key):
+            pass
+
+    return encrypt, decrypt, count
+
+
+CASES = {
+    "text": text_case,
+    "cipher": cipher_case,
+    "cipher_into": cipher_into_case,
+    "envelope": envelope_case,
+    "stream": stream_case,
+    "bulk": bulk_case,
+}
+
+
+# --- Measurement ---
+def time_op(op, min_seconds=MIN_SECONDS, min_repeats=MIN_REPEATS):
+    """Mean seconds per call of op, repeating until min_seconds and min_repeats are both reached."""
+    repeats, start = 0, time.perf_counter()
+    while True:
+        op()
+        repeats += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds and repeats >= min_repeats:
+            return elapsed / repeats
+
+
+def measure_allocations(op):
+    """Peak Python heap growth during one call, and the blocks still held after it."""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    op()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - before, after - before
+
+
+def text_breakdown(key, size, min_seconds):
+    """Splits encrypt_text/decrypt_text into str encoding, AES and base64, timing each alone."""
+    aesgcm = Cipher(key).aesgcm
+    text = "x" * size
+    data = text.encode()
+    nonce = os.urandom(encryption.NONCE_SIZE)
+    ciphertext = aesgcm.encrypt(nonce, data, None)
+    raw = nonce + ciphertext
+    token = base64.b64encode(raw)
+    parts = {
+        "encrypt": {
+            "str_encode": time_op(lambda: text.encode(), min_seconds),
+            "aes": time_op(lambda: aesgcm.encrypt(nonce, data, None), min_seconds),
+            "concat_and_base64": time_op(lambda: base64.b64encode(nonce + ciphertext), min_seconds),
+        },
+        "decrypt": {
+            "base64": time_op(lambda: base64.b64decode(token), min_seconds),
+            "aes": time_op(lambda: aesgcm.decrypt(raw[:12], raw[12:], None), min_seconds),
+            "str_decode": time_op(lambda: data.decode(), min_seconds),
+        },
+    }
+    return {
+        direction: {name: seconds / sum(times.values()) for name, seconds in times.items()}
+        for direction, times in parts.items()
+    }
+
+
+def run_case(path, size, key, min_seconds=MIN_SECONDS, breakdown=True):
+    """Times and profiles one (path, message size) pair for both directions."""
+    encrypt, decrypt, records = CASES[path](key, size)
+    result = {"path": path, "size": size, "records_per_op": records}
+    for direction, op in (("encrypt", encrypt), ("decrypt", decrypt)):
+        if op is None:
+            continue
+        seconds = time_op(op, min_seconds)
+        peak, retained = measure_allocations(op)
+        result[direction] = {
+            "ns_per_op": seconds / records * 1e9,
+            "mb_per_s": size * records / 1e6 / seconds,
+            "ops_per_s": records / seconds,
+            "alloc_peak_bytes": peak / records,
+            "alloc_retained_bytes": retained / records,
+            "alloc_per_byte": peak / max(size * records, 1),
+        }
+    if breakdown and path == "text":
+        result["time_share"] = text_breakdown(key, size, min_seconds)
+    return result
+
+
+def run_benchmarks(paths, sizes, min_seconds=MIN_SECONDS):
+    key = encryption.generate_key()
+    results = []
+    for path in paths:
+        for size in sizes:
+            result = run_case(path, size, key, min_seconds)
+            summary = "  ".join(
+                f"{d} {result[d]['ns_per_op']:12.0f} ns/op {result[d]['mb_per_s']:8.1f} MB/s"
+                for d in ("encrypt", "decrypt") if d in result
+            )
+            print(f"{path:>11} {size:>11}  {summary}", file=sys.stderr)
+            results.append(result)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "cryptography": cryptography.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {"min_seconds": min_seconds},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Lists (path, size) cases whose encrypt or decrypt ns/op grew by more than threshold."""
+    return benchmark_report.compare(baseline, current, ("path", "size"), case_metrics, threshold)
+
+
+def case_metrics(result):
+    return {direction: result[direction]["ns_per_op"] for direction in ("encrypt", "decrypt") if direction in result}
+
+
+def describe_regression(r):
+    return f"{r['path']} size={r['size']} {r['metric']}: {r['baseline']:.0f} -> {r['current']:.0f} ns/op"
+
+
+# --- Command Line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput and allocation benchmarks for encryption.py.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark sweep and print/write JSON")
+    run.add_argument("--paths", nargs="+", choices=list(CASES), default=DEFAULT_PATHS)
+    run.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="message sizes, e.g. 16 4K 1M 1G")
+    run.add_argument("--min-seconds", type=float, default=MIN_SECONDS)
+    run.add_argument("-o", "--output", help="write the JSON report here instead of stdout")
+
+    benchmark_report.add_compare_command(commands)
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        report = run_benchmarks(args.paths, [parse_size(s) for s in args.sizes], args.min_seconds)
+        benchmark_report.write_report(report, args.output)
+        return 0
+    return benchmark_report.run_compare(args, compare, describe_regression)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
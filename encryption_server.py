@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from encryption import Cipher, generate_key, open_envelope, seal
+
+# --- Protocol ---
+# Every frame is a 4-byte big-endian length followed by that many bytes.
+# Request body:  request id (4 bytes), op (1 byte), payload
+# Response body: request id (4 bytes), status (1 byte), payload
+# Clients may pipeline any number of requests on one connection; responses carry the
+# request id and can arrive out of order, since large payloads finish later.
+FRAME_LENGTH = struct.Struct(">I")
+REQUEST_HEADER = struct.Struct(">IB")
+RESPONSE_HEADER = struct.Struct(">IB")
+OP_ENCRYPT = 1 # payload: plaintext -> envelope
+OP_DECRYPT = 2 # payload: envelope -> plaintext
+OP_PING = 3
+STATUS_OK = 0
+STATUS_ERROR = 1 # payload: UTF-8 error message
+# A request too short to carry its header is answered with STATUS_ERROR under request id 0;
+# the length prefix keeps the stream in sync, so the connection stays open.
+
+# --- Defaults ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+# Smaller payloads are encrypted on the event loop: handing a ~3 us job to a thread
+# costs more than the job itself. Larger ones go to the executor so they don't stall
+# other connections (AESGCM releases the GIL while it works).
+INLINE_MAX_SIZE = 16 * 1024
+MAX_IN_FLIGHT = 256 # Offloaded requests per connection before we stop reading from it
+
+
+def load_key(path):
+    """Reads a base64 key (as printed by the encryption menu) from a file."""
+    with open(path, "rb") as f:
+        key = base64.b64decode(f.read().strip(), validate=True)
+    if len(key) != 32:
+        raise ValueError(f"Key must be 32 bytes (base64 of a 256-bit key), got {len(key)}")
+    return key
+
+
+def encode_frame(header, request_id, code, payload=b""):
+    body_size = header.size + len(payload)
+    return FRAME_LENGTH.pack(body_size) + header.pack(request_id, code) + payload
+
+
+async def read_frame(reader):
+    """Returns the body of the next frame, or None at a clean end of stream."""
+    try:
+        prefix = await reader.readexactly(FRAME_LENGTH.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise
+        return None
+    (size,) = FRAME_LENGTH.unpack(prefix)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+    return await reader.readexactly(size)
+
+
+# --- Server ---
+class EncryptionServer:
+    """Serves encrypt/decrypt requests for one key over TCP or a Unix socket."""
+
+    def __init__(self, key, workers=None):
+        self.cipher = Cipher(key)
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+        self.requests = 0
+
+    def process(self, op, payload):
+        if op == OP_ENCRYPT:
+            return seal(self.cipher, payload)
+        if op == OP_DECRYPT:
+            return open_envelope(self.cipher, payload)[0]
+        if op == OP_PING:
+            return b""
+        raise ValueError(f"Unknown op {op}")
+
+    def response(self, request_id, op, payload):
+        """Builds the response frame for one request; safe to call from worker threads."""
+        try:
+            return encode_frame(RESPONSE_HEADER, request_id, STATUS_OK, self.process(op, payload))
+        except Exception as e:
+            return encode_frame(RESPONSE_HEADER, request_id, STATUS_ERROR, repr(e).encode())
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(MAX_IN_FLIGHT)
+        pending = set()
+
+        async def offload(request_id, op, payload):
+            try:
+                # Only the event loop touches the transport; the worker just builds the frame
+                writer.write(await loop.run_in_executor(self.executor, self.response, request_id, op, payload))
+                self.requests += 1
+            finally:
+                slots.release()
+
+        try:
+            while True:
+                body = await read_frame(reader)
+                if body is None:
+                    break
+                if len(body) < REQUEST_HEADER.size:
+                    message = f"Request of {len(body)} bytes is shorter than its {REQUEST_HEADER.size} byte header"
+                    writer.write(encode_frame(RESPONSE_HEADER, 0, STATUS_ERROR, message.encode()))
+                    await writer.drain()
+                    continue
+                request_id, op = REQUEST_HEADER.unpack_from(body)
+                payload = memoryview(body)[REQUEST_HEADER.size:]
+                if len(payload) <= INLINE_MAX_SIZE:
+                    writer.write(self.response(request_id, op, payload))
+                    self.requests += 1
+                else:
+                    await slots.acquire()
+                    task = asyncio.create_task(offload(request_id, op, payload))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                # Applies backpressure when the client stops reading its responses
+                await writer.drain()
+            if pending:
+                await asyncio.gather(*pending)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass # Client went away or sent garbage; just drop the connection
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, ready=None):
+        """Runs until cancelled; listens on the Unix socket `path` if given, else on host:port."""
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection, path)
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+
+# --- Load Generator ---
+async def open_connection(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+    if path is not None:
+        return await asyncio.open_unix_connection(path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _load_connection(address, count, depth, payload, latencies):
+    """Sends `count` encrypt requests, keeping up to `depth` of them unanswered at once.
+
+    Sending and receiving run as two tasks; an error reply or a closed
+    connection fails the receiver, which cancels the sender instead of leaving
+    it waiting for a window slot that will never free up.
+    """
+    reader, writer = await open_connection(*address)
+    sent_at = {}
+    window = asyncio.Semaphore(depth)
+
+    async def send():
+        for request_id in range(count):
+            await window.acquire()
+            sent_at[request_id] = time.perf_counter()
+            writer.write(encode_frame(REQUEST_HEADER, request_id, OP_ENCRYPT, payload))
+            await writer.drain()
+
+    async def receive():
+        for received in range(count):
+            body = await read_frame(reader)
+            if body is None:
+                raise ConnectionError(f"Server closed the connection after {received} of {count} responses")
+            request_id, status = RESPONSE_HEADER.unpack_from(body)
+            if status != STATUS_OK:
+                raise RuntimeError(body[RESPONSE_HEADER.size:].decode())
+            latencies.append(time.perf_counter() - sent_at.pop(request_id))
+            window.release()
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+
+def percentile(sorted_values, q):
+    """q-th percentile of an ascending list, interpolating between neighbours like numpy.percentile."""
+    position = (len(sorted_values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+async def run_load(address, connections=4, requests=10000, depth=32, size=256):
+    """Drives the server with pipelined encrypt requests; returns latency and throughput stats."""
+    payload = os.urandom(size)
+    latencies = []
+    per_connection = max(1, requests // connections)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _load_connection(address, per_connection, depth, payload, latencies) for _ in range(connections)
+    ])
+    elapsed = time.perf_counter() - start
+    latency_ms = sorted(latency * 1000 for latency in latencies)
+    return {
+        "connections": connections,
+        "depth": depth,
+        "payload_bytes": size,
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_s": len(latencies) / elapsed,
+        "mb_per_s": len(latencies) * size / 1e6 / elapsed,
+        "latency_ms": {
+            "p50": percentile(latency_ms, 50),
+            "p99": percentile(latency_ms, 99),
+            "max": latency_ms[-1],
+        },
+    }
+
+
+async def _self_test(args):
+    """Starts a server in-process and benchmarks it, for quick local measurements."""
+    server = EncryptionServer(generate_key(), args.workers)
+    ready = asyncio.Event()
+    serving = asyncio.create_task(server.serve(args.host, args.port, args.unix, ready))
+    await ready.wait()
+    try:
+        return await run_load((args.host, args.port, args.unix), args.connections, args.requests,
+                              args.depth, args.size)
+    finally:
+        serving.cancel()
+
+
+# --- Command Line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local encryption service and load generator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="serve encrypt/decrypt requests")
+    serve.add_argument("--keyfile", required=True,
+                       help="file holding a base64 key (clients need the same key to open its envelopes)")
+    serve.add_argument("--workers", type=int)
+
+    load = commands.add_parser("load", help="benchmark a running server")
+    bench = commands.add_parser("bench", help="start a server in-process and benchmark it")
+    bench.add_argument("--workers", type=int)
+    for command in (serve, load, bench):
+        command.add_argument("--host", default=DEFAULT_HOST)
+        command.add_argument("--port", type=int, default=DEFAULT_PORT)
+        command.add_argument("--unix", help="Unix socket path (instead of TCP)")
+    for command in (load, bench):
+        command.add_argument("--connections", type=int, default=4)
+        command.add_argument("--requests", type=int, default=10000)
+        command.add_argument("--depth", type=int, default=32, help="pipelined requests per connection")
+        command.add_argument("--size", type=int, default=256, help="payload bytes per request")
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        try:
+            key = load_key(args.keyfile)
+        except (OSError, ValueError) as e:
+            print(f"Cannot read key: {e!r}", file=sys.stderr)
+            return 1
+        where = args.unix or f"{args.host}:{args.port}"
+        print(f"Serving on {where}", file=sys.stderr)
+        try:
+            asyncio.run(EncryptionServer(key, args.workers).serve(args.host, args.port, args.unix))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.command == "load":
+        report = asyncio.run(run_load((args.host, args.port, args.unix), args.connections, args.requests,
+                                      args.depth, args.size))
+    else:
+        report = asyncio.run(_self_test(args))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,13 @@
-import pygame
 import random
 import math
-
-# Initialize Pygame
-pygame.init()
+import numpy as np
+from particle_renderer import SpriteCache, SpriteRenderer
+from shape_registry import ShapeRegistry
+from scheduler import run_simulation
+from parallel_step import ParallelStepper
 
 # Screen dimensions
 WIDTH, HEIGHT = 800, 600
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Fiery Shapes")
 
 # Colors
 BLACK = (0, 0, 0)
@@ -17,6 +16,20 @@ ORANGE = (255, 165, 0)
 YELLOW = (255, 255, 0)
 FIERY_COLORS = [RED, ORANGE, YELLOW]
 
+RENDER_MODE = "fblits" # "circle", "blits" or "fblits" (see particle_renderer)
+SPRITE_CACHE_SIZE = 2048 # Max pre-rendered alpha sprites kept around (colors x radii x alphas is ~1000)
+SPRITE_ALPHA_STEP = 1 # Raise (e.g. to 8) to trade exact fades for fewer cached sprites
+USE_PARTICLE_POOL = True # Array-backed ParticlePool instead of a list of Particle objects
+WORKERS = 0 # Worker processes for the particle ageing update (0 = update in this process; see parallel_step)
+POOL_CAPACITY = 50000 # Max live particles in the pool
+EMISSION_RATE = 5 # Particles spawned per physics step
+MEAN_LIFESPAN = 40 # Average lifespan in steps (yellow 20-40, others 30-60)
+SHAPE_DURATION = 5000 # Milliseconds of simulated time per shape
+POINTS_PER_SHAPE = 100 # Number of points to define the shape outline
+
+# Pre-rendered faded circles for Particle.draw; each Simulation's renderer keeps its own
+sprite_cache = SpriteCache(SPRITE_CACHE_SIZE, alpha_step=SPRITE_ALPHA_STEP)
+
 # Particle class
 class Particle:
     def __init__(self, x, y):
@@ -42,16 +55,119 @@ class Particle:
              self.radius -= 0.5
 
 
+    def get_alpha(self):
+        return max(0, min(255, int(255 * (self.lifespan / 30)))) # Fade out
+
     def draw(self, surface):
         if self.lifespan > 0:
-            # Draw a circle with alpha blending for a softer look
-            s = pygame.Surface((self.radius * 2, self.radius * 2), pygame.SRCALPHA)
-            alpha = max(0, min(255, int(255 * (self.lifespan / 30)))) # Fade out
-            color_with_alpha = self.color + (alpha,)
-            pygame.draw.circle(s, color_with_alpha, (self.radius, self.radius), self.radius)
+            # Blit a cached alpha-blended circle for a softer look
+            s = sprite_cache.get(self.color, self.radius, self.get_alpha())
             surface.blit(s, (int(self.x - self.radius), int(self.y - self.radius)))
 
 
+# --- Pooled Particles ---
+PARALLEL_FIELDS = ("x", "y", "vx", "vy", "radius", "lifespan") # ParticlePool arrays the ageing kernel touches
+
+def age_particles(x, y, vx, vy, radius, lifespan):
+    """Moves particles and ages them by one step, on arrays (or slices of them) in place."""
+    x += vx
+    y += vy
+    lifespan -= 1
+    # Slightly reduce radius over time
+    shrink = (radius > 1) & (lifespan % 5 == 0)
+    radius -= shrink * 0.5
+
+def age_kernel(arrays, lo, hi, params):
+    """ParallelStepper kernel: age_particles on one worker's slice of the live particles."""
+    age_particles(*(arrays[name][lo:hi] for name in PARALLEL_FIELDS))
+
+class ParticlePool:
+    """Fixed-capacity, array-backed version of a list of Particle objects.
+
+    Live particles are packed into the first `count` slots; dead ones are
+    removed by swapping live particles from the tail into their slots, so
+    spawning and culling never allocate.
+    """
+
+    def __init__(self, capacity=POOL_CAPACITY, rng=None):
+        self.capacity = capacity
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.count = 0
+        self.dropped = 0 # Spawns refused because the pool was full
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.lifespan = np.zeros(capacity, dtype=np.int64)
+        self.color_index = np.zeros(capacity, dtype=np.int64)
+        self.palette = np.array(FIERY_COLORS, dtype=np.uint8)
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def spawn(self, points, n):
+        """Spawns n particles at randomly chosen points, with the same ranges as Particle.__init__."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            return
+        free = self.capacity - self.count
+        self.dropped += max(0, n - free)
+        n = min(n, free)
+        if n <= 0:
+            return
+        new = slice(self.count, self.count + n)
+        rng = self.rng
+        chosen = points[rng.integers(0, len(points), n)]
+        self.x[new] = chosen[:, 0]
+        self.y[new] = chosen[:, 1]
+        self.vx[new] = rng.uniform(-1, 1, n)
+        self.vy[new] = rng.uniform(-1, 1, n)
+        colors = rng.integers(0, len(FIERY_COLORS), n)
+        self.color_index[new] = colors
+        # Make yellow particles slightly smaller/shorter lifespan for effect
+        yellow = colors == FIERY_COLORS.index(YELLOW)
+        self.radius[new] = np.where(yellow, rng.integers(2, 5, n), rng.integers(3, 7, n))
+        self.lifespan[new] = np.where(yellow, rng.integers(20, 41, n), rng.integers(30, 61, n))
+        self.count += n
+
+    def update(self):
+        live = slice(0, self.count)
+        age_particles(self.x[live], self.y[live], self.vx[live], self.vy[live], self.radius[live], self.lifespan[live])
+
+    def cull(self):
+        """Removes dead particles by moving live ones from the tail into their slots."""
+        dead = np.flatnonzero(self.lifespan[:self.count] <= 0)
+        if len(dead) == 0:
+            return
+        new_count = self.count - len(dead)
+        holes = dead[dead < new_count]
+        tail = np.arange(new_count, self.count)
+        movers = tail[self.lifespan[new_count:self.count] > 0]
+        for array in (self.x, self.y, self.vx, self.vy, self.radius, self.lifespan, self.color_index):
+            array[holes] = array[movers]
+        self.count = new_count
+
+    def get_alphas(self):
+        return np.clip((255 * (self.lifespan[:self.count] / 30)).astype(np.int64), 0, 255) # Fade out
+
+    def draw(self, surface, renderer, alpha=1.0):
+        """Draws live particles; alpha < 1 draws them part way back along their last step."""
+        live = slice(0, self.count)
+        visible = self.lifespan[live] > 0
+        back = 1.0 - alpha
+        renderer.draw_circles(
+            surface,
+            (self.x[live] - self.vx[live] * back)[visible],
+            (self.y[live] - self.vy[live] * back)[visible],
+            self.radius[live][visible],
+            self.palette[self.color_index[live][visible]],
+            self.get_alphas()[visible],
+        )
+
 # --- Shape Point Generation ---
 def get_circle_points(center_x, center_y, radius, num_points):
     points = []
@@ -94,68 +210,176 @@ def get_diamond_points(center_x, center_y, width, height, num_points_per_side=20
     return points
 
 
+# --- Shape Registry ---
+# Shape outlines only change every few seconds, so generate each one once
+shape_registry = ShapeRegistry()
+shape_registry.register("circle", lambda n, cx, cy, radius: get_circle_points(cx, cy, radius, n))
+shape_registry.register("star", lambda n, cx, cy, outer, inner: get_star_points(cx, cy, outer, inner, n))
+shape_registry.register("diamond", lambda n, cx, cy, w, h: get_diamond_points(cx, cy, w, h, n))
+
+
+# --- Simulation ---
+class Simulation:
+    """Fiery particles streaming off a cycling shape outline: step(dt) advances, render(surface) draws."""
+
+    title = "Fiery Shapes"
+
+    def __init__(self, count=None, seed=None, render_mode=RENDER_MODE, workers=WORKERS):
+        """count is roughly how many particles should be alive at once (None keeps EMISSION_RATE)."""
+        if seed is not None:
+            random.seed(seed) # Particle objects draw from the random module
+        self.emission_rate = EMISSION_RATE if count is None else max(1, math.ceil(count / MEAN_LIFESPAN))
+        self.base_emission_rate = self.emission_rate
+        capacity = max(POOL_CAPACITY, 2 * self.emission_rate * 60) # Lifespans never exceed 60 steps
+        self.particles = ParticlePool(capacity, rng=np.random.default_rng(seed)) if USE_PARTICLE_POOL else []
+        # Own cache, so set_quality's alpha step doesn't leak into other simulations or Particle.draw
+        self.renderer = SpriteRenderer(render_mode, cache=SpriteCache(SPRITE_CACHE_SIZE, alpha_step=SPRITE_ALPHA_STEP))
+        self.stepper = None
+        if USE_PARTICLE_POOL and workers:
+            # Spawning and culling stay here; workers only age the live slots [0, count)
+            self.stepper = ParallelStepper(age_kernel, self.particles, PARALLEL_FIELDS, workers)
+
+        self.shape_index = 0
+        self.elapsed_ms = 0.0 # Simulated time, so shape switches don't depend on the frame rate
+        self.shape_change_time = 0.0
+        center_x, center_y = WIDTH // 2, HEIGHT // 2
+        # (name, point count, *params); the star uses 5 tips and the diamond points per side
+        self.shapes = [
+            ("circle", POINTS_PER_SHAPE, center_x, center_y, 150),
+            ("star", 5, center_x, center_y, 150, 75), # 5-point star
+            ("diamond", POINTS_PER_SHAPE // 4, center_x, center_y, 250, 300),
+        ]
+        shape_registry.precompute(self.shapes)
+
+    def __len__(self):
+        return len(self.particles)
+
+    def step(self, dt):
+        self.elapsed_ms += dt * 1000
+
+        # --- Shape Switching ---
+        if self.elapsed_ms - self.shape_change_time > SHAPE_DURATION:
+            self.shape_index = (self.shape_index + 1) % len(self.shapes)
+            self.shape_change_time = self.elapsed_ms
+            if USE_PARTICLE_POOL:
+                self.particles.clear() # Reuse the pool's arrays for the new shape
+            else:
+                self.particles = [] # Clear particles for new shape
+
+        # --- Particle Generation ---
+        shape_points = shape_registry.get(*self.shapes[self.shape_index])
+
+        # Add a few particles each step based on shape points, then age and remove dead ones
+        if USE_PARTICLE_POOL:
+            self.particles.spawn(shape_points, self.emission_rate)
+            if self.stepper is not None:
+                self.stepper.step(self.particles.count)
+            else:
+                self.particles.update()
+            self.particles.cull()
+        else:
+            if len(shape_points): # Ensure points list is not empty
+                for _ in range(self.emission_rate):
+                    px, py = random.choice(shape_points)
+                    self.particles.append(Particle(px, py))
+            for particle in self.particles:
+                particle.update()
+            # Remove dead particles (iterate backwards)
+            for i in range(len(self.particles) - 1, -1, -1):
+                if self.particles[i].lifespan <= 0:
+                    self.particles.pop(i)
+
+    def close(self):
+        """Stops the update workers, if any."""
+        if self.stepper is not None:
+            self.stepper.close()
+            self.stepper = None
+
+    def set_quality(self, level):
+        """Applies an adaptive_quality level: scales emission and coarsens sprite alpha steps.
+
+        Fewer spawns thin the fire out as older particles burn down, so the
+        particle count changes without anything popping.
+        """
+        self.emission_rate = max(1, round(self.base_emission_rate * level.emission))
+        self.renderer.cache.alpha_step = max(SPRITE_ALPHA_STEP, level.alpha_step)
+
+    def render(self, surface, alpha=1.0):
+        """Draws all live particles, interpolated `alpha` of the way from the previous step."""
+        surface.fill(BLACK)
+        if USE_PARTICLE_POOL:
+            self.particles.draw(surface, self.renderer, alpha)
+        else:
+            # Same pixels as Particle.draw, in one batch
+            back = 1.0 - alpha
+            self.renderer.draw_circles(
+                surface,
+                [particle.x - particle.vx * back for particle in self.particles],
+                [particle.y - particle.vy * back for particle in self.particles],
+                [particle.radius for particle in self.particles],
+                [particle.color for particle in self.particles],
+                [particle.get_alpha() for particle in self.particles],
+            )
+
+    # --- Record / Replay (see state_log; needs USE_PARTICLE_POOL) ---
+    def frame_columns(self, alpha=1.0):
+        """The visible particles' values render(surface, alpha) draws with, for the state log."""
+        pool = self.particles
+        live = slice(0, pool.count)
+        visible = pool.lifespan[live] > 0
+        back = 1.0 - alpha
+        return {
+            "x": (pool.x[live] - pool.vx[live] * back)[visible],
+            "y": (pool.y[live] - pool.vy[live] * back)[visible],
+            "radius": pool.radius[live][visible],
+            "color_index": pool.color_index[live][visible],
+            "alpha": pool.get_alphas()[visible],
+        }
+
+    def render_columns(self, surface, columns):
+        """Draws one recorded frame_columns() frame without stepping."""
+        surface.fill(BLACK)
+        self.renderer.draw_circles(
+            surface,
+            columns["x"].astype(np.float64),
+            columns["y"].astype(np.float64),
+            columns["radius"].astype(np.float64),
+            self.particles.palette[columns["color_index"].astype(np.int64)],
+            columns["alpha"].astype(np.int64),
+        )
+
+    def snapshot(self):
+        """Everything step() depends on, copied: live pool slots, shape clock and RNG states."""
+        pool = self.particles
+        live = slice(0, pool.count)
+        return {
+            "arrays": {name: getattr(pool, name)[live].copy()
+                       for name in ("x", "y", "vx", "vy", "radius", "lifespan", "color_index")},
+            "count": pool.count,
+            "dropped": pool.dropped,
+            "shape_index": self.shape_index,
+            "elapsed_ms": self.elapsed_ms,
+            "shape_change_time": self.shape_change_time,
+            "emission_rate": self.emission_rate,
+            "rng": pool.rng.bit_generator.state,
+            "random": random.getstate(),
+        }
+
+    def restore(self, state):
+        """Puts back a snapshot() taken from a simulation with the same emission rate."""
+        pool = self.particles
+        pool.count = state["count"]
+        for name, values in state["arrays"].items():
+            getattr(pool, name)[:pool.count] = values # In place: the arrays may be shared with workers
+        pool.dropped = state["dropped"]
+        self.shape_index = state["shape_index"]
+        self.elapsed_ms = state["elapsed_ms"]
+        self.shape_change_time = state["shape_change_time"]
+        self.emission_rate = state["emission_rate"]
+        pool.rng.bit_generator.state = state["rng"]
+        random.setstate(state["random"])
+
+
 # --- Main Loop ---
-particles = []
-running = True
-clock = pygame.time.Clock()
-
-shape_index = 0
-shapes = ["circle", "star", "diamond"]
-shape_change_time = pygame.time.get_ticks()
-shape_duration = 5000 # milliseconds (5 seconds)
-points_per_shape = 100 # Number of points to define the shape outline
-
-center_x, center_y = WIDTH // 2, HEIGHT // 2
-
-while running:
-    time_now = pygame.time.get_ticks()
-
-    # --- Event Handling ---
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-
-    # --- Shape Switching ---
-    if time_now - shape_change_time > shape_duration:
-        shape_index = (shape_index + 1) % len(shapes)
-        shape_change_time = time_now
-        particles = [] # Clear particles for new shape
-
-    current_shape = shapes[shape_index]
-
-    # --- Particle Generation ---
-    if current_shape == "circle":
-        shape_points = get_circle_points(center_x, center_y, 150, points_per_shape)
-    elif current_shape == "star":
-        shape_points = get_star_points(center_x, center_y, 150, 75, 5) # 5-point star
-        # Adjust points_per_shape for star as get_star_points generates specific points
-    elif current_shape == "diamond":
-        shape_points = get_diamond_points(center_x, center_y, 250, 300, points_per_shape // 4)
-         # Adjust points_per_shape for diamond
-
-    # Add a few particles each frame based on shape points
-    if shape_points: # Ensure points list is not empty
-        for _ in range(5): # Add 5 particles per frame
-            px, py = random.choice(shape_points)
-            particles.append(Particle(px, py))
-
-
-    # --- Update and Draw ---
-    screen.fill(BLACK)
-
-    for particle in particles:
-        particle.update()
-        particle.draw(screen)
-
-    # Remove dead particles (iterate backwards)
-    for i in range(len(particles) - 1, -1, -1):
-        if particles[i].lifespan <= 0:
-            particles.pop(i)
-
-    # --- Display Update ---
-    pygame.display.flip()
-
-    # --- Frame Rate Control ---
-    clock.tick(60) # Limit to 60 FPS
-
-pygame.quit()
+if __name__ == "__main__":
+    run_simulation(Simulation(), (WIDTH, HEIGHT))
@@ -0,0 +1,235 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # Offline: no window needed
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pygame
+
+from scheduler import PHYSICS_HZ, FixedTimestepScheduler
+from simulations import SIMULATIONS, create_simulation
+
+# --- Defaults ---
+FORMATS = ("raw", "png", "ffmpeg")
+DEFAULT_FPS = 60
+RING_SIZE = 8  # Frame buffers shared with the writer thread; capture waits only when all are queued
+
+
+# --- Writers ---
+# Writers get frames as contiguous (height, width, 3) uint8 RGB arrays and run on the writer thread.
+class RawWriter:
+    """Appends frames to one headerless rgb24 file (e.g. ffmpeg -f rawvideo -pix_fmt rgb24)."""
+
+    def __init__(self, path, size, fps):
+        self.file = open(path, "wb", buffering=0)
+
+    def write(self, frame):
+        self.file.write(memoryview(frame).cast("B"))  # No copy; the GIL is released during the write
+
+    def close(self):
+        self.file.close()
+
+
+class PngWriter:
+    """Writes path % frame_number for every frame, e.g. frames/frame_%06d.png."""
+
+    def __init__(self, path, size, fps):
+        if "%" not in path:
+            path = os.path.join(path, "frame_%06d.png")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.pattern = path
+        self.size = size
+        self.frames = 0
+
+    def write(self, frame):
+        image = pygame.image.frombuffer(frame, self.size, "RGB")  # Wraps the buffer, no copy
+        pygame.image.save(image, self.pattern % self.frames)
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+class FfmpegWriter:
+    """Pipes raw frames into a local ffmpeg process, which encodes to path (format from the extension)."""
+
+    def __init__(self, path, size, fps, ffmpeg="ffmpeg", codec_args=("-c:v", "libx264", "-pix_fmt", "yuv420p")):
+        executable = shutil.which(ffmpeg)
+        if executable is None:
+            raise RuntimeError(f"{ffmpeg} not found on PATH; use the raw or png format instead")
+        command = [executable, "-loglevel", "error", "-y",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{size[0]}x{size[1]}", "-r", str(fps),
+                   "-i", "-", *codec_args, path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(memoryview(frame).cast("B"))
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with status {self.process.returncode}")
+
+
+WRITERS = {"raw": RawWriter, "png": PngWriter, "ffmpeg": FfmpegWriter}
+
+
+# --- Exporter ---
+class FrameExporter:
+    """Copies rendered frames into a ring of reusable buffers; a background thread writes them out.
+
+    capture() only copies the surface's 32-bit pixels (a plain memory copy);
+    the writer thread unpacks them to RGB. capture() waits only when every
+    buffer is still queued for writing, and that wait is counted in stall_seconds.
+    """
+
+    def __init__(self, writer, size, ring_size=RING_SIZE):
+        self.writer = writer
+        self.size = size
+        self.buffers = [np.empty((size[1], size[0]), dtype=np.uint32) for _ in range(ring_size)]
+        self.rgb = np.empty((size[1], size[0], 3), dtype=np.uint8)  # Writer-thread scratch frame
+        self.channels = None  # Byte offsets of R, G and B within a pixel, from the first surface
+        self.free = queue.Queue()
+        for index in range(ring_size):
+            self.free.put(index)
+        self.filled = queue.Queue()
+        self.frames = 0
+        self.stall_seconds = 0.0
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            index = self.filled.get()
+            if index is None:
+                return
+            try:
+                if self.error is None:
+                    pixels = self.buffers[index].view(np.uint8).reshape(self.size[1], self.size[0], 4)
+                    for channel, offset in enumerate(self.channels):
+                        self.rgb[..., channel] = pixels[..., offset]
+                    self.writer.write(self.rgb)
+            except Exception as e:
+                self.error = e  # Reported on the next capture(); keep draining so capture never deadlocks
+            finally:
+                self.free.put(index)
+
+    def capture(self, surface):
+        """Queues a copy of surface's pixels (which must match the exporter size) for writing."""
+        if self.error is not None:
+            raise RuntimeError("Frame writer failed") from self.error
+        if self.channels is None:
+            if surface.get_bytesize() != 4 or sys.byteorder != "little":
+                raise ValueError("Frame export needs 32-bit surfaces")
+            self.channels = [shift // 8 for shift in surface.get_shifts()[:3]]
+        start = time.perf_counter()
+        index = self.free.get()
+        self.stall_seconds += time.perf_counter() - start
+        pixels = pygame.surfarray.pixels2d(surface)  # (width, height) view, locks the surface
+        np.copyto(self.buffers[index], pixels.T)  # Transposing packed 32-bit pixels is cheap
+        del pixels  # Unlock the surface
+        self.filled.put(index)
+        self.frames += 1
+
+    def close(self):
+        """Waits for every queued frame to be written, then closes the writer."""
+        self.filled.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise RuntimeError("Frame writer failed") from self.error
+
+
+def fit_rect(native_size, size):
+    """The largest rect with native_size's aspect ratio centered in size (letterbox or pillarbox bars around it)."""
+    scale = min(size[0] / native_size[0], size[1] / native_size[1])
+    width = max(1, round(native_size[0] * scale))
+    height = max(1, round(native_size[1] * scale))
+    return pygame.Rect((size[0] - width) // 2, (size[1] - height) // 2, width, height)
+
+
+def render_offline(simulation, native_size, frames, exporter, fps=DEFAULT_FPS, physics_hz=PHYSICS_HZ):
+    """Renders `frames` frames of simulated time at `fps` as fast as possible; returns timing stats.
+
+    Physics runs on the same fixed-timestep scheduler as the live window, so
+    the clip matches what run_simulation would show at that frame rate.
+    """
+    scheduler = FixedTimestepScheduler(physics_hz, max_substeps=sys.maxsize)  # Offline: never drop time
+    canvas = pygame.Surface(native_size, 0, 32)
+    output = canvas if exporter.size == tuple(native_size) else pygame.Surface(exporter.size, 0, 32)
+    if output is not canvas:
+        # Scale without distorting: the picture fills fit_rect and the bars around it stay black
+        output.fill((0, 0, 0))
+        picture = output.subsurface(fit_rect(native_size, exporter.size))
+    frame_dt = 1.0 / fps
+    start = time.perf_counter()
+    for _ in range(frames):
+        scheduler.tick(simulation, frame_dt)
+        simulation.render(canvas, scheduler.alpha)
+        if output is not canvas:
+            pygame.transform.smoothscale(canvas, picture.get_size(), picture)
+        exporter.capture(output)
+    render_seconds = time.perf_counter() - start
+    exporter.close()
+    total_seconds = time.perf_counter() - start
+    clip_seconds = frames / fps
+    return {
+        "frames": frames,
+        "clip_seconds": clip_seconds,
+        "render_seconds": render_seconds,
+        "total_seconds": total_seconds,  # Including the writer draining its queue
+        "render_fps": frames / render_seconds if render_seconds else 0.0,
+        "realtime_factor": clip_seconds / total_seconds if total_seconds else 0.0,
+        "stall_seconds": exporter.stall_seconds,  # Time capture() waited on the writer
+    }
+
+
+# --- Command Line ---
+def parse_size(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a particle simulation offline to raw RGB, PNGs or ffmpeg.")
+    parser.add_argument("simulation", choices=sorted(SIMULATIONS))
+    parser.add_argument("output", help="raw file, PNG directory/pattern, or video file for ffmpeg")
+    parser.add_argument("--format", choices=FORMATS, default="raw")
+    parser.add_argument("--frames", type=int, help="frame count (default: --seconds * --fps)")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS)
+    parser.add_argument("--size", type=parse_size, help="output size such as 1920x1080, letterboxed if its aspect ratio differs (default: native)")
+    parser.add_argument("--count", type=int, help="particle count (default: the simulation's own)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ring", type=int, default=RING_SIZE, help="frame buffers shared with the writer")
+    args = parser.parse_args(argv)
+
+    native_size = SIMULATIONS[args.simulation].size
+    size = args.size or native_size
+    frames = args.frames if args.frames is not None else round(args.seconds * args.fps)
+    pygame.init()
+    simulation = create_simulation(args.simulation, args.count, args.seed)
+    try:
+        exporter = FrameExporter(WRITERS[args.format](args.output, size, args.fps), size, args.ring)
+        stats = render_offline(simulation, native_size, frames, exporter, args.fps)
+    finally:
+        getattr(simulation, "close", lambda: None)()
+        pygame.quit()
+    print(f"{stats['frames']} frames ({stats['clip_seconds']:.1f} s clip) in {stats['total_seconds']:.2f} s: "
+          f"{stats['render_fps']:.0f} fps, {stats['realtime_factor']:.1f}x real time, "
+          f"{stats['stall_seconds']:.2f} s waiting on the writer", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
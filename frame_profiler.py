@@ -0,0 +1,181 @@
+import csv
+import gc
+import json
+import sys
+import time
+
+import numpy as np
+import pygame
+
+# --- Defaults ---
+PHASES = ("events", "wait", "update", "draw", "overlay", "flip")  # "wait" is the frame-cap sleep in clock.tick
+HISTORY = 600  # Frames kept for percentiles and export (10 s at 60 FPS)
+OVERLAY_REFRESH = 15  # Frames between overlay text updates; rendering text every frame is not free
+TOGGLE_KEY = pygame.K_F3
+EXPORT_KEY = pygame.K_F4
+EXPORT_PATH = "frame_profile"  # F4 writes <EXPORT_PATH>.csv and <EXPORT_PATH>.trace.json
+
+
+class FrameProfiler:
+    """Per-phase frame timings in a ring buffer, with an optional on-screen overlay.
+
+    The loop calls start_frame(), then lap(phase) as each phase finishes and
+    end_frame() at the end. While disabled every call returns after one
+    attribute check, so leaving the hooks in place costs nothing measurable.
+    """
+
+    def __init__(self, enabled=False, history=HISTORY, export_path=EXPORT_PATH):
+        self.enabled = enabled
+        self.export_path = export_path
+        self.history = history
+        self.phase_index = {name: i for i, name in enumerate(PHASES)}
+        self.phase_ms = np.zeros((history, len(PHASES)))
+        self.frame_start = np.zeros(history)  # perf_counter seconds
+        self.particles = np.zeros(history, dtype=np.int64)
+        self.substeps = np.zeros(history, dtype=np.int64)
+        self.blocks = np.zeros(history, dtype=np.int64)  # Net allocated blocks gained in the frame
+        self.collections = np.zeros(history, dtype=np.int64)  # gc runs during the frame
+        self.frames = 0  # Frames recorded since the last reset
+        self._lap_start = 0.0
+        self._blocks_start = 0
+        self._gc_start = 0
+        self._overlay = None
+        self._font = None
+
+    def reset(self):
+        self.frames = 0
+        self._overlay = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.reset()
+
+    # --- Recording ---
+    def start_frame(self):
+        if not self.enabled:
+            return
+        slot = self.frames % self.history
+        self.phase_ms[slot] = 0.0
+        self._lap_start = self.frame_start[slot] = time.perf_counter()
+        self._blocks_start = sys.getallocatedblocks()
+        self._gc_start = _gc_collections()
+
+    def lap(self, phase):
+        """Charges the time since the previous lap (or frame start) to phase."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phase_ms[self.frames % self.history, self.phase_index[phase]] += (now - self._lap_start) * 1000
+        self._lap_start = now
+
+    def end_frame(self, particles=0, substeps=0):
+        if not self.enabled:
+            return
+        slot = self.frames % self.history
+        self.particles[slot] = particles
+        self.substeps[slot] = substeps
+        self.blocks[slot] = sys.getallocatedblocks() - self._blocks_start
+        self.collections[slot] = _gc_collections() - self._gc_start
+        self.frames += 1
+
+    def _recorded(self):
+        """Indices of the recorded frames in the ring, oldest first."""
+        count = min(self.frames, self.history)
+        return (np.arange(self.frames - count, self.frames) % self.history) if count else np.empty(0, dtype=np.int64)
+
+    def summary(self):
+        """Rolling p50/p95/p99 per phase and for whole frames, in milliseconds."""
+        rows = self._recorded()
+        if len(rows) == 0:
+            return {}
+        phase_ms = self.phase_ms[rows]
+        result = {}
+        for name, values in [(n, phase_ms[:, i]) for i, n in enumerate(PHASES)] + [("frame", phase_ms.sum(axis=1))]:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[name] = {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+        result["particles"] = int(self.particles[rows[-1]])
+        result["blocks_per_frame"] = float(self.blocks[rows].mean())
+        result["gc_per_frame"] = float(self.collections[rows].mean())
+        return result
+
+    # --- Overlay ---
+    def draw_overlay(self, surface):
+        """Blits the stats panel; the text is only re-rendered every OVERLAY_REFRESH frames."""
+        if not self.enabled:
+            return
+        if self._overlay is None or self.frames % OVERLAY_REFRESH == 0:
+            self._overlay = self._render_overlay()
+        surface.blit(self._overlay, (8, 8))
+
+    def _render_overlay(self):
+        if self._font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self._font = pygame.font.SysFont("monospace", 14)
+        stats = self.summary()
+        lines = [f"{'phase':<8}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+        for name in PHASES + ("frame",):
+            if name in stats:
+                s = stats[name]
+                lines.append(f"{name:<8}{s['p50']:8.2f}{s['p95']:8.2f}{s['p99']:8.2f}")
+        if stats:
+            lines.append(f"particles {stats['particles']}")
+            lines.append(f"blocks/frame {stats['blocks_per_frame']:+.1f}  gc/frame {stats['gc_per_frame']:.2f}")
+        lines.append("F3 hide  F4 export")
+        rendered = [self._font.render(line, True, (230, 230, 230)) for line in lines]
+        height = sum(r.get_height() for r in rendered) + 8
+        panel = pygame.Surface((max(r.get_width() for r in rendered) + 8, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        y = 4
+        for r in rendered:
+            panel.blit(r, (4, y))
+            y += r.get_height()
+        return panel
+
+    def handle_event(self, event):
+        """Handles the toggle and export keys; returns True if the event was consumed."""
+        if event.type != pygame.KEYDOWN:
+            return False
+        if event.key == TOGGLE_KEY:
+            self.toggle()
+            return True
+        if event.key == EXPORT_KEY and self.frames:
+            self.export_csv(self.export_path + ".csv")
+            self.export_chrome_trace(self.export_path + ".trace.json")
+            return True
+        return False
+
+    # --- Export ---
+    def export_csv(self, path):
+        """One row per recorded frame: start time, per-phase ms, particles, substeps, allocations."""
+        rows = self._recorded()
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame", "start_s"] + [f"{name}_ms" for name in PHASES]
+                            + ["particles", "substeps", "blocks", "gc"])
+            first = self.frames - len(rows)
+            for n, row in enumerate(rows.tolist()):
+                writer.writerow([first + n, f"{self.frame_start[row]:.6f}"]
+                                + [f"{ms:.4f}" for ms in self.phase_ms[row].tolist()]
+                                + [int(self.particles[row]), int(self.substeps[row]),
+                                   int(self.blocks[row]), int(self.collections[row])])
+
+    def export_chrome_trace(self, path):
+        """Chrome trace (chrome://tracing, Perfetto) with one slice per phase and a particle counter."""
+        rows = self._recorded()
+        origin = self.frame_start[rows[0]] if len(rows) else 0.0
+        events = []
+        for row in rows.tolist():
+            ts = (self.frame_start[row] - origin) * 1e6
+            events.append({"name": "particles", "ph": "C", "ts": ts, "pid": 1, "tid": 1,
+                           "args": {"count": int(self.particles[row])}})
+            for name, ms in zip(PHASES, self.phase_ms[row].tolist()):
+                if ms > 0:
+                    events.append({"name": name, "ph": "X", "ts": ts, "dur": ms * 1000, "pid": 1, "tid": 1})
+                ts += ms * 1000
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _gc_collections():
+    return sum(generation["collections"] for generation in gc.get_stats())
@@ -0,0 +1,172 @@
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from encryption import Cipher, generate_key, open_envelope, seal
+
+# --- Keyfile ---
+# JSON: {"active": <key id>, "keys": {"<key id>": "<base64 master key>", ...}}
+# Key ids are the uint32 stored in envelope headers, so decryption finds its key
+# directly. Retired-but-kept keys stay in "keys" so old records still decrypt.
+CIPHER_CACHE_SIZE = 256
+SUBKEY_INFO_PREFIX = b"encryption subkey v1:" # Namespaces our HKDF outputs
+MAX_KEY_ID = 2 ** 32 - 1
+
+
+def derive_subkey(master_key, context):
+    """Derives the 256-bit subkey for a context (e.g. "tenant-42/invoices") from a master key."""
+    if isinstance(context, str):
+        context = context.encode()
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                info=SUBKEY_INFO_PREFIX + context).derive(master_key)
+
+
+class KeyRegistry:
+    """Master keys by id, with HKDF subkeys per context and an LRU of ready Ciphers.
+
+    Encryption uses the active master key; decryption reads the key id from the
+    envelope header, so picking the key is one dict lookup. Building a Cipher
+    (HKDF + AES key schedule) happens once per (key id, context) while it stays
+    in the cache.
+    """
+
+    def __init__(self, keys=None, active=None, path=None, cache_size=CIPHER_CACHE_SIZE):
+        self.keys = dict(keys or {}) # key id -> master key bytes
+        self.active = active if active is not None else (max(self.keys) if self.keys else None)
+        self.path = path
+        self.cache_size = cache_size
+        self.ciphers = OrderedDict() # (key id, context) -> Cipher, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, cache_size=CIPHER_CACHE_SIZE):
+        with open(path) as f:
+            data = json.load(f)
+        keys = {int(key_id): base64.b64decode(key) for key_id, key in data["keys"].items()}
+        return cls(keys, data.get("active"), path, cache_size)
+
+    @classmethod
+    def create(cls, path, cache_size=CIPHER_CACHE_SIZE):
+        """Writes a new keyfile holding one fresh master key and returns its registry.
+
+        Raises FileExistsError if path exists: replacing a keyfile would make
+        every record sealed under it undecryptable.
+        """
+        # Claim the path first (private from the start); save() then replaces the empty file
+        os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600))
+        try:
+            registry = cls(path=path, cache_size=cache_size)
+            registry.rotate()
+        except BaseException:
+            os.remove(path)
+            raise
+        return registry
+
+    def save(self, path=None):
+        path = path or self.path
+        data = {
+            "active": self.active,
+            "keys": {str(key_id): base64.b64encode(key).decode() for key_id, key in sorted(self.keys.items())},
+        }
+        # Write to a private temporary file first so a crash never leaves a half-written keyfile
+        tmp = path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+
+    # --- Rotation ---
+    def rotate(self):
+        """Adds a new master key and makes it the active one; returns its id.
+
+        Older keys are kept so existing records can still be decrypted.
+        """
+        key_id = max(self.keys, default=0) + 1
+        if key_id > MAX_KEY_ID:
+            raise ValueError("Key ids exhausted")
+        self.keys[key_id] = generate_key()
+        self.active = key_id
+        if self.path:
+            self.save()
+        return key_id
+
+    def retire(self, key_id):
+        """Forgets a master key; records sealed with it can no longer be decrypted."""
+        if key_id == self.active:
+            raise ValueError("Cannot retire the active key; rotate first")
+        del self.keys[key_id]
+        with self._lock:
+            for cache_key in [k for k in self.ciphers if k[0] == key_id]:
+                del self.ciphers[cache_key]
+        if self.path:
+            self.save()
+
+    # --- Lookup ---
+    def cipher(self, context=b"", key_id=None):
+        """Returns (key id, Cipher) for a context; the active key unless key_id is given."""
+        key_id = self.active if key_id is None else key_id
+        if key_id is None:
+            raise KeyError("Registry has no keys")
+        if isinstance(context, str):
+            context = context.encode() # "a" and b"a" are the same context and share one cache entry
+        cache_key = (key_id, context)
+        with self._lock:
+            cipher = self.ciphers.get(cache_key)
+            if cipher is not None:
+                self.ciphers.move_to_end(cache_key)
+                self.hits += 1
+                return key_id, cipher
+
+        if key_id not in self.keys:
+            raise KeyError(f"Unknown key id {key_id}")
+        # The default context b"" gets its own subkey too; the master key never encrypts directly
+        cipher = Cipher(derive_subkey(self.keys[key_id], context))
+        with self._lock:
+            self.misses += 1
+            self.ciphers[cache_key] = cipher
+            if len(self.ciphers) > self.cache_size:
+                self.ciphers.popitem(last=False)
+                self.evictions += 1
+        return key_id, cipher
+
+    def for_context(self, context):
+        """Mapping of key id -> Cipher for one context, as open_envelope expects."""
+        return _ContextKeys(self, context)
+
+    def seal(self, data, context=b"", aad=b"", **options):
+        """Encrypts data into an envelope under the active key for context."""
+        key_id, cipher = self.cipher(context)
+        return seal(cipher, data, aad, key_id=key_id, **options)
+
+    def open(self, message, context=b""):
+        """Decrypts an envelope from any key still in the registry; returns (plaintext, aad)."""
+        return open_envelope(self.for_context(context), message)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "keys": len(self.keys),
+            "active": self.active,
+            "cached": len(self.ciphers),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class _ContextKeys:
+    def __init__(self, registry, context):
+        self.registry = registry
+        self.context = context
+
+    def __getitem__(self, key_id):
+        return self.registry.cipher(self.context, key_id)[1]
@@ -0,0 +1,171 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# --- Defaults ---
+ALIGNMENT = 64  # Arrays start on cache-line boundaries so workers never share a line at the edges
+MAX_PARAMS = 8  # Per-step float parameters (dt, ...) passed to the kernel
+BARRIER_TIMEOUT = 30.0  # Seconds a frame may take before a stuck worker turns into an error instead of a hang
+
+
+class SharedArrays:
+    """Named NumPy arrays carved out of one multiprocessing.shared_memory block."""
+
+    def __init__(self, specs, name=None):
+        """specs: [(name, shape, dtype)]; with name=None a new block is created, else attached."""
+        self.layout = []
+        offset = 0
+        for array_name, shape, dtype in specs:
+            dtype = np.dtype(dtype)
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            self.layout.append((array_name, tuple(shape), dtype.str, offset))
+            offset += int(np.prod(shape)) * dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.arrays = {
+            array_name: np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=array_offset)
+            for array_name, shape, dtype, array_offset in self.layout
+        }
+
+    @property
+    def specs(self):
+        return [(name, shape, dtype) for name, shape, dtype, _ in self.layout]
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        self.arrays = {}  # Views must go before the buffer can be released
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker(kernel, shm_name, specs, fields, index, workers, barrier):
+    shared = SharedArrays(specs, shm_name)
+    arrays = {name: shared[name] for name in fields}
+    control, params, timings = shared["_control"], shared["_params"], shared["_timings"]
+    try:
+        while True:
+            barrier.wait()  # Start of frame; no timeout, the main process may sit idle between steps
+            if control[1]:
+                break
+            count = int(control[0])
+            lo, hi = count * index // workers, count * (index + 1) // workers
+            start = time.perf_counter()
+            if hi > lo:
+                kernel(arrays, lo, hi, params)
+            timings[index] = time.perf_counter() - start
+            barrier.wait(BARRIER_TIMEOUT)  # End of frame
+    except threading.BrokenBarrierError:
+        pass  # The main process gave up on the frame, or another worker died
+    finally:
+        del arrays, control, params, timings
+        shared.close()
+
+
+class ParallelStepper:
+    """Runs a per-particle kernel over contiguous slices of shared arrays in worker processes.
+
+    The named array attributes of `owner` are moved into shared memory (the
+    attributes are replaced by shared views, so everything else keeps working on
+    them in place). step() releases the workers with a barrier, waits for all of
+    them at a second barrier and returns; the main process is free to render
+    between steps, for as long as it likes: workers wait for the next step without
+    a timeout, but a step that takes longer than BARRIER_TIMEOUT, or a worker that
+    has died, makes step() raise. Kernels are module-level functions
+    kernel(arrays, lo, hi, params) that update arrays[name][lo:hi] and must only
+    touch their own slice.
+    Call close() when done: the owner must not keep other references to the
+    shared views, or the block can't be released.
+    """
+
+    def __init__(self, kernel, owner, fields, workers):
+        self.owner = owner
+        self.workers = workers
+        self.fields = tuple(fields)
+        specs = [(name, getattr(owner, name).shape, getattr(owner, name).dtype) for name in self.fields]
+        specs += [("_control", (2,), np.int64), ("_params", (MAX_PARAMS,), np.float64),
+                  ("_timings", (workers,), np.float64)]
+        self.shared = SharedArrays(specs)
+        for name in self.fields:
+            self.shared[name][...] = getattr(owner, name)
+            setattr(owner, name, self.shared[name])
+
+        self.barrier = mp.Barrier(workers + 1)
+        self.processes = [
+            mp.Process(target=_worker, name=f"particle-worker-{i}", daemon=True,
+                       args=(kernel, self.shared.shm.name, self.shared.specs, self.fields, i, workers, self.barrier))
+            for i in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.steps = 0
+        self.worker_seconds = np.zeros(workers)  # Summed kernel time per worker
+        self.max_seconds = 0.0  # Summed slowest-worker time, i.e. the parallel critical path
+        self.wall_seconds = 0.0  # Summed time the main process waited in step()
+
+    def step(self, count, *params):
+        """Updates items [0, count) of every shared array; blocks until all workers are done."""
+        start = time.perf_counter()
+        self.shared["_control"][0] = count
+        self.shared["_params"][:len(params)] = params
+        self.check_workers()
+        try:
+            self.barrier.wait(BARRIER_TIMEOUT)
+            self.barrier.wait(BARRIER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            self.check_workers()  # Name the worker that died, if one did
+            raise
+        timings = self.shared["_timings"]
+        self.worker_seconds += timings
+        self.max_seconds += timings.max()
+        self.wall_seconds += time.perf_counter() - start
+        self.steps += 1
+
+    def check_workers(self):
+        """Raises RuntimeError if a worker process has exited; the others are released to exit too."""
+        for process in self.processes:
+            if not process.is_alive():
+                self.barrier.abort()  # Workers idle at the start-of-frame barrier would wait forever
+                raise RuntimeError(f"{process.name} exited with code {process.exitcode}")
+
+    def stats(self):
+        """Per-worker mean step time, load imbalance and synchronisation overhead, in ms."""
+        steps = max(self.steps, 1)
+        per_worker = self.worker_seconds / steps * 1000
+        mean = per_worker.mean() if len(per_worker) else 0.0
+        return {
+            "workers": self.workers,
+            "steps": self.steps,
+            "worker_step_ms": per_worker.tolist(),
+            # Slowest worker relative to the average: 0 means perfectly balanced
+            "imbalance": float(self.max_seconds / steps * 1000 / mean - 1) if mean > 0 else 0.0,
+            "step_ms": self.wall_seconds / steps * 1000,
+            "sync_overhead_ms": (self.wall_seconds - self.max_seconds) / steps * 1000,
+        }
+
+    def close(self):
+        """Stops the workers and frees the shared block; the owner gets private copies of its arrays back."""
+        if self.shared is None:
+            return
+        for name in self.fields:
+            setattr(self.owner, name, self.shared[name].copy())
+        self.shared["_control"][1] = 1
+        try:
+            self.check_workers()
+            self.barrier.wait(BARRIER_TIMEOUT)
+        except Exception:
+            pass  # A worker already died; join/terminate below cleans up
+        for process in self.processes:
+            process.join(timeout=BARRIER_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self.shared.close()
+        self.shared = None
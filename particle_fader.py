@@ -0,0 +1,62 @@
+import numpy as np
+
+# --- Defaults ---
+FADE_STEPS = 30  # Physics steps a particle takes to fade fully in or out (0.5 s at 60 Hz)
+FADE_EPSILON = 1e-9  # Visibility this close to 0 or 1 counts as fully faded
+
+
+class ParticleFader:
+    """Per-particle visibility (0-1) that eases towards an active count, so count changes fade instead of popping.
+
+    Particles [0, live) are the ones to update and draw: those below the
+    active count fade in, those above it fade out and leave `live` once they
+    are invisible. Once every fade has finished step() and blend() are free.
+    """
+
+    def __init__(self, capacity, active=None, fade_steps=FADE_STEPS):
+        active = capacity if active is None else min(active, capacity)
+        self.capacity = capacity
+        self.rate = 1.0 / max(fade_steps, 1)
+        self.visibility = np.zeros(capacity)
+        self.visibility[:active] = 1.0
+        self.active = active
+        self.live = active
+        self.settled = True  # Every live particle fully visible, none fading out
+
+    def set_active(self, count):
+        """Starts fading particles in or out until `count` (capped at capacity) are visible."""
+        count = min(max(int(count), 0), self.capacity)
+        if count != self.active:
+            self.active = count
+            self.live = max(self.live, count)
+            self.settled = False
+
+    def step(self):
+        """Advances every fade by one physics step; returns the live count."""
+        if self.settled:
+            return self.live
+        visibility = self.visibility[:self.live]
+        visibility[:self.active] += self.rate
+        visibility[self.active:] -= self.rate
+        # Clip, and snap float drift (10 * 0.1 < 1) so every fade ends after exactly fade_steps steps
+        visibility[visibility > 1.0 - FADE_EPSILON] = 1.0
+        visibility[visibility < FADE_EPSILON] = 0.0
+        fading = np.flatnonzero(visibility[self.active:])
+        self.live = self.active + (int(fading[-1]) + 1 if len(fading) else 0)
+        self.settled = self.live == self.active and bool(visibility[:self.active].min(initial=1.0) >= 1.0)
+        return self.live
+
+    def blend(self, colors, background):
+        """Mixes the first len(colors) particles' (N, 3) colors towards the background by visibility."""
+        if self.settled:
+            return colors
+        visibility = self.visibility[:len(colors), None]
+        return (colors * visibility + np.asarray(background) * (1.0 - visibility)).astype(np.uint8)
+
+    def state(self):
+        return {"visibility": self.visibility.copy(), "active": self.active, "live": self.live,
+                "settled": self.settled}
+
+    def restore(self, state):
+        self.visibility[...] = state["visibility"]
+        self.active, self.live, self.settled = state["active"], state["live"], state["settled"]
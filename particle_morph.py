@@ -1,7 +1,14 @@
 import pygame
 import random
 import math
-import numpy as np  # Import numpy for easier vector math if needed
+import numpy as np  # Vectorized particle system (ParticleSystem)
+from particle_renderer import SpriteRenderer, draw_circles_reference
+from shape_registry import ShapeRegistry
+from target_assignment import assign_targets
+from spatial_hash import SpatialHashGrid
+from scheduler import run_simulation
+from parallel_step import ParallelStepper
+from particle_fader import ParticleFader
 
 # --- Constants ---
 WIDTH, HEIGHT = 800, 600
@@ -10,107 +17,85 @@ BACKGROUND_COLOR = (10, 10, 20)
 MAX_SPEED = 3.5
 STEERING_FORCE = 0.15  # Slightly stronger steering
 APPROACH_RADIUS = 60  # Slightly larger approach radius
-SHAPE_SWITCH_INTERVAL = 300  # Frames between shape changes (5 seconds at 60 FPS)
+SHAPE_SWITCH_INTERVAL = 300  # Physics steps between shape changes (5 seconds at 60 Hz)
 TRANSITION_BOOST = 4.0  # Velocity boost during transition
+USE_PARTICLE_SYSTEM = True  # NumPy ParticleSystem instead of a list of Particle objects
+RENDER_MODE = "fblits"  # "circle", "blits", "fblits" or "pixels" (see particle_renderer)
+USE_SEPARATION = False  # Repel particles that crowd each other (spatial hash neighbour search)
+SEPARATION_RADIUS = 6.0  # Particles closer than this push each other apart
+SEPARATION_STRENGTH = 0.08  # Push at zero distance, fading to 0 at SEPARATION_RADIUS
+WORKERS = 0  # Worker processes for the steering update (0 = update in this process; see parallel_step)
+ASSIGNMENT_MODE = "auto"  # How particles pick targets on a switch: "shuffle", "hungarian", "hilbert", ... (see target_assignment)
 
 # --- Shape Generation Functions ---
+# Generators return (num_points, 2) float arrays of points spaced evenly by arc length
+CURVE_SAMPLES = 8192  # Polyline resolution used to measure arc length along parametric curves
+
+def resample_polyline(vertices, num_points, closed=True):
+    """Places exactly num_points points evenly by arc length along a polyline.
+
+    Each point's distance along the outline is looked up in the cumulative
+    segment lengths with a binary search, so there is no per-segment rounding
+    and no padding with duplicate points.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+    if closed:
+        vertices = np.vstack([vertices, vertices[:1]])  # Wrap around for the last segment
+    if num_points <= 0:
+        return np.empty((0, 2))
+    segments = np.diff(vertices, axis=0)
+    segment_lengths = np.hypot(segments[:, 0], segments[:, 1])
+    cumulative = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+    total_length = cumulative[-1]
+
+    if total_length < 1e-6:  # Avoid division by zero if polygon is just a point
+        return np.repeat(vertices[:1], num_points, axis=0)
+
+    # Closed outlines stop one step short of the start so it isn't repeated
+    step = total_length / (num_points if closed else max(1, num_points - 1))
+    distances = np.arange(num_points) * step
+    index = np.searchsorted(cumulative, distances, side="right") - 1
+    index = np.clip(index, 0, len(segments) - 1)  # The open end lands exactly on the last vertex
+    # Position along each point's segment, as a 0-1 ratio (zero-length segments are never picked)
+    ratio = (distances - cumulative.take(index)) / np.maximum(segment_lengths, 1e-12).take(index)
+    points = np.empty((num_points, 2))
+    points[:, 0] = vertices[:-1, 0].take(index) + segments[:, 0].take(index) * ratio
+    points[:, 1] = vertices[:-1, 1].take(index) + segments[:, 1].take(index) * ratio
+    return points
+
+def sample_parametric_curve(curve, num_points, samples=CURVE_SAMPLES):
+    """Evenly spaces num_points by arc length along a closed curve(t) -> (xs, ys), t in [0, 2*pi)."""
+    t = np.linspace(0, 2 * np.pi, samples, endpoint=False)
+    xs, ys = curve(t)
+    return resample_polyline(np.column_stack([xs, ys]), num_points, closed=True)
+
 def get_circle_points(num_points, center_x, center_y, radius):
     """Generates points forming a circle."""
-    points = []
-    for i in range(num_points):
-        angle = (i / num_points) * 2 * math.pi
-        x = center_x + radius * math.cos(angle)
-        y = center_y + radius * math.sin(angle)
-        points.append((x, y))
-    return points
+    angle = np.arange(num_points) * (2 * np.pi / max(1, num_points))  # Equal angles are equal arc lengths
+    return np.column_stack([center_x + radius * np.cos(angle), center_y + radius * np.sin(angle)])
 
 def get_diamond_points(num_points, center_x, center_y, width, height):
     """Generates points forming a diamond shape."""
-    points = []
     half_w, half_h = width / 2, height / 2
-    points_per_side = num_points // 4
-    extra_points = num_points % 4
-
-    # Top-left to Top-right
-    for i in range(points_per_side + (1 if extra_points > 0 else 0)):
-        ratio = i / (points_per_side + (1 if extra_points > 0 else 0) - 1) if (points_per_side + (1 if extra_points > 0 else 0)) > 1 else 0.5
-        points.append((center_x + ratio * half_w, center_y - half_h + ratio * half_h))
-    # Top-right to Bottom-right
-    for i in range(points_per_side + (1 if extra_points > 1 else 0)):
-        ratio = i / (points_per_side + (1 if extra_points > 1 else 0) - 1) if (points_per_side + (1 if extra_points > 1 else 0)) > 1 else 0.5
-        points.append((center_x + half_w - ratio * half_w, center_y + ratio * half_h))
-    # Bottom-right to Bottom-left
-    for i in range(points_per_side + (1 if extra_points > 2 else 0)):
-        ratio = i / (points_per_side + (1 if extra_points > 2 else 0) - 1) if (points_per_side + (1 if extra_points > 2 else 0)) > 1 else 0.5
-        points.append((center_x - ratio * half_w, center_y + half_h - ratio * half_h))
-    # Bottom-left to Top-left
-    for i in range(points_per_side):
-        ratio = i / (points_per_side - 1) if points_per_side > 1 else 0.5
-        points.append((center_x - half_w + ratio * half_w, center_y - ratio * half_h))
-
-    # Ensure exact number of points if division wasn't perfect
-    while len(points) < num_points:
-        points.append(points[0])  # Add duplicates if needed, less ideal
-    return points[:num_points]
+    corners = [
+        (center_x, center_y - half_h),  # Top
+        (center_x + half_w, center_y),  # Right
+        (center_x, center_y + half_h),  # Bottom
+        (center_x - half_w, center_y),  # Left
+    ]
+    return resample_polyline(corners, num_points)
 
 def get_heart_points(num_points, center_x, center_y, scale):
     """Generates points forming a heart shape using parametric equations."""
-    points = []
-    for i in range(num_points):
-        # Parametric equation for a heart shape
-        t = (i / num_points) * 2 * math.pi
-        x = center_x + scale * 16 * (math.sin(t) ** 3)
-        y = center_y - scale * (13 * math.cos(t) - 5 * math.cos(2 * t) - 2 * math.cos(3 * t) - math.cos(4 * t))
-        points.append((x, y))
-    return points
+    def heart(t):
+        x = center_x + scale * 16 * np.sin(t) ** 3
+        y = center_y - scale * (13 * np.cos(t) - 5 * np.cos(2 * t) - 2 * np.cos(3 * t) - np.cos(4 * t))
+        return x, y
+    return sample_parametric_curve(heart, num_points)
 
 def distribute_points_on_polygon(vertices, num_points):
-    """Distributes points relatively evenly along the edges of a polygon."""
-    points = []
-    total_length = 0
-    segment_lengths = []
-
-    # Calculate total perimeter length
-    for i in range(len(vertices)):
-        p1 = vertices[i]
-        p2 = vertices[(i + 1) % len(vertices)]  # Wrap around for the last segment
-        length = math.dist(p1, p2)
-        segment_lengths.append(length)
-        total_length += length
-
-    if total_length < 1e-6:  # Avoid division by zero if polygon is just a point
-        return [vertices[0]] * num_points
-
-    # Distribute points based on segment length
-    points_so_far = 0
-    for i in range(len(vertices)):
-        p1 = vertices[i]
-        p2 = vertices[(i + 1) % len(vertices)]
-        length = segment_lengths[i]
-        num_segment_points = int(round((length / total_length) * num_points))
-
-        # Ensure at least one point if segment has length, handle last segment point distribution
-        if i == len(vertices) - 1:
-            num_segment_points = num_points - points_so_far  # Assign remaining points
-        elif length > 1e-6 and num_segment_points == 0:
-            num_segment_points = 1  # Add at least one point for non-zero length segments
-
-        # Interpolate points along the segment (excluding the end point, it's the start of the next)
-        for j in range(num_segment_points):
-            ratio = j / num_segment_points if num_segment_points > 0 else 0
-            x = p1[0] + (p2[0] - p1[0]) * ratio
-            y = p1[1] + (p2[1] - p1[1]) * ratio
-            points.append((x, y))
-            points_so_far += 1
-
-            if points_so_far >= num_points:  # Stop if we've generated enough points
-                return points[:num_points]
-
-    # If rounding caused fewer points, add duplicates of the first point
-    while len(points) < num_points:
-        points.append(points[0])
-
-    return points[:num_points]
+    """Distributes points evenly by arc length along the edges of a closed polygon."""
+    return resample_polyline(vertices, num_points, closed=True)
 
 def get_bird_points(num_points, center_x, center_y, scale):
     """Generates points for a simple bird silhouette."""
@@ -136,6 +121,57 @@ def get_lion_points(num_points, center_x, center_y, scale):
     scaled_vertices = [(center_x + vx * scale, center_y - vy * scale) for vx, vy in lion_vertices]
     return distribute_points_on_polygon(scaled_vertices, num_points)
 
+# --- Shape Registry ---
+# Generated point sets are memoized per (shape, point count, params)
+shape_registry = ShapeRegistry()
+shape_registry.register("circle", get_circle_points)
+shape_registry.register("diamond", get_diamond_points)
+shape_registry.register("heart", get_heart_points)
+shape_registry.register("bird", get_bird_points)
+shape_registry.register("lion", get_lion_points)
+
+# Shapes to morph through and their parameters
+SHAPE_SEQUENCE = [
+    ("circle", (WIDTH / 2, HEIGHT / 2, 200)),
+    ("diamond", (WIDTH / 2, HEIGHT / 2, 350, 350)),
+    ("heart", (WIDTH / 2, HEIGHT / 2 - 30, 15)),  # Heart needs Y offset and scaling
+    ("bird", (WIDTH / 2, HEIGHT / 2, 40)),  # Bird needs scaling
+    ("lion", (WIDTH / 2, HEIGHT / 2, 45)),  # Lion needs scaling
+    ("circle", (WIDTH / 2, HEIGHT / 2, 100)),  # Smaller circle
+]
+
+def get_shape_points(index, num_points):
+    """Returns the cached (N, 2) target array for a shape in SHAPE_SEQUENCE."""
+    name, params = SHAPE_SEQUENCE[index]
+    return shape_registry.get(name, num_points, *params)
+
+def spread_order(num_points):
+    """Bit-reversed (van der Corput) order of range(num_points).
+
+    Outline points taken in this order cover the whole outline evenly at every
+    prefix length, so the first k particles trace the full shape at any count.
+    """
+    bits = max(1, (num_points - 1).bit_length())
+    index = np.arange(1 << bits)
+    reversed_index = np.zeros_like(index)
+    for bit in range(bits):
+        reversed_index |= ((index >> bit) & 1) << (bits - 1 - bit)
+    return reversed_index[reversed_index < num_points]
+
+# --- Particle Interactions ---
+def separation_forces(xs, ys, grid, radius=SEPARATION_RADIUS, strength=SEPARATION_STRENGTH):
+    """Repulsion between particles closer than radius, found through a SpatialHashGrid."""
+    grid.update(xs, ys)
+    i, j, dx, dy, dist = grid.pairs_within(radius)
+    # Push along the line between the pair, stronger the closer they are
+    push = strength * (1 - dist / radius) / np.maximum(dist, 1e-6)
+    fx = dx * push
+    fy = dy * push
+    n = len(xs)
+    force_x = np.bincount(i, fx, n) - np.bincount(j, fx, n)
+    force_y = np.bincount(i, fy, n) - np.bincount(j, fy, n)
+    return force_x, force_y
+
 # --- Particle Class ---
 class Particle:
     def __init__(self, target_x, target_y):
@@ -162,7 +198,8 @@ class Particle:
         """Updates the particle's state, steering towards the target."""
         dx = self.target_x - self.x
         dy = self.target_y - self.y
-        dist = math.sqrt(dx ** 2 + dy ** 2)
+        # Squares are x * x like in steer_particles: x ** 2 goes through pow(), which can round differently
+        dist = math.sqrt(dx * dx + dy * dy)
 
         if dist > 0.1:  # Avoid division by zero and jittering at target
             # Calculate desired velocity (pointing towards target)
@@ -181,7 +218,7 @@ class Particle:
             steer_vy = desired_vy - self.vy
 
             # Limit steering force
-            steer_mag = math.sqrt(steer_vx ** 2 + steer_vy ** 2)
+            steer_mag = math.sqrt(steer_vx * steer_vx + steer_vy * steer_vy)
             if steer_mag > STEERING_FORCE:
                 steer_vx = (steer_vx / steer_mag) * STEERING_FORCE
                 steer_vy = (steer_vy / steer_mag) * STEERING_FORCE
@@ -191,7 +228,7 @@ class Particle:
             self.vy += steer_vy
 
             # Limit overall speed
-            speed = math.sqrt(self.vx ** 2 + self.vy ** 2)
+            speed = math.sqrt(self.vx * self.vx + self.vy * self.vy)
             if speed > MAX_SPEED:
                 self.vx = (self.vx / speed) * MAX_SPEED
                 self.vy = (self.vy / speed) * MAX_SPEED
@@ -205,7 +242,7 @@ class Particle:
         self.y += self.vy
 
         # Optional: Update color based on velocity or distance
-        speed_ratio = min(1, math.sqrt(self.vx ** 2 + self.vy ** 2) / MAX_SPEED)
+        speed_ratio = min(1, math.sqrt(self.vx * self.vx + self.vy * self.vy) / MAX_SPEED)
         r = int(50 + 200 * speed_ratio)
         g = int(150 - 100 * speed_ratio)
         b = int(200 - 150 * speed_ratio)
@@ -215,49 +252,217 @@ class Particle:
         """Draws the particle on the screen."""
         pygame.draw.circle(screen, self.color, (int(self.x), int(self.y)), int(self.size))
 
-# --- Main Setup ---
-try:
-    pygame.init()
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Shape Morphing Particles")
-    clock = pygame.time.Clock()
-
-    # Define shapes and their parameters
-    shapes = [
-        lambda n: get_circle_points(n, WIDTH / 2, HEIGHT / 2, 200),
-        lambda n: get_diamond_points(n, WIDTH / 2, HEIGHT / 2, 350, 350),
-        lambda n: get_heart_points(n, WIDTH / 2, HEIGHT / 2 - 30, 15),  # Heart needs Y offset and scaling
-        lambda n: get_bird_points(n, WIDTH / 2, HEIGHT / 2, 40),  # Bird needs scaling
-        lambda n: get_lion_points(n, WIDTH / 2, HEIGHT / 2, 45),  # Lion needs scaling
-        lambda n: get_circle_points(n, WIDTH / 2, HEIGHT / 2, 100),  # Smaller circle
-    ]
-    current_shape_index = 0
-    shape_switch_timer = 0
-
-    # Generate initial target points and create particles
-    target_points = shapes[current_shape_index](PARTICLE_COUNT)
-    particles = [Particle(target_points[i][0], target_points[i][1]) for i in range(PARTICLE_COUNT)]
-
-    # --- Game Loop ---
-    running = True
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    running = False
-
-        # --- Update ---
-        shape_switch_timer += 1
-        if shape_switch_timer >= SHAPE_SWITCH_INTERVAL:
-            shape_switch_timer = 0
-            current_shape_index = (current_shape_index + 1) % len(shapes)
-            target_points = shapes[current_shape_index](PARTICLE_COUNT)
-            random.shuffle(target_points)  # Shuffle to make transitions more dynamic
-
-            # Apply transition boost and set new targets
-            center_x, center_y = WIDTH / 2, HEIGHT / 2  # Boost away from screen center
+# --- Vectorized Particle System ---
+PARALLEL_FIELDS = ("x", "y", "vx", "vy", "target_x", "target_y", "color")  # Arrays the steering kernel touches
+
+def steer_particles(x, y, vx, vy, target_x, target_y, color):
+    """Array version of Particle.update on arrays (or slices of them), in place.
+
+    Every step does the same float operations in the same order as the
+    per-object path, so both give identical results.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dx = target_x - x
+        dy = target_y - y
+        dist = np.sqrt(dx * dx + dy * dy)
+        moving = dist > 0.1  # Same dead zone as the per-object path
+
+        # Desired velocity towards the target, eased inside the approach radius
+        speed_factor = np.where(dist < APPROACH_RADIUS, np.maximum(0.05, dist / APPROACH_RADIUS), 1.0)
+        steer_vx = dx / dist * MAX_SPEED * speed_factor - vx
+        steer_vy = dy / dist * MAX_SPEED * speed_factor - vy
+
+        # Limit steering force; particles inside the dead zone don't steer at all
+        steer_mag = np.sqrt(steer_vx * steer_vx + steer_vy * steer_vy)
+        limit = steer_mag > STEERING_FORCE
+        vx += np.where(moving, np.where(limit, steer_vx / steer_mag * STEERING_FORCE, steer_vx), 0.0)
+        vy += np.where(moving, np.where(limit, steer_vy / steer_mag * STEERING_FORCE, steer_vy), 0.0)
+
+        # Limit overall speed (only for particles that steered this frame)
+        speed = np.sqrt(vx * vx + vy * vy)
+        too_fast = moving & (speed > MAX_SPEED)
+        vx[...] = np.where(too_fast, vx / speed * MAX_SPEED, vx)
+        vy[...] = np.where(too_fast, vy / speed * MAX_SPEED, vy)
+
+    # Drag
+    vx *= 0.98
+    vy *= 0.98
+
+    # Update position
+    x += vx
+    y += vy
+
+    # Speed-to-color mapping
+    speed_ratio = np.minimum(1, np.sqrt(vx * vx + vy * vy) / MAX_SPEED)
+    color[:, 0] = 50 + 200 * speed_ratio
+    color[:, 1] = 150 - 100 * speed_ratio
+    color[:, 2] = 200 - 150 * speed_ratio
+
+
+def steer_kernel(arrays, lo, hi, params):
+    """ParallelStepper kernel: steer_particles on one worker's slice."""
+    steer_particles(*(arrays[name][lo:hi] for name in PARALLEL_FIELDS))
+
+
+class ParticleSystem:
+    """Structure-of-arrays version of Particle: the whole swarm is updated with NumPy array math."""
+
+    def __init__(self, target_points, rng=None):
+        """Spawns one particle per target point near the center, like Particle.__init__."""
+        rng = np.random.default_rng() if rng is None else rng
+        targets = np.asarray(target_points, dtype=np.float64).reshape(-1, 2)
+        count = len(targets)
+        self.x = rng.uniform(WIDTH / 2 - 50, WIDTH / 2 + 50, count)
+        self.y = rng.uniform(HEIGHT / 2 - 50, HEIGHT / 2 + 50, count)
+        self.vx = rng.uniform(-1, 1, count)
+        self.vy = rng.uniform(-1, 1, count)
+        self.target_x = np.ascontiguousarray(targets[:, 0])
+        self.target_y = np.ascontiguousarray(targets[:, 1])
+        self.size = rng.uniform(1.5, 4.5, count)
+        self.color = np.empty((count, 3), dtype=np.uint8)
+        self.color[:, 0] = rng.integers(100, 256, count)
+        self.color[:, 1] = rng.integers(50, 151, count)
+        self.color[:, 2] = rng.integers(150, 256, count)
+
+    @classmethod
+    def from_particles(cls, particles):
+        """Copies the state of a list of Particle objects into a new system."""
+        system = cls.__new__(cls)
+        for name in ("x", "y", "vx", "vy", "target_x", "target_y", "size"):
+            setattr(system, name, np.array([getattr(p, name) for p in particles], dtype=np.float64))
+        system.color = np.array([p.color for p in particles], dtype=np.uint8).reshape(-1, 3)
+        return system
+
+    def __len__(self):
+        return len(self.x)
+
+    def set_targets(self, target_points):
+        """Assigns target i to particle i."""
+        targets = np.asarray(target_points, dtype=np.float64).reshape(-1, 2)
+        self.target_x[:] = targets[:, 0]
+        self.target_y[:] = targets[:, 1]
+
+    def apply_force(self, fx, fy):
+        """Adds a force (scalar or per-particle array) to every velocity."""
+        self.vx += fx
+        self.vy += fy
+
+    def apply_separation(self, grid, radius=SEPARATION_RADIUS, strength=SEPARATION_STRENGTH, count=None):
+        """Pushes crowded particles (the first `count`) apart; the steering clamps in update() still apply."""
+        live = slice(0, count)
+        force_x, force_y = separation_forces(self.x[live], self.y[live], grid, radius, strength)
+        self.vx[live] += force_x
+        self.vy[live] += force_y
+
+    def apply_radial_boost(self, center_x, center_y, strength):
+        """Pushes every particle away from a point, as done on shape transitions."""
+        dx = self.x - center_x
+        dy = self.y - center_y
+        dist = np.sqrt(dx ** 2 + dy ** 2)
+        far = dist > 1  # Particles sitting on the center get no push
+        scale = np.divide(strength, dist, out=np.zeros_like(dist), where=far)
+        self.apply_force(dx * scale, dy * scale)
+
+    def update(self, count=None):
+        """Array version of Particle.update (on the first `count` particles); gives the same results."""
+        live = slice(0, count)
+        steer_particles(self.x[live], self.y[live], self.vx[live], self.vy[live],
+                        self.target_x[live], self.target_y[live], self.color[live])
+
+    def draw(self, screen, renderer=None, alpha=1.0, count=None, colors=None):
+        """Draws every particle with the same circles as Particle.draw, batched through a SpriteRenderer.
+
+        alpha < 1 draws particles part way back along their last step (x += vx),
+        for interpolating between fixed physics steps. count limits drawing to
+        the first particles and colors replaces their own (e.g. faded ones).
+        """
+        live = slice(0, count)
+        back = 1.0 - alpha
+        xs = (self.x[live] - self.vx[live] * back).astype(np.int64)
+        ys = (self.y[live] - self.vy[live] * back).astype(np.int64)
+        sizes = self.size[live].astype(np.int64)
+        colors = self.color[live] if colors is None else colors
+        if renderer is None:
+            draw_circles_reference(screen, xs, ys, sizes, colors)
+        else:
+            renderer.draw_circles(screen, xs, ys, sizes, colors)
+
+# --- Simulation ---
+class Simulation:
+    """Shape-morphing swarm as an importable engine: step(dt) advances, render(surface) draws."""
+
+    title = "Shape Morphing Particles"
+
+    def __init__(self, count=PARTICLE_COUNT, seed=None, render_mode=RENDER_MODE, workers=WORKERS, max_particles=None):
+        """max_particles reserves room for set_quality() to raise the count above `count` later."""
+        self.base_count = count
+        count = self.count = max(count, max_particles or 0)  # Particles (and shape targets) allocated
+        self.rng = np.random.default_rng(seed)
+        if seed is not None:
+            random.seed(seed)  # Particle objects draw from the random module
+        self.renderer = SpriteRenderer(render_mode)
+        self.grid = SpatialHashGrid(SEPARATION_RADIUS)
+        self.current_shape_index = 0
+        self.shape_switch_timer = 0
+        self.target_order = spread_order(count)  # Any visible prefix of the targets spans the whole outline
+
+        # Generate initial target points and create particles
+        target_points = get_shape_points(self.current_shape_index, count)[self.target_order]
+        self.stepper = None
+        self.fader = ParticleFader(count, self.base_count)
+        if USE_PARTICLE_SYSTEM:
+            self.particles = ParticleSystem(target_points, rng=self.rng)
+            if workers:
+                self.stepper = ParallelStepper(steer_kernel, self.particles, PARALLEL_FIELDS, workers)
+        else:
+            self.particles = [Particle(target_points[i][0], target_points[i][1]) for i in range(count)]
+
+    def __len__(self):
+        return self.fader.live if USE_PARTICLE_SYSTEM else self.count
+
+    def precompute_shapes(self, background=True):
+        """Generates every shape's targets up front so switches are just lookups."""
+        return shape_registry.precompute(
+            [(name, self.count, *params) for name, params in SHAPE_SEQUENCE], background=background
+        )
+
+    def positions(self):
+        """(N, 2) array of current particle positions."""
+        if USE_PARTICLE_SYSTEM:
+            return np.column_stack([self.particles.x, self.particles.y])
+        return np.array([(p.x, p.y) for p in self.particles], dtype=np.float64).reshape(-1, 2)
+
+    def shape_targets(self):
+        """The current shape's targets, matched to particles; the visible ones get an evenly spread subset.
+
+        The first fader.active particles are matched among the first
+        fader.active spread_order() targets only, so they cover the whole
+        outline however many particles the quality level leaves visible.
+        """
+        target_points = get_shape_points(self.current_shape_index, self.count)[self.target_order]
+        positions = self.positions()
+        active = self.fader.active if USE_PARTICLE_SYSTEM else self.count
+        # Match particles to nearby targets ("shuffle" mode keeps the original random look); "auto"
+        # picks its solver from each group's size, so hidden spare particles don't slow the switch
+        for group in (slice(0, active), slice(active, self.count)):
+            if group.start == group.stop:
+                continue  # No hidden particles (or none visible) at this quality level
+            order = assign_targets(positions[group], target_points[group], ASSIGNMENT_MODE, rng=self.rng)
+            target_points[group] = target_points[group][order]
+        return target_points
+
+    def switch_shape(self):
+        """Moves on to the next shape: new targets plus a push away from the center."""
+        particles = self.particles
+        self.current_shape_index = (self.current_shape_index + 1) % len(SHAPE_SEQUENCE)
+        target_points = self.shape_targets()
+
+        # Apply transition boost and set new targets
+        center_x, center_y = WIDTH / 2, HEIGHT / 2  # Boost away from screen center
+        if USE_PARTICLE_SYSTEM:
+            particles.apply_radial_boost(center_x, center_y, TRANSITION_BOOST)
+            particles.set_targets(target_points)
+        else:
             for i, p in enumerate(particles):
                 # Calculate direction away from center
                 dx = p.x - center_x
@@ -272,24 +477,125 @@ try:
                 p.apply_force(boost_vx, boost_vy)  # Give it a push
                 p.set_target(target_points[i][0], target_points[i][1])  # Assign new target
 
-        for p in particles:
-            p.update()
-
-        # --- Draw ---
-        screen.fill(BACKGROUND_COLOR)
-        for p in particles:
-            p.draw(screen)
-
-        pygame.display.flip()
-        clock.tick(60)
-
-except ImportError:
-    print("Pygame is not installed. Please install it using: pip install pygame")
-except Exception as e:
-    print(f"An error occurred: {e}")
-    import traceback
-    traceback.print_exc()  # Print detailed traceback for debugging
-finally:
-    pygame.quit()
-    print("Program finished.")
+    def step(self, dt):
+        """Advances one physics step. Steering constants are tuned per step, so run this at a fixed rate."""
+        particles = self.particles
+        self.shape_switch_timer += 1
+        if self.shape_switch_timer >= SHAPE_SWITCH_INTERVAL:
+            self.shape_switch_timer = 0
+            self.switch_shape()
+
+        live = self.fader.step()
+        if USE_SEPARATION:
+            if USE_PARTICLE_SYSTEM:
+                particles.apply_separation(self.grid, count=live)  # Hidden particles neither push nor get pushed
+            else:
+                force_x, force_y = separation_forces(
+                    np.array([p.x for p in particles]), np.array([p.y for p in particles]), self.grid
+                )
+                for p, fx, fy in zip(particles, force_x.tolist(), force_y.tolist()):
+                    p.apply_force(fx, fy)
+
+        if self.stepper is not None:
+            self.stepper.step(live)
+        elif USE_PARTICLE_SYSTEM:
+            particles.update(live)
+        else:
+            for p in particles:
+                p.update()
+
+    def close(self):
+        """Stops the update workers, if any."""
+        if self.stepper is not None:
+            self.stepper.close()
+            self.stepper = None
+
+    def set_quality(self, level):
+        """Applies an adaptive_quality level: fades particles in or out towards count * level.particles."""
+        if USE_PARTICLE_SYSTEM:
+            active = self.fader.active
+            self.fader.set_active(round(self.base_count * level.particles))
+            if self.fader.active != active:
+                self.particles.set_targets(self.shape_targets())  # Re-spread the outline over the new visible set
+
+    def render(self, surface, alpha=1.0):
+        """Draws the current state, interpolated `alpha` of the way from the previous step."""
+        surface.fill(BACKGROUND_COLOR)
+        if USE_PARTICLE_SYSTEM:
+            live = self.fader.live
+            colors = self.fader.blend(self.particles.color[:live], BACKGROUND_COLOR)
+            self.particles.draw(surface, self.renderer, alpha, live, colors)
+        else:
+            back = 1.0 - alpha
+            self.renderer.draw_circles(
+                surface,
+                [int(p.x - p.vx * back) for p in self.particles],
+                [int(p.y - p.vy * back) for p in self.particles],
+                [int(p.size) for p in self.particles],
+                [p.color for p in self.particles],
+            )
+
+    # --- Record / Replay (see state_log; needs USE_PARTICLE_SYSTEM) ---
+    def frame_columns(self, alpha=1.0):
+        """The per-particle values render(surface, alpha) draws with, for the state log."""
+        p = self.particles
+        live = slice(0, self.fader.live)
+        back = 1.0 - alpha
+        colors = self.fader.blend(p.color[live], BACKGROUND_COLOR)
+        return {
+            "x": p.x[live] - p.vx[live] * back,
+            "y": p.y[live] - p.vy[live] * back,
+            "size": p.size[live],
+            "r": colors[:, 0],
+            "g": colors[:, 1],
+            "b": colors[:, 2],
+        }
+
+    def render_columns(self, surface, columns):
+        """Draws one recorded frame_columns() frame without stepping."""
+        surface.fill(BACKGROUND_COLOR)
+        self.renderer.draw_circles(
+            surface,
+            columns["x"].astype(np.int64),
+            columns["y"].astype(np.int64),
+            columns["size"].astype(np.int64),
+            np.column_stack([columns["r"], columns["g"], columns["b"]]).astype(np.uint8),
+        )
+
+    def snapshot(self):
+        """Everything step() depends on, copied: particle arrays, shape timer and RNG states."""
+        p = self.particles
+        return {
+            "arrays": {name: getattr(p, name).copy() for name in PARALLEL_FIELDS + ("size",)},
+            "current_shape_index": self.current_shape_index,
+            "shape_switch_timer": self.shape_switch_timer,
+            "fader": self.fader.state(),
+            "rng": self.rng.bit_generator.state,
+            "random": random.getstate(),
+        }
+
+    def restore(self, state):
+        """Puts back a snapshot() taken from a simulation with the same particle count."""
+        for name, values in state["arrays"].items():
+            getattr(self.particles, name)[...] = values  # In place: the arrays may be shared with workers
+        self.current_shape_index = state["current_shape_index"]
+        self.shape_switch_timer = state["shape_switch_timer"]
+        self.fader.restore(state["fader"])
+        self.rng.bit_generator.state = state["rng"]
+        random.setstate(state["random"])
 
+# --- Main Setup ---
+if __name__ == "__main__":
+    try:
+        simulation = Simulation()
+        simulation.precompute_shapes(background=True)
+        run_simulation(simulation, (WIDTH, HEIGHT))
+    except ImportError:
+        print("Pygame is not installed. Please install it using: pip install pygame")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        import traceback
+        traceback.print_exc()  # Print detailed traceback for debugging
+    finally:
+        pygame.quit()
+        print("Program finished.")
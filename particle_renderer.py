@@ -0,0 +1,224 @@
+import pygame
+import numpy as np
+from collections import OrderedDict
+
+# --- Render Modes ---
+# "circle": one pygame.draw.circle call per particle (the original path)
+# "blits":  pre-rasterized sprites drawn with a single Surface.blits call
+# "fblits": like "blits" but uses Surface.fblits when this pygame build has it
+# "pixels": single-pixel-sized sprites written straight into the surfarray buffer
+RENDER_MODES = ("circle", "blits", "fblits", "pixels")
+POINT_RADIUS = 1  # Sprites up to this radius can go through the "pixels" path
+SPRITE_CACHE_SIZE = 4096  # Default number of sprites kept by a SpriteCache
+
+
+class SpriteCache:
+    """Bounded LRU cache of circle sprites keyed by (color, quantized radius, quantized alpha)."""
+
+    def __init__(self, max_size=SPRITE_CACHE_SIZE, alpha_step=1):
+        self.max_size = max_size
+        self.alpha_step = alpha_step  # Alphas are rounded to multiples of this (1 keeps exact fades)
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def quantize_alpha(self, alpha):
+        """Rounds an alpha value (or array of them) to the cache's alpha step."""
+        if self.alpha_step <= 1:
+            return alpha
+        return np.minimum(255, np.rint(np.asarray(alpha) / self.alpha_step) * self.alpha_step).astype(np.int64)
+
+    def get(self, color, radius, alpha=None):
+        """Returns the sprite for one bucket, rasterizing it (and evicting the oldest) on a miss."""
+        radius = round(radius * 2) / 2  # Radii shrink in 0.5 steps
+        if alpha is not None:
+            alpha = int(self.quantize_alpha(alpha))
+        key = (color[0], color[1], color[2], radius, alpha)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        sprite = make_circle_sprite(color, radius, alpha)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_size:
+            self.sprites.popitem(last=False)
+            self.evictions += 1
+        return sprite
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.sprites),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SpriteRenderer:
+    """Draws a whole frame of filled circles from cached, pre-rasterized sprites."""
+
+    def __init__(self, mode="fblits", cache=None):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode {mode!r}, expected one of {RENDER_MODES}")
+        self.mode = mode
+        self.cache = cache if cache is not None else SpriteCache()
+
+    def get_sprite(self, color, radius, alpha=None):
+        """Returns the cached sprite for one (color, radius[, alpha]) bucket, rasterizing it on first use."""
+        return self.cache.get(color, radius, alpha)
+
+    def draw_circles(self, surface, xs, ys, radii, colors, alphas=None):
+        """Draws circles in order; pixels match the per-particle draw code of each script.
+
+        Without alphas this matches pygame.draw.circle(surface, color, (int(x), int(y)), int(r)).
+        With alphas it matches the fiery_shapes path of blitting an SRCALPHA circle surface
+        at (int(x - r), int(y - r)).
+        """
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        radii = np.asarray(radii)
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        if alphas is not None:
+            alphas = np.asarray(alphas, dtype=np.int64)
+        if len(xs) == 0:
+            return
+
+        if self.mode == "circle":
+            draw_circles_reference(surface, xs, ys, radii, colors, alphas)
+            return
+        if self.mode == "pixels" and alphas is None and radii.max() <= POINT_RADIUS:
+            if self._draw_points(surface, xs, ys, radii, colors):
+                return
+
+        if alphas is None:
+            radii = radii.astype(np.int64)
+            lefts = xs.astype(np.int64) - radii
+            tops = ys.astype(np.int64) - radii
+        else:
+            lefts = (xs - radii).astype(np.int64)
+            tops = (ys - radii).astype(np.int64)
+        sprites = self._lookup_sprites(radii, colors, alphas)
+        blit_sequence = zip(sprites, zip(lefts.tolist(), tops.tolist()))
+        fblits = getattr(surface, "fblits", None) if self.mode == "fblits" else None
+        if fblits is not None:
+            fblits(blit_sequence)
+        else:
+            surface.blits(blit_sequence, doreturn=False)
+
+    def _lookup_sprites(self, radii, colors, alphas):
+        """Maps every particle to its sprite, touching the cache once per distinct bucket."""
+        keys = colors.astype(np.int64) @ np.array([1 << 16, 1 << 8, 1], dtype=np.int64)
+        keys = (keys << 16) | np.rint(radii * 2).astype(np.int64)
+        if alphas is not None:
+            alphas = self.cache.quantize_alpha(alphas.clip(0, 255))
+            keys = (keys << 9) | alphas
+        unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        bucket_sprites = [
+            self.get_sprite(tuple(colors[i].tolist()), radii[i].item(), None if alphas is None else int(alphas[i]))
+            for i in first.tolist()
+        ]
+        return [bucket_sprites[i] for i in inverse.ravel().tolist()]
+
+    def _draw_points(self, surface, xs, ys, radii, colors):
+        """Writes tiny circles straight into the pixel buffer; returns False if the surface can't be mapped."""
+        try:
+            pixels = pygame.surfarray.pixels2d(surface)
+        except ValueError:  # e.g. 24-bit surfaces have no 2d pixel view
+            return False
+        try:
+            xs = xs.astype(np.int64)
+            ys = ys.astype(np.int64)
+            radii = radii.astype(np.int64)
+            mapped = map_colors(surface, colors)
+            point_xs, point_ys, point_colors = [], [], []
+            for radius in np.unique(radii).tolist():
+                if radius <= 0:
+                    continue  # pygame.draw.circle draws nothing for radius 0
+                # Offsets covered by one sprite of this radius, in the order draw.circle would place them
+                offsets = np.argwhere(sprite_mask(radius))
+                members = np.nonzero(radii == radius)[0]
+                order = np.repeat(members, len(offsets))
+                point_xs.append(xs[order] - radius + np.tile(offsets[:, 0], len(members)))
+                point_ys.append(ys[order] - radius + np.tile(offsets[:, 1], len(members)))
+                point_colors.append(order)
+            if not point_xs:
+                return True
+            px = np.concatenate(point_xs)
+            py = np.concatenate(point_ys)
+            owner = np.concatenate(point_colors)
+            if len(point_xs) > 1:
+                # Keep draw order across radius groups: sort by particle index
+                order = np.argsort(owner, kind="stable")
+                px, py, owner = px[order], py[order], owner[order]
+            width, height = surface.get_size()
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            px, py, owner = px[inside], py[inside], owner[inside]
+            # Overlapping points: the last writer of each pixel wins, as with sequential draws
+            winner = np.full(width * height, -1, dtype=np.int64)
+            np.maximum.at(winner, px * height + py, np.arange(len(px)))
+            last = winner[winner >= 0]
+            pixels[px[last], py[last]] = mapped[owner[last]].astype(pixels.dtype)
+            return True
+        finally:
+            del pixels  # Unlocks the surface
+
+
+def make_circle_sprite(color, radius, alpha=None):
+    """Rasterizes one circle the same way pygame.draw.circle would place it around its center."""
+    size = int(radius * 2)
+    if alpha is None:
+        sprite = pygame.Surface((size, size))
+        colorkey = (0, 0, 0) if tuple(color[:3]) != (0, 0, 0) else (255, 255, 255)
+        sprite.fill(colorkey)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        sprite.set_colorkey(colorkey, pygame.RLEACCEL)
+    else:
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, tuple(color[:3]) + (alpha,), (radius, radius), radius)
+    return sprite
+
+
+_sprite_masks = {}
+
+
+def sprite_mask(radius):
+    """Boolean (x, y) mask of the pixels pygame.draw.circle covers for an integer radius."""
+    mask = _sprite_masks.get(radius)
+    if mask is None:
+        sprite = make_circle_sprite((255, 255, 255), radius)
+        mask = pygame.surfarray.array2d(sprite) != sprite.map_rgb(sprite.get_colorkey())
+        _sprite_masks[radius] = mask
+    return mask
+
+
+def map_colors(surface, colors):
+    """Vectorized Surface.map_rgb for an (N, 3) array of opaque colors."""
+    rloss, gloss, bloss, _ = surface.get_losses()
+    rshift, gshift, bshift, _ = surface.get_shifts()
+    amask = surface.get_masks()[3]
+    colors = colors.astype(np.int64)
+    mapped = ((colors[:, 0] >> rloss) << rshift) | ((colors[:, 1] >> gloss) << gshift) | ((colors[:, 2] >> bloss) << bshift)
+    return mapped | amask
+
+
+def draw_circles_reference(surface, xs, ys, radii, colors, alphas=None):
+    """The original per-particle draw path, kept as the "circle" mode and as the pixel reference."""
+    colors = [tuple(c) for c in np.asarray(colors).reshape(-1, 3).tolist()]
+    if alphas is None:
+        for x, y, r, color in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist(), np.asarray(radii).tolist(), colors):
+            pygame.draw.circle(surface, color, (int(x), int(y)), int(r))
+    else:
+        for x, y, r, color, alpha in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist(), np.asarray(radii).tolist(), colors, np.asarray(alphas).tolist()):
+            s = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+            pygame.draw.circle(s, color + (alpha,), (r, r), r)
+            surface.blit(s, (int(x - r), int(y - r)))
@@ -0,0 +1,110 @@
+import time
+
+import pygame
+
+from frame_profiler import FrameProfiler
+
+# --- Defaults ---
+PHYSICS_HZ = 60  # Simulation steps per simulated second, independent of the display
+DISPLAY_FPS = 60  # Frame cap for the window (0 = uncapped)
+MAX_SUBSTEPS = 5  # Most physics steps run for one rendered frame before time is dropped
+
+
+class FixedTimestepScheduler:
+    """Turns variable frame times into a whole number of fixed-size physics steps.
+
+    Leftover time is carried to the next frame; `alpha` is how far the render
+    time sits between the last two physics states (0-1), for interpolation.
+    """
+
+    def __init__(self, physics_hz=PHYSICS_HZ, max_substeps=MAX_SUBSTEPS):
+        self.step_dt = 1 / physics_hz
+        self.max_substeps = max_substeps
+        self.accumulator = 0.0
+        self.steps = 0  # Total physics steps run
+        self.dropped_time = 0.0  # Seconds skipped because a frame needed too many substeps
+
+    @property
+    def alpha(self):
+        return min(1.0, max(0.0, self.accumulator / self.step_dt))
+
+    def advance(self, frame_dt):
+        """Adds one frame's elapsed time and returns how many physics steps are due."""
+        self.accumulator += frame_dt
+        steps = int(self.accumulator / self.step_dt + 1e-9)  # Tolerate float drift in the sum
+        if steps > self.max_substeps:
+            # Too far behind (slow frame, debugger pause): drop the backlog instead of spiralling
+            self.dropped_time += (steps - self.max_substeps) * self.step_dt
+            self.accumulator -= (steps - self.max_substeps) * self.step_dt
+            steps = self.max_substeps
+        self.accumulator -= steps * self.step_dt
+        self.steps += steps
+        return steps
+
+    def tick(self, simulation, frame_dt):
+        """Runs every physics step due after frame_dt seconds; returns the step count."""
+        steps = self.advance(frame_dt)
+        for _ in range(steps):
+            simulation.step(self.step_dt)
+        return steps
+
+
+def run_simulation(simulation, size, physics_hz=PHYSICS_HZ, display_fps=DISPLAY_FPS, max_substeps=MAX_SUBSTEPS,
+                   profiler=None, recorder=None, quality=None):
+    """Opens a window and drives a simulation until it is closed or ESC is pressed.
+
+    The simulation needs step(dt), render(surface, alpha) and a title; an
+    optional handle_event(event) receives every other pygame event. F3 toggles
+    the frame profiler overlay and F4 exports its history (see frame_profiler).
+    A recorder (see state_log) gets every frame as it is drawn, and a quality
+    controller (see adaptive_quality) gets every frame's update and draw time.
+    """
+    pygame.init()
+    try:
+        screen = pygame.display.set_mode(size)
+        pygame.display.set_caption(simulation.title)
+        clock = pygame.time.Clock()
+        scheduler = FixedTimestepScheduler(physics_hz, max_substeps)
+        profiler = FrameProfiler() if profiler is None else profiler
+        handle_event = getattr(simulation, "handle_event", None)
+        if quality is not None:
+            quality.attach(simulation, scheduler)
+
+        running = True
+        clock.tick()
+        while running:
+            profiler.start_frame()
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                    running = False
+                elif profiler.handle_event(event):
+                    pass
+                elif handle_event is not None:
+                    handle_event(event)
+            profiler.lap("events")
+
+            frame_dt = clock.tick(display_fps) / 1000.0
+            profiler.lap("wait")
+            update_start = time.perf_counter()
+            steps = scheduler.tick(simulation, frame_dt)
+            if recorder is not None:
+                recorder.record(scheduler.alpha, steps)
+            profiler.lap("update")
+            draw_start = time.perf_counter()
+            simulation.render(screen, scheduler.alpha)
+            profiler.lap("draw")
+            if quality is not None:
+                quality.frame((draw_start - update_start) * 1000, (time.perf_counter() - draw_start) * 1000)
+            profiler.draw_overlay(screen)
+            profiler.lap("overlay")
+            pygame.display.flip()
+            profiler.lap("flip")
+            profiler.end_frame(len(simulation), steps)
+        return scheduler
+    finally:
+        close = getattr(simulation, "close", None)
+        if close is not None:
+            close()  # e.g. stop update worker processes
+        pygame.quit()
@@ -0,0 +1,59 @@
+import threading
+import numpy as np
+
+
+class ShapeRegistry:
+    """Memoizes shape point sets so generators run once per (shape, point count, params).
+
+    Generators are registered as generator(num_points, *params) and may return
+    a list of (x, y) tuples or an array; cached results are read-only (N, 2)
+    float64 arrays shared by every caller.
+    """
+
+    def __init__(self):
+        self.generators = {}
+        self.points = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def register(self, name, generator):
+        self.generators[name] = generator
+
+    def get(self, name, num_points, *params):
+        """Returns the (N, 2) point array for a shape, generating it on first use."""
+        key = (name, num_points, params)
+        points = self.points.get(key)
+        if points is not None:
+            self.hits += 1
+            return points
+
+        self.misses += 1
+        points = np.array(self.generators[name](num_points, *params), dtype=np.float64).reshape(-1, 2)
+        points.flags.writeable = False  # Shared between callers, so nobody may shuffle it in place
+        with self._lock:
+            # Another thread may have generated the same key meanwhile; keep the first one
+            return self.points.setdefault(key, points)
+
+    def precompute(self, shapes, background=False):
+        """Generates every (name, num_points, *params) entry up front.
+
+        With background=True the work runs on a daemon thread, which is returned
+        so callers can join() it; get() still works (and fills gaps) meanwhile.
+        """
+        shapes = list(shapes)
+
+        def run():
+            for name, num_points, *params in shapes:
+                self.get(name, num_points, *params)
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="shape-precompute", daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self):
+        with self._lock:
+            self.points.clear()
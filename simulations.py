@@ -0,0 +1,27 @@
+from collections import namedtuple
+
+import fiery_shapes
+import particle_morph
+import Vibe_Particles
+
+# --- Simulation Table ---
+# The simulations the command line tools (frame_export, state_log, adaptive_quality,
+# benchmark_particles) know by name. count is the default particle count, or None
+# where the simulation sizes itself (fiery turns a count into an emission rate).
+SimulationType = namedtuple("SimulationType", "factory size count")
+SIMULATIONS = {
+    "vibe": SimulationType(Vibe_Particles.Simulation, (Vibe_Particles.WIDTH, Vibe_Particles.HEIGHT),
+                           Vibe_Particles.PARTICLE_COUNT),
+    "morph": SimulationType(particle_morph.Simulation, (particle_morph.WIDTH, particle_morph.HEIGHT),
+                            particle_morph.PARTICLE_COUNT),
+    "fiery": SimulationType(fiery_shapes.Simulation, (fiery_shapes.WIDTH, fiery_shapes.HEIGHT), None),
+}
+
+
+def create_simulation(name, count=None, seed=None, **options):
+    """Builds simulation `name`; count None keeps its default, options go to its constructor."""
+    simulation = SIMULATIONS[name]
+    count = simulation.count if count is None else count
+    if count is not None:
+        options["count"] = count
+    return simulation.factory(seed=seed, **options)
@@ -0,0 +1,149 @@
+import numpy as np
+
+# Cells are addressed by integer (cx, cy) packed into one int64 key; the offset keeps
+# negative cell coordinates (particles that wander off screen) positive.
+CELL_OFFSET = 1 << 20
+# Half of the 3x3 neighbourhood: every pair of adjacent cells is visited exactly once
+HALF_NEIGHBOR_OFFSETS = [(0, 0), (1, -1), (1, 0), (1, 1), (0, 1)]
+
+
+class SpatialHashGrid:
+    """Uniform grid over particle position arrays for radius and k-nearest queries.
+
+    Particles are kept sorted by cell key, so every cell is a contiguous run of
+    `order`. update() reuses the previous frame's order, which is almost sorted
+    already, so the per-frame rebuild is close to linear.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.xs = np.empty(0)
+        self.ys = np.empty(0)
+        self.keys = np.empty(0, dtype=np.int64)  # Cell key per particle
+        self.order = np.empty(0, dtype=np.int64)  # Particle indices sorted by cell key
+        self.cell_keys = np.empty(0, dtype=np.int64)  # Distinct occupied cells, sorted
+        self.cell_start = np.empty(0, dtype=np.int64)
+        self.cell_end = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.xs)
+
+    def cell_of(self, xs, ys):
+        """Integer cell coordinates for positions."""
+        cx = np.floor(np.asarray(xs) / self.cell_size).astype(np.int64)
+        cy = np.floor(np.asarray(ys) / self.cell_size).astype(np.int64)
+        return cx, cy
+
+    def key_of(self, cx, cy):
+        return ((cx + CELL_OFFSET) << 32) | (cy + CELL_OFFSET)
+
+    def update(self, xs, ys):
+        """Re-buckets particles after they moved; call once per frame."""
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        keys = self.key_of(*self.cell_of(self.xs, self.ys))
+        if len(keys) != len(self.order):
+            self.order = np.argsort(keys, kind="stable")
+        elif np.array_equal(keys, self.keys):
+            return  # Nobody changed cell; the buckets are still valid
+        else:
+            # Stable sort of the previous order: nearly sorted input, so this is cheap
+            self.order = self.order[np.argsort(keys[self.order], kind="stable")]
+        self.keys = keys
+        sorted_keys = keys[self.order]
+        boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+        self.cell_start = np.concatenate([[0], boundaries]).astype(np.int64)
+        self.cell_end = np.concatenate([boundaries, [len(sorted_keys)]]).astype(np.int64)
+        self.cell_keys = sorted_keys[self.cell_start] if len(sorted_keys) else sorted_keys
+
+    def _cell_ranges(self, keys):
+        """(start, end) into `order` for each cell key; empty ranges for unoccupied cells."""
+        slot = np.searchsorted(self.cell_keys, keys)
+        slot = np.minimum(slot, max(len(self.cell_keys) - 1, 0))
+        if len(self.cell_keys) == 0:
+            empty = np.zeros(len(keys), dtype=np.int64)
+            return empty, empty
+        found = self.cell_keys[slot] == keys
+        start = np.where(found, self.cell_start[slot], 0)
+        end = np.where(found, self.cell_end[slot], 0)
+        return start, end
+
+    def _candidates(self, x, y, reach):
+        """Indices of particles in every cell within `reach` cells of a point."""
+        cx, cy = self.cell_of(x, y)
+        span = np.arange(-reach, reach + 1)
+        keys = self.key_of(cx + np.repeat(span, len(span)), cy + np.tile(span, len(span)))
+        start, end = self._cell_ranges(keys)
+        runs = [self.order[s:e] for s, e in zip(start.tolist(), end.tolist()) if e > s]
+        return np.concatenate(runs) if runs else np.empty(0, dtype=np.int64)
+
+    def query_radius(self, x, y, radius):
+        """Indices of particles within radius of (x, y)."""
+        candidates = self._candidates(x, y, int(np.ceil(radius / self.cell_size)))
+        dx = self.xs[candidates] - x
+        dy = self.ys[candidates] - y
+        return candidates[dx * dx + dy * dy <= radius * radius]
+
+    def query_knn(self, x, y, k):
+        """Indices of the k particles nearest to (x, y), closest first."""
+        k = min(k, len(self.xs))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        # No particle is farther away than the far corner of their bounding box
+        farthest = np.hypot(
+            max(abs(x - self.xs.min()), abs(x - self.xs.max())),
+            max(abs(y - self.ys.min()), abs(y - self.ys.max())),
+        )
+        reach = 1
+        while True:
+            candidates = self._candidates(x, y, reach)
+            dist = (self.xs[candidates] - x) ** 2 + (self.ys[candidates] - y) ** 2
+            nearest = np.argsort(dist, kind="stable")[:k]
+            # Every particle within reach * cell_size of the point is among the candidates
+            covered = reach * self.cell_size
+            if (len(nearest) == k and dist[nearest[-1]] <= covered * covered) or covered >= farthest:
+                return candidates[nearest]
+            reach *= 2
+
+    def pairs_within(self, radius):
+        """All pairs (i, j), i < j, closer than radius, with their offset and distance.
+
+        radius must not exceed cell_size, so only the 3x3 neighbourhood of each
+        cell is searched. Returns (i, j, dx, dy, dist) arrays where (dx, dy)
+        points from j to i.
+        """
+        if radius > self.cell_size:
+            raise ValueError(f"radius {radius} exceeds the grid cell size {self.cell_size}")
+        n = len(self.xs)
+        if n < 2:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0), np.empty(0), np.empty(0)
+
+        pairs_i, pairs_j = [], []
+        for dx, dy in HALF_NEIGHBOR_OFFSETS:
+            # For every particle, the run of particles in the neighbouring cell
+            start, end = self._cell_ranges(self.keys + ((dx << 32) + dy))
+            counts = end - start
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            owner = np.repeat(np.arange(n), counts)
+            within_run = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            other = self.order[np.repeat(start, counts) + within_run]
+            if dx == 0 and dy == 0:
+                keep = owner < other  # Same cell: each pair once, no self pairs
+                owner, other = owner[keep], other[keep]
+            ox = self.xs[owner] - self.xs[other]
+            oy = self.ys[owner] - self.ys[other]
+            close = ox * ox + oy * oy < radius * radius
+            pairs_i.append(np.minimum(owner[close], other[close]))
+            pairs_j.append(np.maximum(owner[close], other[close]))
+
+        if not pairs_i:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0), np.empty(0), np.empty(0)
+        i = np.concatenate(pairs_i)
+        j = np.concatenate(pairs_j)
+        dx = self.xs[i] - self.xs[j]
+        dy = self.ys[i] - self.ys[j]
+        return i, j, dx, dy, np.sqrt(dx * dx + dy * dy)
@@ -0,0 +1,466 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import namedtuple
+
+import numpy as np
+import pygame
+
+from scheduler import PHYSICS_HZ, FixedTimestepScheduler, run_simulation
+import simulations
+
+# --- Log Format ---
+# Header, JSON metadata, then one record per frame, then an index footer:
+#   header   magic "PSTL", version, keyframe interval, metadata length
+#   record   frame, keyframe, particle count, delta mask, physics steps, payload length,
+#            snapshot length, then the zlib payload, then the snapshot (keyframes only)
+#   footer   uint64 record offset per frame, then index offset, frame count, magic "PSTI"
+# The payload holds float32[count] for every column, byte-shuffled (all first
+# bytes, then all second bytes, ...) so similar values compress well. Keyframes
+# (every keyframe_interval frames) store every column as is, plus an exact
+# simulation snapshot. Other frames store a column as the difference of its
+# float32 bit patterns from the previous frame (bit set in the delta mask) when
+# the particle count is unchanged, which is lossless and mostly zero bytes;
+# otherwise as is. Decoding a frame replays the deltas since its keyframe, so it
+# touches at most keyframe_interval records (one when playing forward).
+# A snapshot is a JSON length, the JSON, then the raw bytes of every array in it:
+# arrays in the JSON are {"__array__": [dtype, shape, offset]} (offset into the raw
+# bytes) and tuples are {"__tuple__": [...]}. Nothing in a log is executable, so
+# logs from other people are as safe to open as any other data file.
+LOG_MAGIC = b"PSTL"
+LOG_VERSION = 3
+LOG_HEADER = struct.Struct("<4sB3xII")
+RECORD_HEADER = struct.Struct("<IIIIIII")
+INDEX_MAGIC = b"PSTI"
+INDEX_FOOTER = struct.Struct("<QQ4s")
+MAX_COLUMNS = 32  # One bit each in the column mask
+SNAPSHOT_HEADER = struct.Struct("<I")  # JSON length
+SNAPSHOT_DTYPE_KINDS = "biuf"  # Plain numbers only; anything else in a log is rejected
+
+# --- Defaults ---
+KEYFRAME_INTERVAL = 60  # Frames between keyframes; restore() re-simulates at most this many frames
+COMPRESS_LEVEL = 1  # zlib level; the deltas are mostly zeros, so higher levels buy little for the time
+DEFAULT_FPS = 60
+
+Frame = namedtuple("Frame", "number keyframe steps columns")
+
+
+def _padding(size, alignment=4):
+    return b"\0" * (-size % alignment)
+
+
+def _encode_columns(columns, previous, names, level=COMPRESS_LEVEL):
+    """(delta mask, zlib payload) for one frame's float32 columns; previous is the last frame's, or None."""
+    mask = 0
+    parts = []
+    for bit, name in enumerate(names):
+        bits = columns[name].view(np.uint32)
+        if previous is not None and len(previous[name]) == len(bits):
+            bits = bits - previous[name].view(np.uint32)  # Wraps around; adding it back is exact
+            mask |= 1 << bit
+        parts.append(bits.view(np.uint8).reshape(-1, 4).T.tobytes())  # Byte-shuffled
+    return mask, zlib.compress(b"".join(parts), level)
+
+
+def _decode_columns(payload, count, mask, previous, names):
+    """Inverse of _encode_columns: the frame's float32 columns as new arrays."""
+    shuffled = np.frombuffer(zlib.decompress(payload), np.uint8).reshape(len(names), 4, count)
+    columns = {}
+    for bit, name in enumerate(names):
+        bits = np.ascontiguousarray(shuffled[bit].T).view(np.uint32).reshape(count)
+        if mask >> bit & 1:
+            bits += previous[name].view(np.uint32)
+        columns[name] = bits.view(np.float32)
+    return columns
+
+
+def _encode_snapshot(state):
+    """Serializes a simulation snapshot: nested dicts, lists, tuples, numbers, strings and arrays."""
+    arrays = []
+    size = 0
+
+    def encode(value):
+        nonlocal size
+        if isinstance(value, np.ndarray):
+            value = np.ascontiguousarray(value)
+            if value.dtype.kind not in SNAPSHOT_DTYPE_KINDS:
+                raise TypeError(f"Cannot store {value.dtype} arrays in a snapshot")
+            reference = {"__array__": [value.dtype.str, list(value.shape), size]}
+            arrays.append(value)
+            size += value.nbytes + len(_padding(value.nbytes, 8))
+            return reference
+        if isinstance(value, dict):
+            return {str(key): encode(item) for key, item in value.items()}
+        if isinstance(value, tuple):
+            return {"__tuple__": [encode(item) for item in value]}
+        if isinstance(value, list):
+            return [encode(item) for item in value]
+        if isinstance(value, np.generic):
+            return value.item()
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        raise TypeError(f"Cannot store {type(value).__name__} in a snapshot")
+
+    encoded = json.dumps(encode(state)).encode()
+    parts = [SNAPSHOT_HEADER.pack(len(encoded)), encoded, _padding(SNAPSHOT_HEADER.size + len(encoded), 8)]
+    for value in arrays:
+        parts += [value.tobytes(), _padding(value.nbytes, 8)]
+    return b"".join(parts)
+
+
+def _decode_snapshot(data):
+    """Inverse of _encode_snapshot; arrays are new, writable copies."""
+    (size,) = SNAPSHOT_HEADER.unpack_from(data)
+    start = SNAPSHOT_HEADER.size + size
+    raw = memoryview(data)[start + len(_padding(start, 8)):]
+
+    def decode(value):
+        if isinstance(value, list):
+            return [decode(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        if "__array__" in value:
+            dtype, shape, offset = value["__array__"]
+            dtype = np.dtype(dtype)
+            if dtype.kind not in SNAPSHOT_DTYPE_KINDS:
+                raise ValueError(f"Snapshot array has unsupported dtype {dtype}")
+            count = int(np.prod(shape, dtype=np.int64))
+            if offset < 0 or count < 0 or offset + count * dtype.itemsize > len(raw):
+                raise ValueError("Snapshot array lies outside the snapshot")
+            return np.frombuffer(raw, dtype, count, offset).reshape(shape).copy()
+        if "__tuple__" in value:
+            return tuple(decode(item) for item in value["__tuple__"])
+        return {key: decode(item) for key, item in value.items()}
+
+    return decode(json.loads(bytes(memoryview(data)[SNAPSHOT_HEADER.size:start])))
+
+
+# --- Recording ---
+class StateRecorder:
+    """Appends each frame's particle columns (as float32, delta-compressed) to a state log.
+
+    The simulation provides frame_columns(alpha) -> {name: per-particle values},
+    render_columns(surface, columns) to draw them back, and snapshot()/restore()
+    for its exact state. Call record(alpha, steps) once per rendered frame, and
+    close() (or use a with block) to write the seek index.
+    """
+
+    def __init__(self, path, simulation, keyframe_interval=KEYFRAME_INTERVAL, metadata=None):
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        self.simulation = simulation
+        self.columns = tuple(simulation.frame_columns())
+        if len(self.columns) > MAX_COLUMNS:
+            raise ValueError(f"At most {MAX_COLUMNS} columns can be recorded")
+        self.keyframe_interval = keyframe_interval
+        encoded = json.dumps(dict(metadata or {}, columns=list(self.columns))).encode()
+        self.file = open(path, "wb")
+        self.file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, keyframe_interval, len(encoded)))
+        self.file.write(encoded + _padding(len(encoded)))
+        self.offset = self.file.tell()
+        self.offsets = array("Q")  # Record offset per frame
+        self.previous = None  # float32 columns of the last frame, to diff against
+        self.keyframe_number = 0
+        self.raw_bytes = 0  # float32 column bytes before delta coding and compression
+        self.payload_bytes = 0
+        self.stored_columns = 0
+        self.delta_columns = 0  # Columns stored as differences from the previous frame
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, alpha=1.0, steps=0):
+        """Appends the frame the simulation draws at `alpha`; steps is the physics steps run since the last frame."""
+        number = len(self.offsets)
+        columns = {name: np.asarray(values).astype(np.float32)  # astype copies, so live arrays can't leak in
+                   for name, values in self.simulation.frame_columns(alpha).items()}
+        count = len(columns[self.columns[0]])
+        snapshot = b""
+        previous = self.previous
+        if number % self.keyframe_interval == 0:
+            snapshot = _encode_snapshot(self.simulation.snapshot())
+            self.keyframe_number = number
+            previous = None
+        mask, payload = _encode_columns(columns, previous, self.columns)
+        self.previous = columns
+        self.raw_bytes += 4 * count * len(self.columns)
+        self.payload_bytes += len(payload)
+        self.stored_columns += len(self.columns)
+        self.delta_columns += bin(mask).count("1")
+
+        self.offsets.append(self.offset)
+        self.file.write(RECORD_HEADER.pack(number, self.keyframe_number, count, mask, steps,
+                                           len(payload), len(snapshot)))
+        for chunk in (payload, snapshot):
+            self.file.write(chunk + _padding(len(chunk)))
+            self.offset += len(chunk) + len(_padding(len(chunk)))
+        self.offset += RECORD_HEADER.size
+
+    def close(self):
+        """Writes the frame index and closes the file."""
+        if self.file.closed:
+            return
+        self.file.write(_padding(self.offset, 8))
+        index_offset = self.offset + len(_padding(self.offset, 8))
+        self.file.write(self.offsets.tobytes())
+        self.file.write(INDEX_FOOTER.pack(index_offset, len(self.offsets), INDEX_MAGIC))
+        self.file.close()
+
+    def stats(self):
+        return {
+            "frames": len(self.offsets),
+            "bytes": self.offset,
+            "delta_columns": self.delta_columns / self.stored_columns if self.stored_columns else 0.0,
+            "compression": self.raw_bytes / self.payload_bytes if self.payload_bytes else 0.0,
+        }
+
+
+# --- Reading ---
+class StateLog:
+    """Memory-mapped reader for a state log; records are found in O(1) through the index.
+
+    frame(n) decodes forward from the keyframe, or from the last decoded frame
+    when that is on the way, so playing in order decodes one record per frame.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.keyframe_interval, metadata_size = LOG_HEADER.unpack_from(self.mm, 0)
+        if magic != LOG_MAGIC:
+            raise ValueError("Not a state log")
+        if version != LOG_VERSION:
+            raise ValueError(f"Unsupported state log version {version}")
+        self.metadata = json.loads(self.mm[LOG_HEADER.size:LOG_HEADER.size + metadata_size])
+        self.columns = tuple(self.metadata["columns"])
+        self.data_offset = LOG_HEADER.size + metadata_size + len(_padding(metadata_size))
+        self.index = self._read_index()
+        self.decoded = None  # (frame number, columns) of the last frame decoded
+
+    def _read_index(self):
+        if len(self.mm) >= self.data_offset + INDEX_FOOTER.size:
+            index_offset, frames, magic = INDEX_FOOTER.unpack_from(self.mm, len(self.mm) - INDEX_FOOTER.size)
+            if magic == INDEX_MAGIC:
+                return np.frombuffer(self.mm, np.uint64, frames, index_offset).copy()
+        return self._scan_index()
+
+    def _scan_index(self):
+        """Rebuilds the index of a log whose recorder never closed, up to its last complete record."""
+        offsets = array("Q")
+        offset, end = self.data_offset, len(self.mm)
+        while offset + RECORD_HEADER.size <= end:
+            *_, payload_size, snapshot_size = RECORD_HEADER.unpack_from(self.mm, offset)
+            size = (RECORD_HEADER.size + payload_size + len(_padding(payload_size))
+                    + snapshot_size + len(_padding(snapshot_size)))
+            if offset + size > end:
+                break
+            offsets.append(offset)
+            offset += size
+        return np.frombuffer(offsets, np.uint64).copy()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _record(self, number):
+        """(header fields, payload offset) for one record."""
+        if not 0 <= number < len(self.index):
+            raise IndexError(f"Frame {number} out of range (log has {len(self.index)})")
+        offset = int(self.index[number])
+        return RECORD_HEADER.unpack_from(self.mm, offset), offset + RECORD_HEADER.size
+
+    def frame(self, number):
+        """The recorded columns of one frame, with the deltas since its keyframe applied."""
+        (_, keyframe, *_), _ = self._record(number)
+        start, columns = keyframe, None
+        if self.decoded is not None and keyframe <= self.decoded[0] <= number:
+            start, columns = self.decoded
+            start += 1
+        for n in range(start, number + 1):
+            (_, _, count, mask, steps, payload_size, _), position = self._record(n)
+            columns = _decode_columns(self.mm[position:position + payload_size], count, mask, columns, self.columns)
+        self.decoded = number, columns
+        return Frame(number, keyframe, self._record(number)[0][4], columns)
+
+    def keyframe_of(self, number):
+        return self._record(number)[0][1]
+
+    def snapshot(self, number):
+        """The exact simulation state saved with keyframe `number`."""
+        header, position = self._record(number)
+        if header[0] != header[1]:
+            raise ValueError(f"Frame {number} is not a keyframe")
+        position += header[5] + len(_padding(header[5]))
+        return _decode_snapshot(self.mm[position:position + header[6]])
+
+    def steps(self, start, stop):
+        """Physics steps recorded for frames [start, stop)."""
+        return [RECORD_HEADER.unpack_from(self.mm, int(offset))[4] for offset in self.index[start:stop]]
+
+    def close(self):
+        self.mm.close()
+
+
+class Replayer:
+    """Draws or restores frames of a StateLog on a simulation built like the recorded one."""
+
+    def __init__(self, log, simulation, physics_hz=None):
+        self.log = log
+        self.simulation = simulation
+        self.step_dt = 1 / (physics_hz or log.metadata.get("physics_hz", PHYSICS_HZ))
+
+    def render(self, surface, number):
+        """Draws frame `number` straight from the log; nothing is simulated."""
+        self.simulation.render_columns(surface, self.log.frame(number).columns)
+
+    def restore(self, number):
+        """Puts the simulation in its exact state after frame `number`, ready to keep stepping.
+
+        Loads the keyframe's snapshot and re-runs the physics steps recorded
+        since, so it costs at most one keyframe interval of simulation.
+        """
+        keyframe = self.log.keyframe_of(number)
+        self.simulation.restore(self.log.snapshot(keyframe))
+        for steps in self.log.steps(keyframe + 1, number + 1):
+            for _ in range(steps):
+                self.simulation.step(self.step_dt)
+
+
+def create_simulation(metadata):
+    """Builds the simulation a log was recorded from, as described by its metadata."""
+    return simulations.create_simulation(metadata["simulation"], metadata.get("count"), metadata.get("seed"))
+
+
+# --- Record / Replay loops ---
+def record_offline(simulation, recorder, frames, fps=DEFAULT_FPS, physics_hz=PHYSICS_HZ):
+    """Steps `frames` frames at `fps` without a window, recording each; returns seconds taken."""
+    scheduler = FixedTimestepScheduler(physics_hz, max_substeps=sys.maxsize)  # Offline: never drop time
+    start = time.perf_counter()
+    for _ in range(frames):
+        steps = scheduler.tick(simulation, 1.0 / fps)
+        recorder.record(scheduler.alpha, steps)
+    return time.perf_counter() - start
+
+
+def replay(log, size, start=0, fps=DEFAULT_FPS):
+    """Plays a log in a window. Space pauses, Left/Right step one frame,
+    Up/Down jump one keyframe interval, Home/End go to the ends; ESC quits."""
+    pygame.init()
+    replayer = Replayer(log, create_simulation(log.metadata))
+    try:
+        screen = pygame.display.set_mode(size)
+        pygame.display.set_caption(f"Replay: {replayer.simulation.title}")
+        clock = pygame.time.Clock()
+        jumps = {pygame.K_LEFT: -1, pygame.K_RIGHT: 1,
+                 pygame.K_DOWN: -log.keyframe_interval, pygame.K_UP: log.keyframe_interval}
+        number, last, playing = start, len(log) - 1, True
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                    return number
+                if event.type != pygame.KEYDOWN:
+                    continue
+                if event.key == pygame.K_SPACE:
+                    playing = not playing
+                elif event.key in jumps:
+                    number, playing = number + jumps[event.key], False
+                elif event.key == pygame.K_HOME:
+                    number = 0
+                elif event.key == pygame.K_END:
+                    number = last
+            number = min(max(number, 0), last)
+            replayer.render(screen, number)
+            pygame.display.flip()
+            if playing and number < last:
+                number += 1
+            clock.tick(fps)
+    finally:
+        replayer.simulation.close()
+        pygame.quit()
+
+
+# --- Command Line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record particle simulation state and replay it with fast seeking.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="record a run to a state log")
+    rec.add_argument("simulation", choices=sorted(simulations.SIMULATIONS))
+    rec.add_argument("output")
+    rec.add_argument("--frames", type=int, help="frames to record offline (default: --seconds * --fps)")
+    rec.add_argument("--seconds", type=float, default=10.0)
+    rec.add_argument("--fps", type=int, default=DEFAULT_FPS)
+    rec.add_argument("--count", type=int, help="particle count (default: the simulation's own)")
+    rec.add_argument("--seed", type=int, default=0)
+    rec.add_argument("--keyframe-interval", type=int, default=KEYFRAME_INTERVAL)
+    rec.add_argument("--window", action="store_true", help="record a live window until it is closed")
+
+    play = commands.add_parser("replay", help="scrub through a state log in a window")
+    play.add_argument("log")
+    play.add_argument("--start", type=int, default=0)
+    play.add_argument("--resume", type=int, metavar="FRAME",
+                      help="restore the exact state after FRAME and keep simulating live instead")
+
+    info = commands.add_parser("info", help="print a state log's metadata and size")
+    info.add_argument("log")
+
+    args = parser.parse_args(argv)
+    if args.command == "record":
+        if not args.window:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        size = simulations.SIMULATIONS[args.simulation].size
+        metadata = {"simulation": args.simulation, "count": args.count, "seed": args.seed,
+                    "physics_hz": PHYSICS_HZ, "fps": args.fps, "size": list(size)}
+        pygame.init()
+        simulation = create_simulation(metadata)
+        try:
+            with StateRecorder(args.output, simulation, args.keyframe_interval, metadata) as recorder:
+                if args.window:
+                    run_simulation(simulation, size, recorder=recorder)
+                    seconds = None
+                else:
+                    frames = args.frames if args.frames is not None else round(args.seconds * args.fps)
+                    seconds = record_offline(simulation, recorder, frames, args.fps)
+        finally:
+            simulation.close()
+            pygame.quit()
+        stats = recorder.stats()
+        timing = f" in {seconds:.2f} s" if seconds is not None else ""
+        print(f"{stats['frames']} frames, {stats['bytes'] / 1e6:.1f} MB{timing}; "
+              f"{stats['delta_columns']:.0%} of columns delta coded, {stats['compression']:.1f}x compression",
+              file=sys.stderr)
+        return 0
+
+    with StateLog(args.log) as log:
+        size = tuple(log.metadata.get("size") or simulations.SIMULATIONS[log.metadata["simulation"]].size)
+        if args.command == "info":
+            print(json.dumps(dict(log.metadata, frames=len(log), keyframe_interval=log.keyframe_interval,
+                                  bytes=len(log.mm)), indent=2))
+        elif args.resume is not None:
+            simulation = create_simulation(log.metadata)
+            Replayer(log, simulation).restore(args.resume)
+            run_simulation(simulation, size)
+        else:
+            replay(log, size, args.start, log.metadata.get("fps", DEFAULT_FPS))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
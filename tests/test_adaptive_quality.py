@@ -0,0 +1,59 @@
+from adaptive_quality import LEVELS, QualityController
+from scheduler import FixedTimestepScheduler
+
+BUDGET = 10.0
+WINDOW = 5
+HOLD = 20
+
+
+class QualityRecorder:
+    def __init__(self):
+        self.levels = []
+
+    def set_quality(self, level):
+        self.levels.append(level.name)
+
+
+def make_controller(level=3):
+    controller = QualityController(BUDGET, level=level, window=WINDOW, upgrade_hold=HOLD, verbose=False)
+    simulation = QualityRecorder()
+    scheduler = FixedTimestepScheduler()
+    controller.attach(simulation, scheduler)
+    return controller, simulation, scheduler
+
+
+def feed(controller, frame_ms, frames):
+    return [controller.frame(frame_ms / 2, frame_ms / 2) for _ in range(frames)]
+
+
+def test_slow_frames_lower_quality_and_fast_frames_raise_it():
+    controller, simulation, scheduler = make_controller()
+    assert simulation.levels == ["default"]
+    # Every full window over the high water mark drops one level, down to the minimum
+    changes = feed(controller, 1.5 * BUDGET, 3 * WINDOW)
+    assert changes == ([False] * (WINDOW - 1) + [True]) * 3
+    assert simulation.levels == ["default", "medium", "low", "minimum"]
+    assert scheduler.max_substeps == LEVELS[0].max_substeps
+    assert [d["reason"] for d in controller.decisions] == ["over budget"] * 3
+
+    # Fast frames step back up only after HOLD frames of headroom
+    changes = feed(controller, 0.3 * BUDGET, WINDOW - 1 + HOLD)
+    assert changes == [False] * (WINDOW - 2 + HOLD) + [True]
+    assert simulation.levels[-1] == "low"
+    assert scheduler.max_substeps == LEVELS[1].max_substeps
+    assert controller.decisions[-1]["reason"] == "headroom"
+
+
+def test_load_between_the_water_marks_keeps_the_level():
+    controller, simulation, _ = make_controller()
+    assert not any(feed(controller, 0.75 * BUDGET, 10 * HOLD))
+    assert simulation.levels == ["default"]
+
+
+def test_upgrade_that_does_not_fit_doubles_the_hold():
+    controller, simulation, _ = make_controller(level=1)
+    feed(controller, 0.3 * BUDGET, WINDOW - 1 + HOLD)
+    assert simulation.levels == ["low", "medium"]
+    feed(controller, 1.5 * BUDGET, WINDOW)
+    assert simulation.levels == ["low", "medium", "low"]
+    assert controller.upgrade_hold == 2 * HOLD
@@ -0,0 +1,51 @@
+import pytest
+
+import benchmark_particles
+import benchmark_report
+import encryption_benchmark
+
+
+def particle_result(count, update_ms, draw_ms, fps):
+    return {"simulation": "vibe", "count": count, "update_ms": {"mean": update_ms}, "draw_ms": {"mean": draw_ms},
+            "fps": fps}
+
+
+def test_compare_flags_only_slowdowns_past_the_threshold():
+    baseline = {"results": [particle_result(100, 1.0, 2.0, 300.0), particle_result(1000, 4.0, 8.0, 80.0)]}
+    current = {"results": [
+        particle_result(100, 1.05, 3.0, 300.0),  # Draw 50% slower; update within the threshold
+        particle_result(1000, 2.0, 8.0, 80.0),  # Faster is never a regression
+        particle_result(5000, 99.0, 99.0, 1.0),  # Not in the baseline
+    ]}
+    regressions = benchmark_particles.compare(baseline, current, 0.10)
+    assert regressions == [{"simulation": "vibe", "count": 100, "metric": "draw_ms", "baseline": 2.0,
+                            "current": 3.0, "change": 0.5}]
+    assert benchmark_particles.compare(baseline, current, 0.6) == []
+
+
+def test_compare_skips_metrics_a_case_did_not_measure():
+    baseline = {"results": [{"path": "stream", "size": 1 << 30, "encrypt": {"ns_per_op": 10.0}}]}
+    current = {"results": [{"path": "stream", "size": 1 << 30, "encrypt": {"ns_per_op": 20.0},
+                            "decrypt": {"ns_per_op": 50.0}}]}
+    regressions = encryption_benchmark.compare(baseline, current)
+    assert [(r["path"], r["metric"], r["change"]) for r in regressions] == [("stream", "encrypt", 1.0)]
+
+
+@pytest.mark.parametrize("module, baseline, slower, line", [
+    (benchmark_particles, particle_result(100, 1.0, 2.0, 300.0), particle_result(100, 1.0, 2.0, 200.0),
+     "REGRESSION vibe n=100 frame_ms: 3.333 -> 5.000 (+50.0%)"),
+    (encryption_benchmark, {"path": "text", "size": 16, "decrypt": {"ns_per_op": 100.0}},
+     {"path": "text", "size": 16, "decrypt": {"ns_per_op": 125.0}},
+     "REGRESSION text size=16 decrypt: 100 -> 125 ns/op (+25.0%)"),
+])
+def test_compare_command(tmp_path, capsys, module, baseline, slower, line):
+    paths = {}
+    for name, result in (("baseline", baseline), ("same", baseline), ("slower", slower)):
+        paths[name] = str(tmp_path / f"{name}.json")
+        benchmark_report.write_report({"results": [result]}, paths[name])
+    assert benchmark_report.load_report(paths["slower"]) == {"results": [slower]}
+
+    assert module.main(["compare", paths["baseline"], paths["same"]]) == 0
+    assert capsys.readouterr().out == "No regressions above 10%.\n"
+    assert module.main(["compare", paths["baseline"], paths["slower"]]) == 1
+    assert capsys.readouterr().out == line + "\n"
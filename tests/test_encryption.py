@@ -0,0 +1,302 @@
+import base64
+import io
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+import encryption
+from encryption import (Cipher, decrypt_file, decrypt_file_mmap, decrypt_many, decrypt_range, decrypt_stream,
+                        encrypt_file, encrypt_file_mmap, encrypt_many, encrypt_stream, generate_key, open_envelope,
+                        seal)
+
+SEGMENT_SIZE = 16
+PLAINTEXT = bytes(range(256)) * 3 + b"tail"  # Several full segments plus a short last one
+
+
+@pytest.fixture
+def key():
+    return generate_key()
+
+
+def encrypt(key, data=PLAINTEXT, segment_size=SEGMENT_SIZE):
+    out = io.BytesIO()
+    encrypt_stream(io.BytesIO(data), out, key, segment_size)
+    return out.getvalue()
+
+
+def decrypt(key, message):
+    out = io.BytesIO()
+    decrypt_stream(io.BytesIO(message), out, key)
+    return out.getvalue()
+
+
+def flip(message, index):
+    message = bytearray(message)
+    message[index] ^= 1
+    return bytes(message)
+
+
+# --- STREAM format ---
+@pytest.mark.parametrize("data", [b"", b"x", PLAINTEXT[:SEGMENT_SIZE], PLAINTEXT])
+def test_stream_round_trip(key, data):
+    assert decrypt(key, encrypt(key, data)) == data
+
+
+def test_stream_rejects_tampering(key):
+    message = encrypt(key)
+    for index in (0, encryption.STREAM_HEADER.size, len(message) // 2, len(message) - 1):
+        with pytest.raises((InvalidTag, ValueError)):
+            decrypt(key, flip(message, index))
+
+
+def test_stream_rejects_truncation_at_a_segment_boundary(key):
+    message = encrypt(key)
+    chunk = SEGMENT_SIZE + encryption.TAG_SIZE
+    # Dropping whole trailing segments leaves a valid-looking stream without its last-segment flag
+    truncated = message[:encryption.STREAM_HEADER.size + 3 * chunk]
+    with pytest.raises(InvalidTag):
+        decrypt(key, truncated)
+
+
+@pytest.mark.parametrize("cut", [1, encryption.TAG_SIZE, encryption.TAG_SIZE + 1])
+def test_stream_rejects_truncation_inside_a_segment(key, cut):
+    with pytest.raises((InvalidTag, ValueError)):
+        decrypt(key, encrypt(key)[:-cut])
+
+
+def test_stream_rejects_the_wrong_key(key):
+    with pytest.raises(InvalidTag):
+        decrypt(generate_key(), encrypt(key))
+
+
+def test_streams_use_their_own_derived_keys(key):
+    first, second = encrypt(key), encrypt(key)
+    header = encryption.STREAM_HEADER
+    _, version, _, salt, prefix = header.unpack_from(first)
+    assert version == encryption.STREAM_VERSION == 2
+    assert salt != header.unpack_from(second)[3]
+    # The first segment doesn't decrypt under the key itself, only under the salted stream key
+    segment = first[header.size:header.size + SEGMENT_SIZE + encryption.TAG_SIZE]
+    nonce = prefix + bytes(5)
+    with pytest.raises(InvalidTag):
+        Cipher(key).aesgcm.decrypt(nonce, segment, first[:header.size])
+    stream_key = encryption._stream_cipher(key, salt)
+    assert stream_key.aesgcm.decrypt(nonce, segment, first[:header.size]) == PLAINTEXT[:SEGMENT_SIZE]
+
+
+def test_stream_rejects_other_versions(key):
+    message = bytearray(encrypt(key))
+    message[4] = 1
+    with pytest.raises(ValueError, match="unsupported version"):
+        decrypt(key, bytes(message))
+
+
+def test_mmap_files_share_the_stream_format(key, tmp_path):
+    plain, enc, dec = tmp_path / "plain", tmp_path / "enc", tmp_path / "dec"
+    plain.write_bytes(PLAINTEXT)
+    encrypt_file_mmap(str(plain), str(enc), key, SEGMENT_SIZE)
+    assert decrypt(key, enc.read_bytes()) == PLAINTEXT
+    decrypt_file_mmap(str(enc), str(dec), key)
+    assert dec.read_bytes() == PLAINTEXT
+    assert decrypt_range(str(enc), key, 10, 40) == PLAINTEXT[10:50]
+
+
+@pytest.mark.parametrize("decrypt_path", [decrypt_file, decrypt_file_mmap])
+def test_failed_file_decrypt_raises_and_leaves_no_output(key, tmp_path, decrypt_path):
+    plain, enc, dec = tmp_path / "plain", tmp_path / "enc", tmp_path / "dec"
+    plain.write_bytes(PLAINTEXT)
+    encrypt_file(str(plain), str(enc), key, SEGMENT_SIZE)
+    enc.write_bytes(flip(enc.read_bytes(), -1))  # The early segments still authenticate
+    with pytest.raises(InvalidTag):
+        decrypt_path(str(enc), str(dec), key)
+    assert not dec.exists()
+
+
+@pytest.mark.parametrize("decrypt_path", [decrypt_file, decrypt_file_mmap])
+@pytest.mark.parametrize("source", ["missing", "not a stream", "truncated", "tampered"])
+def test_failed_file_decrypt_keeps_an_existing_output(key, tmp_path, decrypt_path, source):
+    enc, dec = tmp_path / "enc", tmp_path / "dec"
+    if source != "missing":
+        message = encrypt(key)
+        enc.write_bytes({"not a stream": b"plain text, not a stream at all, long enough for a header" * 2,
+                         "truncated": message[:encryption.STREAM_HEADER.size - 1],
+                         "tampered": flip(message, -1)}[source])
+    dec.write_bytes(b"important")
+    with pytest.raises((OSError, ValueError, InvalidTag)):
+        decrypt_path(str(enc), str(dec), key)
+    assert dec.read_bytes() == b"important"
+    assert not (tmp_path / "dec.tmp").exists()
+
+
+# --- Cipher ---
+@pytest.mark.parametrize("wrap", [bytes, bytearray, memoryview])
+def test_cipher_into_round_trip(key, wrap):
+    cipher = Cipher(key)
+    out = bytearray(len(PLAINTEXT) + encryption.OVERHEAD + 5)  # Larger buffers are fine
+    size = cipher.encrypt_into(wrap(PLAINTEXT), out, aad=b"aad")
+    assert size == len(PLAINTEXT) + encryption.OVERHEAD
+    assert cipher.decrypt(bytes(out[:size]), b"aad") == PLAINTEXT
+    plain = bytearray(len(PLAINTEXT))
+    assert cipher.decrypt_into(wrap(out[:size]), memoryview(plain), aad=b"aad") == len(PLAINTEXT)
+    assert plain == PLAINTEXT
+    assert cipher.decrypt_text(cipher.encrypt_text("text")) == "text"
+    assert encryption.decrypt_text(cipher.encrypt_text("text"), key) == "text"
+
+
+def test_cipher_into_rejects_small_buffers(key):
+    cipher = Cipher(key)
+    with pytest.raises(ValueError, match="too small"):
+        cipher.encrypt_into(PLAINTEXT, bytearray(len(PLAINTEXT) + encryption.OVERHEAD - 1))
+    message = cipher.encrypt(PLAINTEXT)
+    with pytest.raises(ValueError, match="too small"):
+        cipher.decrypt_into(message, bytearray(len(PLAINTEXT) - 1))
+    with pytest.raises(ValueError, match="too short"):
+        cipher.decrypt_into(message[:encryption.OVERHEAD - 1], bytearray(len(PLAINTEXT)))
+
+
+def test_cipher_decrypt_into_leaves_no_plaintext_on_a_bad_tag(key):
+    cipher = Cipher(key)
+    plain = bytearray(b"\xff" * len(PLAINTEXT))
+    with pytest.raises(InvalidTag):
+        cipher.decrypt_into(flip(cipher.encrypt(PLAINTEXT), -1), plain)
+    assert plain == bytes(len(PLAINTEXT))
+
+
+# --- Bulk ---
+RECORDS = [f"record {i}".encode() * (i % 7) for i in range(200)]  # Mixed sizes, including empty
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_bulk_round_trip_keeps_input_order(key, executor):
+    stats = encryption.BulkStats()
+    tokens = list(encrypt_many(RECORDS, key, workers=3, executor=executor, batch_size=16, stats=stats))
+    assert stats.records == len(RECORDS) and stats.bytes == sum(map(len, RECORDS))
+    assert [Cipher(key).decrypt(base64.b64decode(token)) for token in tokens] == RECORDS
+    texts = list(decrypt_many(tokens, key, workers=3, executor=executor, batch_size=16))
+    assert texts == [record.decode() for record in RECORDS]
+    assert list(decrypt_many(tokens, key, workers=3, executor=executor, batch_size=16, decode=False)) == RECORDS
+
+
+def test_bulk_reads_its_input_lazily(key):
+    consumed = 0
+
+    def records():
+        nonlocal consumed
+        for record in RECORDS:
+            consumed += 1
+            yield record
+
+    batch_size, max_in_flight = 4, 3
+    for yielded, _ in enumerate(encrypt_many(records(), key, workers=2, batch_size=batch_size,
+                                             max_in_flight=max_in_flight), 1):
+        # Queued batches, plus the one being collected, plus the one whose results are being yielded
+        assert consumed <= yielded + (max_in_flight + 1) * batch_size
+    assert consumed == len(RECORDS)
+
+
+def test_bulk_decrypt_raises_on_a_tampered_record(key):
+    tokens = list(encrypt_many(RECORDS[:10], key, batch_size=4))
+    tokens[5] = base64.b64encode(flip(base64.b64decode(tokens[5]), -1))
+    with pytest.raises(InvalidTag):
+        list(decrypt_many(tokens, key, batch_size=4))
+
+
+# --- Envelopes ---
+@pytest.mark.parametrize("armor", [False, True])
+@pytest.mark.parametrize("compression", [encryption.COMPRESS_NONE, encryption.COMPRESS_ZLIB])
+def test_envelope_round_trip(key, armor, compression):
+    cipher = Cipher(key)
+    message = seal(cipher, PLAINTEXT, b"header", key_id=7, compression=compression, armor=armor)
+    assert encryption.parse_envelope(message).key_id == 7
+    assert open_envelope(cipher, message) == (PLAINTEXT, b"header")
+    assert open_envelope({7: cipher}, message) == (PLAINTEXT, b"header")
+
+
+def test_envelope_rejects_tampering(key):
+    cipher = Cipher(key)
+    message = seal(cipher, PLAINTEXT, b"header", key_id=7)
+    aad_at = encryption.ENVELOPE_HEADER.size
+    for index in (aad_at, aad_at + len(b"header"), len(message) - 1):
+        with pytest.raises(InvalidTag):
+            open_envelope(cipher, flip(message, index))
+    with pytest.raises(KeyError):
+        open_envelope({7: cipher}, flip(message, 10))  # The key id is in the header too
+    with pytest.raises(ValueError):
+        open_envelope(cipher, flip(message, 0))  # Magic
+
+
+@pytest.mark.parametrize("size", [0, 4, encryption.ENVELOPE_HEADER.size + 3, -1])
+def test_envelope_rejects_truncation(key, size):
+    cipher = Cipher(key)
+    message = seal(cipher, PLAINTEXT, b"header")
+    with pytest.raises((InvalidTag, ValueError)):
+        open_envelope(cipher, message[:size])
+
+
+# --- Command line ---
+@pytest.fixture
+def key_file(key, tmp_path, monkeypatch):
+    monkeypatch.delenv(encryption.KEY_ENV_VAR, raising=False)
+    path = tmp_path / "key"
+    path.write_bytes(base64.b64encode(key) + b"\n")
+    return str(path)
+
+
+def run(*argv):
+    return encryption.main([str(arg) for arg in argv])
+
+
+def test_cli_round_trip(key_file, tmp_path):
+    plain, enc, dec = tmp_path / "plain", tmp_path / "enc", tmp_path / "dec"
+    plain.write_bytes(PLAINTEXT)
+    assert run("encrypt", "-k", key_file, "-i", plain, "-o", enc) == 0
+    assert run("decrypt", "-k", key_file, "-i", enc, "-o", dec) == 0
+    assert dec.read_bytes() == PLAINTEXT
+    assert not os.path.exists(str(dec) + ".tmp")
+
+
+def test_cli_failed_decrypt_keeps_the_existing_output(key_file, tmp_path, capsys):
+    plain, enc, dec = tmp_path / "plain", tmp_path / "enc", tmp_path / "dec"
+    plain.write_bytes(PLAINTEXT * 100)  # Several 64 KiB segments, so the first ones decrypt fine
+    assert run("encrypt", "-k", key_file, "-i", plain, "-o", enc) == 0
+    enc.write_bytes(flip(enc.read_bytes(), -1))
+    dec.write_bytes(b"previous contents")
+    assert run("decrypt", "-k", key_file, "-i", enc, "-o", dec) == 1
+    assert dec.read_bytes() == b"previous contents"
+    assert not os.path.exists(str(dec) + ".tmp")
+    assert "decrypt failed: InvalidTag" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_cli_lines_round_trip_non_utf8_records(key_file, tmp_path, executor):
+    records = [b"plain text", b"\xff\xfe not utf-8", b"", "café".encode("latin-1")]
+    plain, enc, dec = tmp_path / "plain", tmp_path / "enc", tmp_path / "dec"
+    plain.write_bytes(b"\n".join(records) + b"\n")
+    options = ("--lines", "-j", 2, "--executor", executor)
+    assert run("encrypt", "-k", key_file, "-i", plain, "-o", enc, *options) == 0
+    assert run("decrypt", "-k", key_file, "-i", enc, "-o", dec, *options) == 0
+    assert dec.read_bytes() == plain.read_bytes()
+
+
+@pytest.mark.parametrize("contents, error", [
+    (None, "FileNotFoundError"),
+    (base64.b64encode(b"short"), "Key must be 32 bytes"),
+    (b"not base64!", "Error"),
+])
+def test_cli_reports_bad_keys_in_one_line(key_file, tmp_path, capsys, contents, error):
+    path = tmp_path / "bad.key"
+    if contents is not None:
+        path.write_bytes(contents)
+    (tmp_path / "plain").write_bytes(PLAINTEXT)
+    assert run("encrypt", "-k", path, "-i", tmp_path / "plain", "-o", tmp_path / "enc") == 1
+    err = capsys.readouterr().err
+    assert err.startswith("encrypt failed:") and error in err
+    assert "Traceback" not in err
+    assert not (tmp_path / "enc").exists()
+
+
+def test_cli_without_a_key(key_file, tmp_path, capsys):
+    (tmp_path / "plain").write_bytes(PLAINTEXT)
+    assert run("encrypt", "-i", tmp_path / "plain", "-o", tmp_path / "enc") == 1
+    assert encryption.KEY_ENV_VAR in capsys.readouterr().err
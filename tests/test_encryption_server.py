@@ -0,0 +1,142 @@
+import asyncio
+import base64
+
+import pytest
+
+import encryption_server as es
+from encryption import Cipher, generate_key, seal
+
+
+async def serving(test, tmp_path, key):
+    """Runs test(reader, writer) against an in-process server on a Unix socket."""
+    path = str(tmp_path / "server.sock")
+    server = es.EncryptionServer(key, workers=1)
+    ready = asyncio.Event()
+    task = asyncio.create_task(server.serve(path=path, ready=ready))
+    await ready.wait()
+    reader, writer = await es.open_connection(path=path)
+    try:
+        return await test(reader, writer)
+    finally:
+        writer.close()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def request(reader, writer, request_id, op, payload=b""):
+    writer.write(es.encode_frame(es.REQUEST_HEADER, request_id, op, payload))
+    await writer.drain()
+    body = await es.read_frame(reader)
+    response_id, status = es.RESPONSE_HEADER.unpack_from(body)
+    return response_id, status, bytes(body[es.RESPONSE_HEADER.size:])
+
+
+def test_round_trip_small_and_offloaded(tmp_path):
+    key = generate_key()
+    small, large = b"hello", bytes(es.INLINE_MAX_SIZE + 1)
+
+    async def test(reader, writer):
+        for request_id, payload in enumerate((small, large)):
+            _, status, envelope = await request(reader, writer, request_id, es.OP_ENCRYPT, payload)
+            assert status == es.STATUS_OK
+            assert await request(reader, writer, request_id, es.OP_DECRYPT, envelope) == (
+                request_id, es.STATUS_OK, payload)
+
+    asyncio.run(serving(test, tmp_path, key))
+
+
+def test_tampered_envelope_gets_an_error_reply(tmp_path):
+    key = generate_key()
+    envelope = bytearray(seal(Cipher(key), b"secret"))
+    envelope[-1] ^= 1
+
+    async def test(reader, writer):
+        _, status, message = await request(reader, writer, 5, es.OP_DECRYPT, bytes(envelope))
+        assert status == es.STATUS_ERROR and b"InvalidTag" in message
+        assert await request(reader, writer, 6, es.OP_PING) == (6, es.STATUS_OK, b"")
+
+    asyncio.run(serving(test, tmp_path, key))
+
+
+@pytest.mark.parametrize("body", [b"", b"\x00", b"\x00\x00\x00\x01"])
+def test_frame_shorter_than_the_header_gets_an_error_reply(tmp_path, body):
+    async def test(reader, writer):
+        writer.write(es.FRAME_LENGTH.pack(len(body)) + body)
+        reply = await es.read_frame(reader)
+        assert es.RESPONSE_HEADER.unpack_from(reply) == (0, es.STATUS_ERROR)
+        assert b"shorter than" in reply
+        # The connection is still in sync for the next request
+        assert await request(reader, writer, 9, es.OP_PING) == (9, es.STATUS_OK, b"")
+
+    asyncio.run(serving(test, tmp_path, generate_key()))
+
+
+def test_serve_requires_a_key_file(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        es.main(["serve"])
+    assert exit_info.value.code == 2
+    assert "--keyfile" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("contents", [None, base64.b64encode(b"short")])
+def test_serve_rejects_unreadable_keys(tmp_path, capsys, contents):
+    path = tmp_path / "key"
+    if contents is not None:
+        path.write_bytes(contents)
+    assert es.main(["serve", "--keyfile", str(path), "--unix", str(tmp_path / "server.sock")]) == 1
+    assert capsys.readouterr().err.startswith("Cannot read key:")
+
+
+def test_load_reports_latency_percentiles(tmp_path):
+    async def test():
+        path = str(tmp_path / "server.sock")
+        server = es.EncryptionServer(generate_key(), workers=1)
+        ready = asyncio.Event()
+        task = asyncio.create_task(server.serve(path=path, ready=ready))
+        await ready.wait()
+        try:
+            return await es.run_load((None, None, path), connections=2, requests=100, depth=8, size=64)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    report = asyncio.run(test())
+    assert report["requests"] == 100
+    latency = report["latency_ms"]
+    assert 0 < latency["p50"] <= latency["p99"] <= latency["max"]
+
+
+def test_percentile_interpolates_between_neighbours():
+    assert es.percentile([5.0], 99) == 5.0
+    assert es.percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert es.percentile(list(range(101)), 99) == 99
+
+
+async def misbehaving_server(tmp_path, reply):
+    """A server that answers the first request with reply(request id) and then stops answering."""
+    async def handle(reader, writer):
+        body = await es.read_frame(reader)
+        request_id, _ = es.REQUEST_HEADER.unpack_from(body)
+        writer.write(reply(request_id))
+        writer.write_eof()  # The client sees the end of its responses but can still send
+        while await reader.read(65536):
+            pass
+        writer.close()
+
+    path = str(tmp_path / "server.sock")
+    return path, await asyncio.start_unix_server(handle, path)
+
+
+@pytest.mark.parametrize("reply, error, match", [
+    (lambda request_id: es.encode_frame(es.RESPONSE_HEADER, request_id, es.STATUS_ERROR, b"boom"), RuntimeError, "boom"),
+    (lambda request_id: es.encode_frame(es.RESPONSE_HEADER, request_id, es.STATUS_OK), ConnectionError, "closed"),
+])
+def test_load_fails_instead_of_hanging(tmp_path, reply, error, match):
+    async def test():
+        path, server = await misbehaving_server(tmp_path, reply)
+        async with server:
+            # More requests than the window, so the sender is blocked on it when the receiver fails
+            await asyncio.wait_for(es.run_load((None, None, path), connections=2, requests=200, depth=4), 10)
+
+    with pytest.raises(error, match=match):
+        asyncio.run(test())
@@ -0,0 +1,60 @@
+import numpy as np
+
+import fiery_shapes as fs
+from adaptive_quality import LEVELS
+
+
+def test_pool_culls_only_expired_particles():
+    pool = fs.ParticlePool(capacity=300, rng=np.random.default_rng(4))
+    pool.spawn([(100, 100), (400, 300), (700, 500)], 250)
+    live = slice(0, pool.count)
+    pool.lifespan[live] = np.random.default_rng(5).integers(1, 40, pool.count)
+    # vx never changes while ageing, so it tags each particle across the swaps
+    before = {
+        vx: (x, y, vy, radius, lifespan, color)
+        for vx, x, y, vy, radius, lifespan, color in zip(
+            pool.vx[live].tolist(), pool.x[live].tolist(), pool.y[live].tolist(), pool.vy[live].tolist(),
+            pool.radius[live].tolist(), pool.lifespan[live].tolist(), pool.color_index[live].tolist(),
+        )
+    }
+    for step in range(1, 31):
+        pool.update()
+        pool.cull()
+        live = slice(0, pool.count)
+        survivors = {vx for vx, fields in before.items() if fields[4] > step}
+        assert pool.count == len(survivors)
+        assert set(pool.vx[live].tolist()) == survivors
+        assert (pool.lifespan[live] > 0).all()
+        for i, vx in enumerate(pool.vx[live].tolist()):
+            x, y, vy, radius, lifespan, color = before[vx]
+            assert pool.lifespan[i] == lifespan - step
+            assert pool.color_index[i] == color
+            assert abs(pool.x[i] - (x + step * vx)) < 1e-9
+            assert pool.vy[i] == vy
+            assert abs(pool.y[i] - (y + step * vy)) < 1e-9
+            assert radius - step / 2 <= pool.radius[i] <= radius
+
+
+def test_age_kernel_matches_pool_update():
+    pool = fs.ParticlePool(capacity=100, rng=np.random.default_rng(6))
+    pool.spawn([(10, 10), (50, 80)], 100)
+    arrays = {name: getattr(pool, name).copy() for name in fs.PARALLEL_FIELDS}
+    for _ in range(25):
+        pool.update()
+        fs.age_kernel(arrays, 0, 40, ())  # Two workers' slices
+        fs.age_kernel(arrays, 40, 100, ())
+    for name in fs.PARALLEL_FIELDS:
+        assert arrays[name].tolist() == getattr(pool, name).tolist()
+
+
+def test_set_quality_only_changes_its_own_simulation():
+    low = next(level for level in LEVELS if level.alpha_step > fs.SPRITE_ALPHA_STEP)
+    first, second = fs.Simulation(seed=1), fs.Simulation(seed=2)
+    try:
+        first.set_quality(low)
+        assert first.renderer.cache.alpha_step == low.alpha_step
+        assert second.renderer.cache.alpha_step == fs.SPRITE_ALPHA_STEP
+        assert fs.sprite_cache.alpha_step == fs.SPRITE_ALPHA_STEP
+    finally:
+        first.close()
+        second.close()
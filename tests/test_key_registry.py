@@ -0,0 +1,89 @@
+import pytest
+from cryptography.exceptions import InvalidTag
+
+from key_registry import KeyRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = KeyRegistry()
+    registry.rotate()
+    return registry
+
+
+def test_rotate_keeps_old_keys_for_decryption(registry):
+    old_id = registry.active
+    old = registry.seal(b"old record", "tenant-1")
+    new_id = registry.rotate()
+    assert new_id == old_id + 1 and registry.active == new_id
+    assert set(registry.keys) == {old_id, new_id}
+    new = registry.seal(b"new record", "tenant-1")
+    assert registry.open(old, "tenant-1") == (b"old record", b"")
+    assert registry.open(new, "tenant-1") == (b"new record", b"")
+
+
+def test_contexts_get_different_subkeys(registry):
+    message = registry.seal(b"record", "tenant-1")
+    with pytest.raises(InvalidTag):  # Same master key, different subkey
+        registry.open(message, "tenant-2")
+
+
+def test_retire_drops_the_key_and_its_cached_ciphers(registry):
+    old_id = registry.active
+    message = registry.seal(b"record", "tenant-1")
+    registry.cipher("tenant-2")
+    registry.rotate()
+    registry.seal(b"record", "tenant-1")
+    registry.retire(old_id)
+    assert old_id not in registry.keys
+    assert all(key_id != old_id for key_id, _ in registry.ciphers)
+    assert len(registry.ciphers) == 1  # The active key's tenant-1 cipher
+    with pytest.raises(KeyError):
+        registry.open(message, "tenant-1")
+    with pytest.raises(ValueError):
+        registry.retire(registry.active)
+
+
+def test_str_and_bytes_contexts_share_a_cache_entry(registry):
+    _, cipher = registry.cipher("tenant-1")
+    _, same = registry.cipher(b"tenant-1")
+    assert same is cipher
+    assert len(registry.ciphers) == 1
+    assert (registry.hits, registry.misses) == (1, 1)
+    message = registry.seal(b"record", "tenant-1")
+    assert registry.open(message, b"tenant-1")[0] == b"record"
+
+
+def test_lru_eviction_counts():
+    registry = KeyRegistry(cache_size=2)
+    registry.rotate()
+    for context in ("a", "b", "a", "c", "b"):  # "c" evicts "b" (least recently used), then "b" evicts "a"
+        registry.cipher(context)
+    stats = registry.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["cached"]) == (1, 4, 2, 2)
+    assert [context for _, context in registry.ciphers] == [b"c", b"b"]
+    assert stats["hit_rate"] == pytest.approx(1 / 5)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "keys.json")
+    registry = KeyRegistry.create(path)
+    old = registry.seal(b"old record", "tenant-1")
+    registry.rotate()  # Saves again
+    new = registry.seal(b"new record")
+    loaded = KeyRegistry.load(path)
+    assert loaded.keys == registry.keys
+    assert loaded.active == registry.active
+    assert loaded.open(old, "tenant-1")[0] == b"old record"
+    assert loaded.open(new)[0] == b"new record"
+    assert (tmp_path / "keys.json").stat().st_mode & 0o777 == 0o600
+    assert not (tmp_path / "keys.json.tmp").exists()
+
+
+def test_create_refuses_an_existing_keyfile(tmp_path):
+    path = str(tmp_path / "keys.json")
+    registry = KeyRegistry.create(path)
+    message = registry.seal(b"record", "tenant-1")
+    with pytest.raises(FileExistsError):
+        KeyRegistry.create(path)
+    assert KeyRegistry.load(path).open(message, "tenant-1")[0] == b"record"
@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+import pytest
+
+import particle_morph as pm
+import Vibe_Particles as vp
+from parallel_step import ParallelStepper
+
+
+def vibe_system(count):
+    return vp.ParticleSystem(count, np.random.default_rng(3))
+
+
+def morph_system(count):
+    return pm.ParticleSystem(pm.get_shape_points(3, count), rng=np.random.default_rng(3))
+
+
+@pytest.mark.parametrize("make, kernel, fields, params", [
+    (vibe_system, vp.update_kernel, vp.PARALLEL_FIELDS, (1 / 60,)),  # ParticleSystem.update(dt, count)
+    (morph_system, pm.steer_kernel, pm.PARALLEL_FIELDS, ()),  # ParticleSystem.update(count)
+])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_parallel_step_is_bit_identical_to_the_serial_path(make, kernel, fields, params, workers):
+    serial, parallel = make(1001), make(1001)
+    stepper = ParallelStepper(kernel, parallel, fields, workers)
+    try:
+        for step in range(60):
+            count = 1001 if step < 40 else 500  # Then only a prefix, as the fader does
+            serial.update(*params, count)
+            stepper.step(count, *params)
+            for name in fields:
+                assert np.array_equal(getattr(parallel, name), getattr(serial, name))
+    finally:
+        stepper.close()
+    for name in fields:  # close() hands back private copies with the final state
+        assert np.array_equal(getattr(parallel, name), getattr(serial, name))
+
+
+def test_workers_outlive_an_idle_main_process(monkeypatch):
+    monkeypatch.setattr("parallel_step.BARRIER_TIMEOUT", 0.5)
+    system = vibe_system(100)
+    stepper = ParallelStepper(vp.update_kernel, system, vp.PARALLEL_FIELDS, 2)
+    try:
+        stepper.step(100, 1 / 60)
+        time.sleep(1.5)  # A debugger pause or a window drag between frames
+        stepper.step(100, 1 / 60)
+        assert stepper.steps == 2
+    finally:
+        stepper.close()
+
+
+def test_step_reports_a_dead_worker():
+    system = vibe_system(100)
+    stepper = ParallelStepper(vp.update_kernel, system, vp.PARALLEL_FIELDS, 2)
+    try:
+        stepper.step(100, 1 / 60)
+        stepper.processes[1].kill()
+        stepper.processes[1].join()
+        with pytest.raises(RuntimeError, match="particle-worker-1"):
+            stepper.step(100, 1 / 60)
+    finally:
+        stepper.close()
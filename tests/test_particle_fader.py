@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from particle_fader import ParticleFader
+
+
+def test_fade_in_ramps_at_the_configured_rate():
+    fader = ParticleFader(100, active=40, fade_steps=10)
+    assert fader.settled and fader.live == 40
+    fader.set_active(70)
+    assert fader.live == 70  # New particles are live (and drawn) from the first step
+    for step in range(1, 11):
+        assert fader.step() == 70
+        assert fader.visibility[40:70] == pytest.approx(np.full(30, step / 10))
+        assert (fader.visibility[:40] == 1).all() and (fader.visibility[70:] == 0).all()
+        assert fader.settled == (step == 10)
+
+
+def test_fade_out_keeps_particles_live_until_invisible():
+    fader = ParticleFader(100, active=40, fade_steps=10)
+    fader.set_active(25)
+    for step in range(1, 11):
+        live = fader.step()
+        assert fader.visibility[25:40] == pytest.approx(np.full(15, 1 - step / 10), abs=1e-9)
+        assert live == (25 if step == 10 else 40)
+    assert fader.settled and fader.live == 25
+
+
+def test_reversed_fade_continues_from_the_current_visibility():
+    fader = ParticleFader(100, active=40, fade_steps=10)
+    fader.set_active(20)
+    for _ in range(4):
+        fader.step()
+    fader.set_active(40)
+    fader.step()
+    assert fader.visibility[20:40] == pytest.approx(np.full(20, 0.7))
+    for _ in range(3):
+        fader.step()
+    assert fader.settled and fader.live == 40
+
+
+def test_active_count_is_capped_at_capacity():
+    fader = ParticleFader(50, active=10)
+    fader.set_active(500)
+    assert fader.active == 50 and fader.live == 50
+    fader.set_active(-3)
+    assert fader.active == 0
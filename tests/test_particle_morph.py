@@ -0,0 +1,109 @@
+import random
+
+import numpy as np
+import pytest
+
+import particle_morph as pm
+import target_assignment
+
+
+# --- Shape transitions ---
+@pytest.mark.parametrize("mode", target_assignment.ASSIGNMENT_MODES)
+@pytest.mark.parametrize("max_particles", [None, 128])  # Without and with hidden spare particles
+def test_shape_switch_in_every_assignment_mode(monkeypatch, mode, max_particles):
+    monkeypatch.setattr(pm, "ASSIGNMENT_MODE", mode)
+    simulation = pm.Simulation(64, seed=0, max_particles=max_particles)
+    targets_before = np.column_stack([simulation.particles.target_x, simulation.particles.target_y])
+    for _ in range(pm.SHAPE_SWITCH_INTERVAL):
+        simulation.step(1 / 60)
+    assert simulation.current_shape_index == 1
+    targets = np.column_stack([simulation.particles.target_x, simulation.particles.target_y])
+    assert not np.allclose(targets, targets_before)
+    # Each particle got one of the new shape's targets, and no target was handed out twice
+    expected = pm.get_shape_points(1, simulation.count)
+    assert sorted(map(tuple, targets)) == sorted(map(tuple, expected))
+
+
+def test_hilbert_assignment_of_nothing():
+    order = target_assignment.hilbert_assignment(np.empty((0, 2)), np.empty((0, 2)))
+    assert order.dtype == np.int64 and len(order) == 0
+
+
+# --- Vectorized particles ---
+def test_particle_system_matches_particle_update():
+    random.seed(1)
+    targets = pm.get_shape_points(2, 300)
+    particles = [pm.Particle(x, y) for x, y in targets]
+    particles[0].x, particles[0].y = particles[0].target_x, particles[0].target_y  # Starts in the dead zone
+    system = pm.ParticleSystem.from_particles(particles)
+    for _ in range(200):
+        for p in particles:
+            p.update()
+        system.update()
+        for name in ("x", "y", "vx", "vy"):
+            assert np.allclose(getattr(system, name), [getattr(p, name) for p in particles], rtol=1e-9, atol=1e-9)
+        assert system.color.tolist() == [list(p.color) for p in particles]
+
+
+# --- Shape generators ---
+# The bird outline from get_bird_points: its last vertex repeats the first, so closing it adds a zero-length edge
+BIRD = [(0, 0), (-2, -1), (-4, -1), (-3, 0), (-4, 1), (-2, 1), (0, 2), (2, 1), (4, 1), (3, 0), (4, -1), (2, -1), (0, 0)]
+# An open path with a zero-length segment in the middle
+PATH = [(0, 0), (3, 0), (3, 0), (3, 4), (-1, 4)]
+
+
+def arc_positions(vertices, points, closed):
+    """Distance along the polyline to each point, which must lie on it."""
+    vertices = np.asarray(vertices, dtype=np.float64)
+    if closed:
+        vertices = np.vstack([vertices, vertices[:1]])
+    starts, ends = vertices[:-1], vertices[1:]
+    lengths = np.hypot(*(ends - starts).T)
+    offsets = np.concatenate([[0.0], np.cumsum(lengths)])
+    positions = []
+    for point in points:
+        for start, length, offset, end in zip(starts, lengths, offsets, ends):
+            along = np.hypot(*(point - start))
+            if abs(along + np.hypot(*(end - point)) - length) < 1e-9:  # On this segment
+                positions.append(offset + along)
+                break
+        else:
+            raise AssertionError(f"{point} is not on the polyline")
+    return np.array(positions), offsets[-1]
+
+
+@pytest.mark.parametrize("num_points", [1, 7, 1000])
+@pytest.mark.parametrize("vertices, closed", [(BIRD, True), (PATH, False)])
+def test_resample_polyline_spaces_points_evenly(vertices, closed, num_points):
+    points = pm.resample_polyline(vertices, num_points, closed=closed)
+    assert points.shape == (num_points, 2)
+    positions, total = arc_positions(vertices, points, closed)
+    assert positions[0] == pytest.approx(0)
+    if closed:
+        # Evenly around the loop, including the step from the last point back to the first
+        gaps = np.diff(np.append(positions, total))
+        assert gaps == pytest.approx(np.full(num_points, total / num_points))
+    elif num_points > 1:
+        gaps = np.diff(positions)
+        assert gaps == pytest.approx(np.full(num_points - 1, total / (num_points - 1)))
+        assert points[-1] == pytest.approx(vertices[-1])
+    assert len(np.unique(points.round(9), axis=0)) == num_points  # No duplicate padding
+
+
+def test_bird_points_follow_the_resampled_outline():
+    outline = [(400 + x * 40, 300 - y * 40) for x, y in BIRD]
+    assert np.allclose(pm.get_bird_points(57, 400, 300, 40), pm.resample_polyline(outline, 57))
+
+
+def test_hidden_particles_do_not_push_live_ones(monkeypatch):
+    monkeypatch.setattr(pm, "USE_SEPARATION", True)
+    plain, crowded = (pm.Simulation(64, seed=5, max_particles=128) for _ in range(2))
+    assert plain.fader.live == 64
+    # Park every hidden particle right next to a live one
+    crowded.particles.x[64:] = crowded.particles.x[:64] + 1
+    crowded.particles.y[64:] = crowded.particles.y[:64] + 1
+    for _ in range(100):
+        plain.step(1 / 60)
+        crowded.step(1 / 60)
+    for name in ("x", "y", "vx", "vy"):
+        assert np.array_equal(getattr(crowded.particles, name)[:64], getattr(plain.particles, name)[:64])
@@ -0,0 +1,46 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+import pytest
+
+import particle_renderer as pr
+
+WIDTH, HEIGHT = 120, 80
+
+
+def make_particles(rng, count, max_radius):
+    # Some particles hang off the edges and many overlap, so clipping and draw order both matter
+    xs = rng.uniform(-10, WIDTH + 10, count)
+    ys = rng.uniform(-10, HEIGHT + 10, count)
+    radii = rng.integers(0, max_radius + 1, count)
+    colors = rng.integers(1, 256, (count, 3))
+    return xs, ys, radii, colors
+
+
+def render(draw, *args):
+    surface = pygame.Surface((WIDTH, HEIGHT), depth=32)
+    surface.fill((0, 0, 0))
+    draw(surface, *args)
+    return pygame.surfarray.array3d(surface)
+
+
+@pytest.mark.parametrize("mode", pr.RENDER_MODES)
+@pytest.mark.parametrize("max_radius", [pr.POINT_RADIUS, 6])  # Small enough for the "pixels" path, and not
+def test_every_mode_matches_the_reference_draw(mode, max_radius):
+    args = make_particles(np.random.default_rng(max_radius), 400, max_radius)
+    expected = render(pr.draw_circles_reference, *args)
+    assert render(pr.SpriteRenderer(mode).draw_circles, *args).tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize("mode", pr.RENDER_MODES)
+def test_every_mode_matches_the_reference_alpha_blit(mode):
+    rng = np.random.default_rng(3)
+    xs, ys, _, colors = make_particles(rng, 300, 0)
+    radii = rng.integers(1, 13, 300) / 2  # Radii shrink in 0.5 steps
+    alphas = rng.integers(0, 256, 300)
+    expected = render(pr.draw_circles_reference, xs, ys, radii, colors, alphas)
+    result = render(pr.SpriteRenderer(mode).draw_circles, xs, ys, radii, colors, alphas)
+    assert result.tolist() == expected.tolist()
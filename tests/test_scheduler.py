@@ -0,0 +1,47 @@
+import pytest
+
+from scheduler import FixedTimestepScheduler
+
+
+class StepRecorder:
+    def __init__(self):
+        self.dts = []
+
+    def step(self, dt):
+        self.dts.append(dt)
+
+
+@pytest.mark.parametrize("physics_hz, frame_dt, expected", [
+    (60, 1 / 60, [1, 1, 1, 1]),
+    (120, 1 / 60, [2, 2, 2, 2]),
+    (60, 1 / 144, [0, 0, 1, 0, 1, 0, 0, 1]),  # Leftover time carries over to later frames
+])
+def test_tick_runs_the_due_steps(physics_hz, frame_dt, expected):
+    scheduler = FixedTimestepScheduler(physics_hz)
+    simulation = StepRecorder()
+    assert [scheduler.tick(simulation, frame_dt) for _ in expected] == expected
+    assert simulation.dts == [1 / physics_hz] * sum(expected)
+    assert scheduler.steps == sum(expected)
+    assert scheduler.dropped_time == 0
+
+
+def test_long_frame_is_clamped_to_max_substeps():
+    scheduler = FixedTimestepScheduler(60, max_substeps=5)
+    simulation = StepRecorder()
+    assert scheduler.tick(simulation, 1.0) == 5  # A one second stall owes 60 steps
+    assert len(simulation.dts) == 5
+    assert scheduler.dropped_time == pytest.approx(55 / 60)
+    assert 0 <= scheduler.accumulator < scheduler.step_dt
+    # The backlog is gone: the next normal frame runs one step, not another burst
+    assert scheduler.tick(simulation, 1 / 60) == 1
+
+
+def test_alpha_is_the_leftover_fraction_of_a_step():
+    scheduler = FixedTimestepScheduler(60)
+    assert scheduler.alpha == 0
+    assert scheduler.advance(0.25 / 60) == 0
+    assert scheduler.alpha == pytest.approx(0.25)
+    assert scheduler.advance(1.5 / 60) == 1
+    assert scheduler.alpha == pytest.approx(0.75)
+    assert scheduler.advance(0.25 / 60) == 1
+    assert scheduler.alpha == pytest.approx(0, abs=1e-6)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from spatial_hash import SpatialHashGrid
+
+CELL = 10.0
+
+
+def brute_pairs(xs, ys, radius):
+    dx = xs[:, None] - xs[None, :]
+    dy = ys[:, None] - ys[None, :]
+    i, j = np.nonzero(np.triu(dx * dx + dy * dy < radius * radius, k=1))
+    return sorted(zip(i.tolist(), j.tolist()))
+
+
+def random_points(seed, n=400):
+    rng = np.random.default_rng(seed)
+    # Negative coordinates too, for particles that wander off screen
+    return rng.uniform(-50, 150, n), rng.uniform(-50, 150, n)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("radius", [2.5, CELL])
+def test_pairs_within_matches_brute_force(seed, radius):
+    xs, ys = random_points(seed)
+    grid = SpatialHashGrid(CELL)
+    grid.update(xs, ys)
+    for _ in range(2):
+        i, j, dx, dy, dist = grid.pairs_within(radius)
+        assert sorted(zip(i.tolist(), j.tolist())) == brute_pairs(xs, ys, radius)
+        assert np.allclose(dx, xs[i] - xs[j]) and np.allclose(dy, ys[i] - ys[j])
+        assert np.allclose(dist, np.hypot(dx, dy))
+        # Move everything a little and re-bucket from the previous order
+        xs = xs + np.random.default_rng(seed).normal(0, 3, len(xs))
+        ys = ys + np.random.default_rng(seed + 10).normal(0, 3, len(ys))
+        grid.update(xs, ys)
+
+
+def test_pairs_across_cell_boundaries():
+    # Each pair straddles a cell edge or corner, including the edge at zero
+    xs = np.array([9.9, 10.1, 39.9, 40.1, 69.9, 70.1, -0.1, 0.1, 99.9, 100.1])
+    ys = np.array([5.0, 5.0, 19.9, 20.1, 30.1, 29.9, -20.0, -20.0, -0.1, 0.1])
+    grid = SpatialHashGrid(CELL)
+    grid.update(xs, ys)
+    i, j, _, _, _ = grid.pairs_within(1.0)
+    assert sorted(zip(i.tolist(), j.tolist())) == [(0, 1), (2, 3), (4, 5), (6, 7), (8, 9)]
+
+
+def test_pairs_within_rejects_a_radius_above_the_cell_size():
+    grid = SpatialHashGrid(CELL)
+    grid.update(*random_points(0, 10))
+    with pytest.raises(ValueError):
+        grid.pairs_within(CELL + 1)
+
+
+@pytest.mark.parametrize("radius", [3.0, 25.0])  # Within one cell, and reaching several cells out
+def test_query_radius_matches_brute_force(radius):
+    xs, ys = random_points(4)
+    grid = SpatialHashGrid(CELL)
+    grid.update(xs, ys)
+    for x, y in [(0.0, 0.0), (10.0, 10.0), (55.5, -3.2), (149.0, 149.0)]:
+        expected = np.flatnonzero((xs - x) ** 2 + (ys - y) ** 2 <= radius * radius)
+        assert sorted(grid.query_radius(x, y, radius).tolist()) == expected.tolist()
+
+
+def test_query_knn_matches_brute_force():
+    xs, ys = random_points(5)
+    grid = SpatialHashGrid(CELL)
+    grid.update(xs, ys)
+    for x, y in [(0.0, 0.0), (50.0, 50.0), (-200.0, 300.0)]:
+        dist = (xs - x) ** 2 + (ys - y) ** 2
+        for k in (1, 7, 50):
+            assert sorted(dist[grid.query_knn(x, y, k)].tolist()) == np.sort(dist)[:k].tolist()
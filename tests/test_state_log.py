@@ -0,0 +1,86 @@
+import json
+import random
+
+import numpy as np
+import pytest
+
+import simulations
+import state_log
+from state_log import Replayer, StateLog, StateRecorder, record_offline
+
+
+def assert_same_state(actual, expected):
+    assert type(actual) is type(expected)
+    if isinstance(expected, dict):
+        assert actual.keys() == expected.keys()
+        for key in expected:
+            assert_same_state(actual[key], expected[key])
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected)
+        for a, b in zip(actual, expected):
+            assert_same_state(a, b)
+    elif isinstance(expected, np.ndarray):
+        assert actual.dtype == expected.dtype and np.array_equal(actual, expected)
+    else:
+        assert actual == expected
+
+
+def test_snapshot_round_trip():
+    state = {
+        "arrays": {"x": np.linspace(0, 1, 7), "color": np.arange(12, dtype=np.uint8).reshape(4, 3)},
+        "previous": (np.zeros(3, np.float32), np.ones(0)),
+        "count": np.int64(5),
+        "settled": True,
+        "rng": np.random.default_rng(1).bit_generator.state,  # 128-bit integers
+        "random": random.getstate(),
+        "nothing": None,
+    }
+    decoded = state_log._decode_snapshot(state_log._encode_snapshot(state))
+    state["count"] = 5
+    assert_same_state(decoded, state)
+    random.setstate(decoded["random"])
+
+
+def test_snapshot_rejects_objects():
+    with pytest.raises(TypeError):
+        state_log._encode_snapshot({"arrays": {"x": np.array([object()])}})
+    with pytest.raises(TypeError):
+        state_log._encode_snapshot({"callback": print})
+
+
+
+@pytest.mark.parametrize("reference, error", [
+    (["<f8", [2], 0], None),
+    (["|O", [2], 0], "unsupported dtype"),  # Object arrays would unpickle their items
+    (["<f8", [3], 0], "outside the snapshot"),
+    (["<f8", [2], 8], "outside the snapshot"),
+    (["<f8", [-2], 0], "outside the snapshot"),
+])
+def test_snapshot_checks_array_references(reference, error):
+    encoded = json.dumps({"x": {"__array__": reference}}).encode()
+    start = state_log.SNAPSHOT_HEADER.size + len(encoded)
+    data = state_log.SNAPSHOT_HEADER.pack(len(encoded)) + encoded + bytes(-start % 8) + bytes(16)
+    if error is None:
+        assert state_log._decode_snapshot(data)["x"].tolist() == [0.0, 0.0]
+    else:
+        with pytest.raises(ValueError, match=error):
+            state_log._decode_snapshot(data)
+
+
+@pytest.mark.parametrize("name, count", [("vibe", 50), ("morph", 40), ("fiery", None)])
+def test_restore_reproduces_the_recorded_state(tmp_path, name, count):
+    path = str(tmp_path / "run.pstl")
+    simulation = simulations.create_simulation(name, count, seed=4)
+    with StateRecorder(path, simulation, keyframe_interval=20, metadata={"simulation": name}) as recorder:
+        record_offline(simulation, recorder, 50)
+    expected = simulation.snapshot()
+    simulation.close()
+
+    with StateLog(path) as log:
+        assert len(log) == 50
+        replica = simulations.create_simulation(name, count, seed=99)  # Different state until restored
+        try:
+            Replayer(log, replica).restore(49)
+            assert_same_state(replica.snapshot(), expected)
+        finally:
+            replica.close()
@@ -0,0 +1,22 @@
+import random
+
+import numpy as np
+import pytest
+
+import Vibe_Particles as vp
+
+
+@pytest.mark.parametrize("dt", [1 / 60, 1 / 144, 0.05])
+def test_particle_system_matches_particle_update(dt):
+    random.seed(2)
+    particles = [vp.Particle() for _ in range(300)]  # Enough that many bounce off the edges
+    system = vp.ParticleSystem.from_particles(particles)
+    for _ in range(500):
+        for p in particles:
+            p.update(dt)
+        system.update(dt)
+        for name, attr in (("x", "x"), ("y", "y"), ("vx", "vx"), ("vy", "vy"), ("hue", "color_hue")):
+            assert getattr(system, name).tolist() == [getattr(p, attr) for p in particles]
+    # Colors come from the hue table, 1 degree apart, so they stay close to pygame's exact conversion
+    expected = np.array([tuple(p.get_color())[:3] for p in particles])
+    assert np.abs(system.colors().astype(np.int64) - expected).max() <= 5